@@ -0,0 +1,193 @@
+import sys
+from datetime import datetime, timedelta
+
+import pytz
+from firebase_admin import firestore
+
+from analytics_engine import ANALYTICS_PERIODS, orders_to_arrays, bucket_totals
+from product_stats import to_utc_datetime
+
+# Everything the admin dashboard needs lives in four documents:
+#   analytics/summary  - global counters
+#   analytics/daily    - {'buckets': {'YYYY-MM-DD': {'revenue', 'orders'}}}
+#   analytics/weekly   - {'buckets': {'YYYY-Www':   {'revenue', 'orders'}}}
+#   analytics/monthly  - {'buckets': {'YYYY-MM':    {'revenue', 'orders'}}}
+# Bucket order counts include cancelled orders; revenue excludes them, as the
+# dashboard always has.
+ROLLUP_COLLECTION = 'analytics'
+
+SUMMARY_FIELDS = {
+    'total_users': 'totalUsers',
+    'total_canteens': 'totalCanteens',
+    'total_orders': 'totalOrders',
+    'total_revenue': 'totalRevenue',
+    'cancelled_orders': 'cancelledOrders',
+    'total_refunded': 'totalRefunded'
+}
+
+# key_format: how buckets are stored, retention: buckets older than this are pruned.
+# Chart windows and labels (days, label_format) are shared with analytics_engine.py
+PERIODS = {
+    'daily': {**ANALYTICS_PERIODS['daily'], 'key_format': '%Y-%m-%d', 'retention': 30},
+    'weekly': {**ANALYTICS_PERIODS['weekly'], 'key_format': '%Y-W%W', 'retention': 120},
+    'monthly': {**ANALYTICS_PERIODS['monthly'], 'key_format': '%Y-%m', 'retention': 400}
+}
+
+
+def _rollup_ref(db, name):
+    return db.collection(ROLLUP_COLLECTION).document(name)
+
+
+def _apply(db, summary=None, created_at=None, revenue=0, orders=0):
+    """Write one set of counter deltas to the summary and bucket docs in a single batch."""
+    batch = db.batch()
+
+    if summary:
+        batch.set(_rollup_ref(db, 'summary'), {
+            field: firestore.Increment(delta) for field, delta in summary.items()
+        }, merge=True)
+
+    if created_at and (revenue or orders):
+        for period, config in PERIODS.items():
+            key = created_at.strftime(config['key_format'])
+            batch.set(_rollup_ref(db, period), {
+                'buckets': {key: {
+                    'revenue': firestore.Increment(revenue),
+                    'orders': firestore.Increment(orders)
+                }}
+            }, merge=True)
+
+    batch.commit()
+
+
+def record_order_created(db, total, created_at=None):
+    created_at = to_utc_datetime(created_at) or datetime.now(pytz.UTC)
+    _apply(db, {'total_orders': 1, 'total_revenue': total},
+           created_at=created_at, revenue=total, orders=1)
+
+
+def record_order_cancelled(db, total, refund_amount, created_at, sign=1):
+    """Move an order's revenue into the cancelled/refunded counters (sign=-1 undoes it)."""
+    _apply(db, {
+        'cancelled_orders': sign,
+        'total_refunded': sign * refund_amount,
+        'total_revenue': -sign * total
+    }, created_at=to_utc_datetime(created_at), revenue=-sign * total)
+
+
+def record_user_created(db, role='user', sign=1):
+    summary = {'total_users': sign}
+    if role == 'canteen':
+        summary['total_canteens'] = sign
+    _apply(db, summary)
+
+
+def build_series(buckets, period, now=None):
+    """Turn stored buckets into the chart list the dashboard has always returned."""
+    config = PERIODS[period]
+    now = now or datetime.now(pytz.UTC)
+    series = {}
+
+    for i in range(config['days'], -1, -1):
+        day = now - timedelta(days=i)
+        label = day.strftime(config['label_format'])
+        if label in series:
+            continue
+        bucket = buckets.get(day.strftime(config['key_format'])) or {}
+        series[label] = bucket.get('revenue', 0)
+
+    return [{'date': label, 'value': value} for label, value in series.items()]
+
+
+def load_dashboard(db):
+    """Read the summary and bucket docs (one get_all round trip) for the admin dashboard."""
+    names = ['summary'] + list(PERIODS)
+    docs = {
+        doc.id: (doc.to_dict() or {}) if doc.exists else {}
+        for doc in db.get_all([_rollup_ref(db, name) for name in names])
+    }
+
+    summary = docs.get('summary', {})
+    now = datetime.now(pytz.UTC)
+    result = {
+        label: summary.get(field, 0) for field, label in SUMMARY_FIELDS.items()
+    }
+    result['analytics'] = {
+        period: build_series(docs.get(period, {}).get('buckets') or {}, period, now)
+        for period in PERIODS
+    }
+
+    _prune_expired_buckets(db, docs, now)
+    return result
+
+
+def _prune_expired_buckets(db, docs, now):
+    try:
+        batch = None
+        for period, config in PERIODS.items():
+            oldest = (now - timedelta(days=config['retention'])).strftime(config['key_format'])
+            stale = [key for key in (docs.get(period, {}).get('buckets') or {}) if key < oldest]
+            if stale:
+                batch = batch or db.batch()
+                batch.set(_rollup_ref(db, period), {
+                    'buckets': {key: firestore.DELETE_FIELD for key in stale}
+                }, merge=True)
+        if batch:
+            batch.commit()
+    except Exception as e:
+        print(f"Error pruning analytics rollups: {str(e)}")
+
+
+def rebuild_rollups(db):
+    """Recompute the summary and bucket docs from all users and orders (backfill)."""
+    now = datetime.now(pytz.UTC)
+    summary = {field: 0 for field in SUMMARY_FIELDS}
+
+    for user in db.collection('users').stream():
+        summary['total_users'] += 1
+        if user.to_dict().get('role') == 'canteen':
+            summary['total_canteens'] += 1
+
+    orders = []
+    for order in db.collection('orders').stream():
+        order_data = order.to_dict()
+        summary['total_orders'] += 1
+        if order_data.get('status') == 'cancelled':
+            summary['cancelled_orders'] += 1
+            summary['total_refunded'] += order_data.get('refund_amount', 0)
+        else:
+            summary['total_revenue'] += order_data.get('total', 0)
+        orders.append(order_data)
+
+    # Bucket totals are computed in one vectorized pass per period
+    arrays = orders_to_arrays(orders)
+    batch = db.batch()
+    batch.set(_rollup_ref(db, 'summary'), summary)
+    for period, config in PERIODS.items():
+        since = now - timedelta(days=config['retention'])
+        batch.set(_rollup_ref(db, period), {
+            'buckets': bucket_totals(arrays, config['key_format'], since=since)
+        })
+    batch.commit()
+
+    return summary
+
+
+if __name__ == '__main__':
+    import os
+    import firebase_admin
+    from firebase_admin import credentials
+    from dotenv import load_dotenv
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python analytics_rollups.py rebuild")
+        sys.exit(1)
+
+    load_dotenv()
+    firebase_cred_path = os.getenv("FIREBASE_CREDENTIALS")
+    if not firebase_cred_path:
+        raise ValueError("FIREBASE_CREDENTIALS environment variable is not set")
+
+    firebase_admin.initialize_app(credentials.Certificate(firebase_cred_path))
+    summary = rebuild_rollups(firestore.client())
+    print(f"Rebuilt analytics rollups: {summary}")
@@ -1,54 +1,196 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, send_from_directory
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from firebase_admin import firestore, storage
+from google.api_core.exceptions import AlreadyExists
+import firebase_client
 import jwt
+import hmac
 import datetime
 import random
 import string
 import os
 from dotenv import load_dotenv
 from passlib.hash import pbkdf2_sha256  # ✅ Secure password hashing without C++ dependency
-import requests 
+import uuid
 from datetime import datetime, timedelta
 import pytz
+from catalog_cache import ProductCatalogCache
+from product_stats import record_order_sales, load_product_metrics, load_daily_sales
+from auth import Authenticator
+from loyalty import (
+    LOYALTY_REWARDS, tier_for, next_tier_for, available_rewards,
+    has_loyalty_counters, order_points, completion_increments, ensure_loyalty_counters
+)
+from transaction_runner import TransactionRunner, TransactionContention
+from image_upload import ImageUploader, IMGBB_UPLOAD_URL, spool
+from image_renditions import ImageProcessor, ImageProcessingError, probe
+from image_dedup import ImageIndex
+from event_stream import EventBroker, FirestoreEventFeed, stream_events
+from canteen_board import CanteenBoard
+from notification_writer import NotificationWriter
+from firestore_metrics import InstrumentedClient
+from request_metrics import RequestMetrics
+from order_queue import OrderQueue, OrderQueueWorker, LEASE_SECONDS
+from pagination import get_page_args, paginate_query, fetch_page, ndjson_response, DEFAULT_PAGE_SIZE
+import wallet_ledger
+from analytics_rollups import (
+    record_order_created, record_order_cancelled, record_user_created, load_dashboard
+)
 
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask App
-app = Flask(__name__)
-CORS(app)
+# All routes live on this blueprint; create_app() builds the Flask app around it
+api = Blueprint('api', __name__)
 
 # Add route to serve static files
-@app.route('/')
+@api.route('/')
 def serve_index():
     return send_from_directory('', 'index.html')
 
-@app.route('/templates/<path:path>')
+@api.route('/templates/<path:path>')
 def serve_template(path):
     return send_from_directory('templates', path)
 
-# Firebase Setup
-firebase_cred_path = os.getenv("FIREBASE_CREDENTIALS")  # Path to Firebase credentials JSON
-if not firebase_cred_path:
-    raise ValueError("FIREBASE_CREDENTIALS environment variable is not set.")
-cred = credentials.Certificate(firebase_cred_path)
+# Firebase Setup: `db` resolves the process-wide client on first use, so
+# importing this module doesn't initialise Firebase (see firebase_client.py).
+# Calls through it are counted and timed per request (see firestore_metrics.py);
+# FIRESTORE_METRICS=0 uses the bare client.
+db = firebase_client.db
+if os.getenv("FIRESTORE_METRICS", "1") != "0":
+    db = InstrumentedClient(db)
+
+# Server-Timing headers, JSON request log lines and GET /metrics
+request_metrics = RequestMetrics(log_requests=os.getenv("REQUEST_LOG", "1") != "0")
+
+# Shared in-memory product catalog (see catalog_cache.py)
+product_catalog = ProductCatalogCache(
+    db,
+    use_listener=os.getenv("PRODUCT_CACHE_LISTENER", "1") != "0"
+)
+
+IMGBB_API_KEY = os.getenv("IMGBB_API_KEY", '2119283ed75da85ab4d6d45e74dfda5b')
+
+# Product images go to ImgBB over a pooled session with retries (see image_upload.py).
+# With IMAGE_UPLOAD_ASYNC=1 (the default) the product is saved straight away with
+# image_status 'pending' and a background worker patches image_url in afterwards.
+# IMGBB_UPLOAD_URL can point at scripts/imgbb_stub.py for local runs.
+# Unless IMAGE_RENDITIONS=0, each image is decoded once in a process pool and
+# uploaded as WebP/JPEG renditions at several widths, listed in image_variants
+# (see image_renditions.py); image_url then points at the 800px JPEG.
+# Unless IMAGE_DEDUP=0, a SHA-256 index of uploaded bytes (see image_dedup.py)
+# lets re-uploads of the same photo reuse the stored URLs.
+IMAGE_UPLOAD_ASYNC = os.getenv("IMAGE_UPLOAD_ASYNC", "1") != "0"
+image_processor = None
+if os.getenv("IMAGE_RENDITIONS", "1") != "0":
+    image_processor = ImageProcessor(workers=int(os.getenv("IMAGE_PROCESS_WORKERS", 2)))
+image_index = None
+if os.getenv("IMAGE_DEDUP", "1") != "0":
+    image_index = ImageIndex(
+        os.getenv("IMAGE_DEDUP_PATH", "data/image_index.db"),
+        max_entries=int(os.getenv("IMAGE_DEDUP_MAX_ENTRIES", 10000))
+    )
+image_uploader = ImageUploader(
+    IMGBB_API_KEY,
+    upload_url=os.getenv("IMGBB_UPLOAD_URL", IMGBB_UPLOAD_URL),
+    timeout=(3.05, float(os.getenv("IMAGE_UPLOAD_TIMEOUT", 30))),
+    max_attempts=int(os.getenv("IMAGE_UPLOAD_ATTEMPTS", 3)),
+    workers=int(os.getenv("IMAGE_UPLOAD_WORKERS", 2)),
+    processor=image_processor,
+    index=image_index
+)
+
+# Verifies bearer tokens once and caches user documents (see auth.py).
+# Every write to a users document must be followed by auth.invalidate_user().
+# The JWT secret is set by create_app().
+auth = Authenticator(
+    None,
+    db,
+    user_cache_ttl=float(os.getenv("USER_CACHE_TTL", 30)),
+    user_cache_size=int(os.getenv("USER_CACHE_SIZE", 2048))
+)
+
+# Wallet transactions retry with backoff when they collide (see transaction_runner.py)
+wallet_transactions = TransactionRunner(
+    db,
+    max_attempts=int(os.getenv("WALLET_TXN_MAX_ATTEMPTS", 5))
+)
+
+# Pushed events (GET /events, see event_stream.py). Routes publish to the
+# in-process broker as they write; the Firestore feeds, started with the
+# background services, pick up writes made by other workers.
+event_broker = EventBroker(queue_size=int(os.getenv("SSE_QUEUE_SIZE", 100)))
+
+def limit_event_streams(worker_class, threads, worker_connections):
+    """Set SSE_MAX_STREAMS, the open streams one worker process accepts.
+
+    Under gthread (or sync) a stream holds a worker thread for up to
+    MAX_STREAM_SECONDS, so streams get at most half of the threads and
+    normal requests keep the rest; under gevent/eventlet a stream is a
+    greenlet and may use three quarters of worker_connections. The
+    SSE_MAX_STREAMS env var can only lower that. gunicorn.conf.py calls this
+    with the worker's actual settings; the defaults below cover the dev server.
+    """
+    global SSE_MAX_STREAMS
+    if 'gevent' in worker_class or 'eventlet' in worker_class:
+        slots = worker_connections * 3 // 4
+    else:
+        slots = threads // 2
+    SSE_MAX_STREAMS = min(int(os.getenv("SSE_MAX_STREAMS", slots)), slots)
+    return SSE_MAX_STREAMS
+
+limit_event_streams(
+    os.getenv("GUNICORN_WORKER_CLASS", "gthread"),
+    int(os.getenv("GUNICORN_THREADS", 16)),
+    int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 500))
+)
+
+def notification_payload(notification_id, notification_data):
+    # Same shape as the items of GET /notifications
+    timestamp = notification_data.get('timestamp')
+    return {
+        'id': notification_id,
+        'type': notification_data.get('type'),
+        'message': notification_data.get('message'),
+        'timestamp': timestamp.isoformat() if isinstance(timestamp, datetime) else datetime.now(pytz.UTC).isoformat(),
+        'read': notification_data.get('read', False),
+        'orderId': notification_data.get('order_id')
+    }
 
+def notification_events(notification_id, notification_data):
+    user_email = notification_data.get('user_email')
+    if user_email:
+        yield (f"user:{user_email}", 'notification',
+               notification_payload(notification_id, notification_data), notification_id)
+
+def order_status_events(order_id, order_data):
+    user_email = order_data.get('user_email')
+    status = order_data.get('status')
+    if user_email and status:
+        yield (f"user:{user_email}", 'order_status', {
+            'order_id': order_id,
+            'status': status,
+            'reason': order_data.get('status_reason', '')
+        }, f"order:{order_id}:{status}")
 
-firebase_admin.initialize_app(cred, {
-    'storageBucket': 'quickbyte-f4aba.firebasestorage.app'  # Replace this with your Firebase storage bucket URL
-    
-})
-db = firestore.client()
+def publish_events(events):
+    try:
+        for topic, event_type, data, event_id in events:
+            event_broker.publish(topic, event_type, data, event_id)
+    except Exception as e:
+        print(f"Error publishing event: {str(e)}")
 
-IMGBB_API_KEY = '2119283ed75da85ab4d6d45e74dfda5b'
+# Live canteen order board: one shared orders listener per status filter,
+# fanned out to every open board through the broker (see canteen_board.py)
+canteen_board = CanteenBoard(db, event_broker)
 
-# Secret key for JWT
-SECRET_KEY = os.getenv("SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("SECRET_KEY environment variable is not set.")
+event_feeds = []
+if os.getenv("SSE_FIRESTORE_FEED", "1") != "0":
+    event_feeds = [
+        FirestoreEventFeed(db, event_broker, 'notifications', 'timestamp', notification_events),
+        FirestoreEventFeed(db, event_broker, 'orders', 'updated_at', order_status_events)
+    ]
 
 # Helper function to generate a random token
 def generate_reset_token(length=6):
@@ -77,6 +219,33 @@ ORDER_STATUS = {
     'CANCELLED': 'cancelled'
 }
 
+# Status changes PUT /orders/status accepts: forward through the kitchen flow
+# (steps may be skipped) or a cancellation. Completed and cancelled orders
+# are final there; corrections go through PUT /orders/<order_id>/status.
+ORDER_TRANSITIONS = {
+    ORDER_STATUS['PENDING']: (ORDER_STATUS['ACCEPTED'], ORDER_STATUS['READY'],
+                              ORDER_STATUS['COMPLETED'], ORDER_STATUS['CANCELLED']),
+    ORDER_STATUS['ACCEPTED']: (ORDER_STATUS['READY'], ORDER_STATUS['COMPLETED'], ORDER_STATUS['CANCELLED']),
+    ORDER_STATUS['READY']: (ORDER_STATUS['COMPLETED'], ORDER_STATUS['CANCELLED']),
+    ORDER_STATUS['COMPLETED']: (),
+    ORDER_STATUS['CANCELLED']: ()
+}
+
+# Orders per bulk status request, and per transaction. A commit holds at
+# most 500 writes, and an order can take three: the order itself, its
+# refund's wallet ledger entry and (when no other order in the chunk shares
+# it) its user
+BULK_STATUS_MAX_ORDERS = int(os.getenv("BULK_STATUS_MAX_ORDERS", 500))
+BULK_STATUS_WRITES_PER_ORDER = 3
+BULK_STATUS_CHUNK_SIZE = 500 // BULK_STATUS_WRITES_PER_ORDER
+
+# Notification sent to the customer when their order moves to a status
+ORDER_STATUS_MESSAGES = {
+    'ready': 'Your order is ready for pickup! 🍽️',
+    'completed': 'Your order has been completed. Thank you for ordering from us! 🤗',
+    'cancelled': 'Your order has been cancelled and refunded. 💰'
+}
+
 # Add this constant for time slots
 MEAL_TIMINGS = {
     'MORNING_BREAK': {
@@ -100,23 +269,25 @@ MEAL_TIMINGS = {
 NOTIFICATION_TYPES = {
     'ORDER_READY': 'order_ready',
     'ORDER_CANCELLED': 'order_cancelled',
-    'REFUND_PROCESSED': 'refund_processed'
+    'REFUND_PROCESSED': 'refund_processed',
+    'ORDER_FAILED': 'order_failed'
 }
 
-# Add these constants for loyalty tiers
-LOYALTY_TIERS = {
-    'BRONZE': {'min_spent': 0, 'points_multiplier': 1},
-    'SILVER': {'min_spent': 1000, 'points_multiplier': 1.2},
-    'GOLD': {'min_spent': 5000, 'points_multiplier': 1.5},
-    'PLATINUM': {'min_spent': 10000, 'points_multiplier': 2}
-}
+# Notifications are written in batches from a background thread (see
+# notification_writer.py), so a status change doesn't wait for the write and
+# a burst of them shares one commit. NOTIFICATION_WRITER_ASYNC=0 writes inline.
+notification_writer = None
+if os.getenv("NOTIFICATION_WRITER_ASYNC", "1") != "0":
+    notification_writer = NotificationWriter(
+        db,
+        batch_size=int(os.getenv("NOTIFICATION_BATCH_SIZE", 500)),
+        flush_interval=float(os.getenv("NOTIFICATION_FLUSH_MS", 200)) / 1000,
+        max_pending=int(os.getenv("NOTIFICATION_MAX_PENDING", 10000))
+    )
 
 # Add helper function for creating notifications
 def create_notification(user_email, type, message, order_id=None):
     try:
-        # Create notification with auto-generated ID
-        notification_ref = db.collection('notifications').document()
-        
         notification_data = {
             'user_email': user_email,
             'type': type,
@@ -126,8 +297,15 @@ def create_notification(user_email, type, message, order_id=None):
             'read': False
         }
         
-        # Set the notification document
-        notification_ref.set(notification_data)
+        if notification_writer is not None:
+            notification_id = notification_writer.enqueue(notification_data)
+        else:
+            # Create notification with auto-generated ID
+            notification_ref = db.collection('notifications').document()
+            notification_ref.set(notification_data)
+            notification_id = notification_ref.id
+        # Pushed now; the Firestore feed drops the echo once the write lands
+        publish_events(notification_events(notification_id, notification_data))
         
         print(f"Created notification for {user_email}: {message}")  # Debug log
         return True
@@ -135,102 +313,91 @@ def create_notification(user_email, type, message, order_id=None):
         print(f"Error creating notification: {str(e)}")  # Error log
         return False
 
-# Add this function to calculate time-based analytics
-def calculate_time_based_analytics(orders, period):
-    """Calculate revenue and order analytics for different time periods."""
-    from datetime import datetime, timedelta
-    import pytz
-    
-    # Initialize result
-    result = []
-    
-    # Define time periods and formatting
-    if period == 'daily':
-        days = 7  # Last 7 days
-        date_format = '%b %d'  # e.g., "Jan 01"
-    elif period == 'weekly':
-        days = 28  # Last 4 weeks
-        date_format = 'Week %W'  # e.g., "Week 01"
-    elif period == 'monthly':
-        days = 180  # Last 6 months
-        date_format = '%b %Y'  # e.g., "Jan 2023"
-    else:
-        return []
-        
-    # Get current time and timezone
-    now = datetime.now(pytz.UTC)
-    
-    # Create buckets based on period
-    date_buckets = {}
-    
-    for i in range(days, -1, -1):
-        if period == 'daily':
-            date_key = (now - timedelta(days=i)).strftime(date_format)
-            date_buckets[date_key] = {'revenue': 0, 'orders': 0, 'date': (now - timedelta(days=i)).isoformat()}
-        elif period == 'weekly':
-            # Group by week
-            week_date = now - timedelta(days=i)
-            week_key = week_date.strftime(date_format)
-            if week_key not in date_buckets:
-                date_buckets[week_key] = {'revenue': 0, 'orders': 0, 'date': week_date.isoformat()}
-        elif period == 'monthly':
-            # Group by month
-            month_date = now - timedelta(days=i)
-            month_key = month_date.strftime(date_format)
-            if month_key not in date_buckets:
-                date_buckets[month_key] = {'revenue': 0, 'orders': 0, 'date': month_date.isoformat()}
-    
-    # Process orders
-    for order in orders:
-        # Skip if no created_at timestamp
-        if not order.get('created_at'):
-            continue
-        
-        # Get order date and convert to datetime if it's a string
-        order_date = order.get('created_at')
-        if isinstance(order_date, str):
-            try:
-                order_date = datetime.fromisoformat(order_date.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                continue
-        
-        # Skip orders older than our period
-        if (now - order_date).days > days:
-            continue
-            
-        # Skip cancelled orders for revenue calculation
-        is_cancelled = order.get('status') == 'cancelled'
-            
-        # Format date based on period
-        if period == 'daily':
-            date_key = order_date.strftime(date_format)
-        elif period == 'weekly':
-            date_key = order_date.strftime(date_format)
-        elif period == 'monthly':
-            date_key = order_date.strftime(date_format)
+# Keep the order aggregates (product sales, dashboard rollups) in step with order writes
+def record_order_event(order_data, event, created_at=None):
+    """event is 'created', 'cancelled' or 'uncancelled'"""
+    created_at = created_at or order_data.get('created_at')
+    total = order_data.get('total', 0)
+
+    try:
+        record_order_sales(
+            db,
+            order_data.get('items', []),
+            created_at,
+            sign=-1 if event == 'cancelled' else 1
+        )
+    except Exception as e:
+        print(f"Error updating product sales aggregates: {str(e)}")
+
+    try:
+        if event == 'created':
+            record_order_created(db, total, created_at)
+        elif event == 'cancelled':
+            record_order_cancelled(db, total, order_data.get('refund_amount', total), created_at)
+        elif event == 'uncancelled':
+            record_order_cancelled(db, total, order_data.get('refund_amount', 0), created_at, sign=-1)
+    except Exception as e:
+        print(f"Error updating analytics rollups: {str(e)}")
+
+# Keep the user/canteen counters on the admin dashboard in step with account writes
+def record_user_event(role='user', sign=1):
+    try:
+        record_user_created(db, role, sign=sign)
+    except Exception as e:
+        print(f"Error updating analytics rollups: {str(e)}")
+
+# Reject uploads that aren't images (or are too big) while the admin is still waiting
+def check_image(image):
+    if image and image_processor is not None:
+        probe(image.stream)
+
+# Queue a product image for background upload. Returns the fields to save on
+# the product now; the worker fills in image_url (and image_variants) once
+# the upload is done.
+def start_image_upload(product_id, image):
+    """(image fields to save with the product, function that starts the upload or None)
+
+    Call the function only once those fields are written: the upload's
+    callback looks for its image_upload_id on the product, and it can run
+    before submit() even returns (inline when the upload queue is full).
+    """
+    # Same bytes as an earlier upload: reuse its URLs, nothing to upload
+    digest, image_fields = image_uploader.find_uploaded(image.stream)
+    if image_fields is not None:
+        return {**image_fields, "image_status": "ready", "image_upload_id": None, "image_error": None}, None
+
+    upload_id = str(uuid.uuid4())
+    fileobj = spool(image.stream)
+
+    def on_done(image_fields, error):
+        if image_fields:
+            fields = {**image_fields, "image_status": "ready", "image_error": None}
         else:
-            continue
-            
-        # Add to appropriate bucket
-        if date_key in date_buckets:
-            # Add order count
-            date_buckets[date_key]['orders'] += 1
-            
-            # Add revenue if not cancelled
-            if not is_cancelled:
-                date_buckets[date_key]['revenue'] += order.get('total', 0)
-    
-    # Convert buckets to list format for chart
-    for date, data in date_buckets.items():
-        result.append({
-            'date': date,
-            'value': data['revenue']  # Default to revenue
-        })
-    
-    return result
+            fields = {"image_status": "failed", "image_error": error}
+
+        @firestore.transactional
+        def save_in_transaction(transaction, product_ref):
+            snapshot = product_ref.get(transaction=transaction)
+            # Skip if the product was deleted or a newer image was uploaded since
+            if not snapshot.exists or (snapshot.to_dict() or {}).get('image_upload_id') != upload_id:
+                return False
+            transaction.update(product_ref, fields)
+            return True
+
+        try:
+            product_ref = db.collection("products").document(product_id)
+            if save_in_transaction(db.transaction(), product_ref):
+                product_catalog.update(product_id, fields)
+        except Exception as e:
+            print(f"Error saving uploaded image for {product_id}: {str(e)}")
+
+    def submit():
+        image_uploader.submit(fileobj, image.filename, image.content_type, on_done, digest=digest)
+
+    return {"image_status": "pending", "image_upload_id": upload_id, "image_error": None}, submit
 
 # Add Product
-@app.route('/add-product', methods=['POST'])
+@api.route('/add-product', methods=['POST'])
 def add_product():
     name = request.form.get('name')
     price = request.form.get('price')
@@ -241,32 +408,17 @@ def add_product():
     if not name or not price or not availability or not category:  # Update validation
         return jsonify({"error": "All fields are required"}), 400
 
-    # ImgBB upload
-    image_url = None
-    if image:
+    try:
+        check_image(image)
+    except ImageProcessingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    image_fields = {"image_url": None}
+    if image and not IMAGE_UPLOAD_ASYNC:
         try:
-            # Create ImgBB API URL
-            url = "https://api.imgbb.com/1/upload"
-            
-            # Read image file
-            image_bytes = image.read()
-            
-            # Prepare the payload
-            files = {
-                'image': (image.filename, image_bytes, image.content_type)
-            }
-            payload = {'key': IMGBB_API_KEY}
-            
-            # Make the API request
-            response = requests.post(url, files=files, data=payload)
-            
-            if response.status_code == 200:
-                image_url = response.json()['data']['url']
-            else:
-                return jsonify({"error": f"Image upload failed: {response.text}"}), 500
-                
+            image_fields = image_uploader.upload_image(image.stream, image.filename, image.content_type)
         except Exception as e:
-            return jsonify({"error": f"Error uploading image: {str(e)}"}), 500
+            return jsonify({"error": f"Image upload failed: {str(e)}"}), 500
 
     try:
         product_ref = db.collection("products").document(name)
@@ -275,10 +427,18 @@ def add_product():
             "price": float(price),
             "category": category,  # Add this line
             "availability": availability,
-            "image_url": image_url
+            **image_fields
         }
+        submit_upload = None
+        if image and IMAGE_UPLOAD_ASYNC:
+            image_fields, submit_upload = start_image_upload(name, image)
+            product_data.update(image_fields)
         
         product_ref.set(product_data)
+        product_catalog.put(name, product_data)
+        # Only now that the product (and its upload id) exists
+        if submit_upload is not None:
+            submit_upload()
 
         return jsonify({
             "success": True,  # Add success flag
@@ -293,7 +453,7 @@ def add_product():
         }), 500
 
 # Update Product
-@app.route('/update-product/<product_id>', methods=['PUT'])
+@api.route('/update-product/<product_id>', methods=['PUT'])
 def update_product(product_id):
     try:
         # Get data from request.form
@@ -312,7 +472,7 @@ def update_product(product_id):
         product_ref = db.collection("products").document(product_id)
         
         # Check if product exists
-        if not product_ref.get().exists:
+        if product_catalog.get(product_id) is None:
             return jsonify({
                 "success": False,
                 "message": "Product not found"
@@ -327,32 +487,34 @@ def update_product(product_id):
         }
 
         # Handle image upload if new image is provided
-        if image:
+        try:
+            check_image(image)
+        except ImageProcessingError as e:
+            return jsonify({
+                "success": False,
+                "message": str(e)
+            }), 400
+
+        submit_upload = None
+        if image and IMAGE_UPLOAD_ASYNC:
+            # The current image stays up until the new one has uploaded
+            image_fields, submit_upload = start_image_upload(product_id, image)
+            update_data.update(image_fields)
+        elif image:
             try:
-                url = "https://api.imgbb.com/1/upload"
-                image_bytes = image.read()
-                files = {
-                    'image': (image.filename, image_bytes, image.content_type)
-                }
-                payload = {'key': IMGBB_API_KEY}
-                
-                response = requests.post(url, files=files, data=payload)
-                
-                if response.status_code == 200:
-                    update_data["image_url"] = response.json()['data']['url']
-                else:
-                    return jsonify({
-                        "success": False,
-                        "message": "Failed to upload image"
-                    }), 500
+                update_data.update(image_uploader.upload_image(image.stream, image.filename, image.content_type))
             except Exception as e:
                 return jsonify({
                     "success": False,
-                    "message": f"Error uploading image: {str(e)}"
+                    "message": f"Failed to upload image: {str(e)}"
                 }), 500
 
         # Update the product
         product_ref.update(update_data)
+        product_catalog.update(product_id, update_data)
+        # Only now that the product carries the new upload id
+        if submit_upload is not None:
+            submit_upload()
 
         return jsonify({
             "success": True,
@@ -367,25 +529,19 @@ def update_product(product_id):
         }), 500
 
 # Delete Product
-@app.route('/delete-product/<product_id>', methods=['DELETE'])
+@api.route('/delete-product/<product_id>', methods=['DELETE'])
 def delete_product(product_id):
     product_ref = db.collection("products").document(product_id)
     product_ref.delete()
+    product_catalog.remove(product_id)
 
     return jsonify({"message": "Product deleted successfully"}), 200
 
 # Get All Products
-@app.route('/get-products', methods=['GET'])
+@api.route('/get-products', methods=['GET'])
 def get_products():
     try:
-        products_ref = db.collection("products")
-        products = products_ref.stream()
-
-        product_list = []
-        for product in products:
-            product_data = product.to_dict()
-            product_data["id"] = product.id
-            product_list.append(product_data)
+        product_list = product_catalog.all()
 
         return jsonify(product_list), 200
     except Exception as e:
@@ -393,7 +549,7 @@ def get_products():
         return jsonify([]), 200  # Return empty array instead of error
 
 # Request Refund
-@app.route('/request-refund', methods=['POST'])
+@api.route('/request-refund', methods=['POST'])
 def request_refund():
     data = request.json
     user_email = data.get('email')
@@ -414,7 +570,7 @@ def request_refund():
     return jsonify({"message": "Refund request submitted"}), 201
 
 # Process Refund (Admin only)
-@app.route('/process-refund/<refund_id>', methods=['PUT'])
+@api.route('/process-refund/<refund_id>', methods=['PUT'])
 def process_refund(refund_id):
     data = request.json
     status = data.get('status')
@@ -430,7 +586,7 @@ def process_refund(refund_id):
 
 
 # ✅ SIGNUP Route
-@app.route('/signup', methods=['POST'])
+@api.route('/signup', methods=['POST'])
 def signup():
     data = request.json
     email = data.get('email')
@@ -450,20 +606,28 @@ def signup():
     if user_ref.get().exists:
         return jsonify({"error": "User already exists"}), 400
 
-    # Save user details including name
-    user_ref.set({
+    # Save user details including name, with the welcome bonus in the wallet ledger
+    batch = db.batch()
+    batch.set(user_ref, {
         "email": email,
         "password": hashed_password,
         "name": name,  # Store name in Firestore
-        "wallet_balance": 50.00,  # Default wallet balance
-        "created_at": firestore.SERVER_TIMESTAMP  # Add created_at field
+        "wallet_balance": wallet_ledger.WELCOME_BONUS_AMOUNT,  # Default wallet balance
+        "created_at": firestore.SERVER_TIMESTAMP,  # Add created_at field
+        wallet_ledger.BACKFILL_FIELD: True  # nothing from before the ledger to backfill
     })
+    wallet_ledger.record(
+        batch, db, email, wallet_ledger.WELCOME_BONUS, wallet_ledger.WELCOME_BONUS_AMOUNT,
+        'Welcome bonus credit', entry_id=wallet_ledger.welcome_entry_id(email)
+    )
+    batch.commit()
+    record_user_event()
 
     return jsonify({"message": "User registered successfully"}), 201
 
 
 # ✅ LOGIN Route
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     try:
         data = request.json
@@ -500,7 +664,7 @@ def login():
                 "name": user_data.get('name'),
                 "exp": expiration.timestamp()  # Convert to timestamp
             },
-            SECRET_KEY,
+            current_app.config['SECRET_KEY'],
             algorithm="HS256"
         )
 
@@ -518,7 +682,7 @@ def login():
         return jsonify({"error": "Login failed"}), 500
 
 # Add a route to create canteen account (admin only)
-@app.route('/create-canteen', methods=['POST'])
+@api.route('/create-canteen', methods=['POST'])
 def create_canteen():
     data = request.json
     email = data.get('email')
@@ -541,11 +705,12 @@ def create_canteen():
         "role": "canteen",
         "created_at": firestore.SERVER_TIMESTAMP
     })
+    record_user_event('canteen')
 
     return jsonify({"message": "Canteen account created successfully"}), 201
 
 # ✅ FORGOT PASSWORD - Request Reset Token
-@app.route('/forgot-password', methods=['POST'])
+@api.route('/forgot-password', methods=['POST'])
 def forgot_password():
     data = request.json
     email = data.get('email')
@@ -561,6 +726,7 @@ def forgot_password():
 
     reset_token = generate_reset_token()
     user_ref.update({"reset_token": reset_token})
+    auth.invalidate_user(email)
 
     # Simulating email sending (replace with real email service)
     print(f"Reset token for {email}: {reset_token}")
@@ -568,7 +734,7 @@ def forgot_password():
     return jsonify({"message": "Reset token sent to email"}), 200
 
 # ✅ FORGOT PASSWORD - Reset Confirmation
-@app.route('/reset-password', methods=['POST'])
+@api.route('/reset-password', methods=['POST'])
 def reset_password():
     data = request.json
     email = data.get('email')
@@ -592,37 +758,31 @@ def reset_password():
 
     hashed_password = pbkdf2_sha256.hash(new_password)  # ✅ Securely hashing new password
     user_ref.update({"password": hashed_password, "reset_token": None})
+    auth.invalidate_user(email)
 
     return jsonify({"message": "Password reset successfully"}), 200
 
 # ✅ CHECK USER DETAILS
-@app.route('/user', methods=['GET'])
+@api.route('/user', methods=['GET'])
 def get_user():
     try:
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             return jsonify({"error": "Token required"}), 401
 
-        # Extract token from Bearer header
-        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
-
         try:
             # Verify token
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = auth.current_claims()
             email = decoded.get("email")
             
             if not email:
                 return jsonify({"error": "Invalid token format"}), 401
 
             # Get user document
-            user_ref = db.collection("users").document(email)
-            user_doc = user_ref.get()
+            user_data = auth.get_user(email)
 
-            # Check if user exists (using exists as a property, not a method)
-            if not user_doc.exists:
+            if user_data is None:
                 return jsonify({"error": "User not found"}), 404
-
-            user_data = user_doc.to_dict()
             
             return jsonify({
                 "email": email,
@@ -641,17 +801,10 @@ def get_user():
         return jsonify({"error": "Internal server error"}), 500
 
 # Add a new route to get available food items
-@app.route('/products/available', methods=['GET'])
+@api.route('/products/available', methods=['GET'])
 def get_available_products():
     try:
-        products_ref = db.collection("products")
-        products = products_ref.where('availability', '==', 'available').stream()
-
-        product_list = []
-        for product in products:
-            product_data = product.to_dict()
-            product_data["id"] = product.id
-            product_list.append(product_data)
+        product_list = product_catalog.available()
 
         return jsonify({
             "success": True,
@@ -661,7 +814,7 @@ def get_available_products():
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
-@app.route('/wallet/redeem', methods=['POST'])
+@api.route('/wallet/redeem', methods=['POST'])
 def redeem_coupon():
     try:
         # Get and validate request data
@@ -746,6 +899,11 @@ def redeem_coupon():
                 'used_at': firestore.SERVER_TIMESTAMP
             })
 
+            wallet_ledger.record(
+                transaction, db, user_email, wallet_ledger.COUPON, coupon_amount,
+                f"Coupon redeemed: {voucher_code}", entry_id=wallet_ledger.coupon_entry_id(voucher_code)
+            )
+
         # Execute transaction
         try:
             update_wallet_and_coupon(transaction, user_ref, coupon_ref)
@@ -755,6 +913,8 @@ def redeem_coupon():
                 "success": False,
                 "message": "Failed to process coupon"
             }), 500
+        finally:
+            auth.invalidate_user(user_email)
 
         # Return success response
         return jsonify({
@@ -772,7 +932,7 @@ def redeem_coupon():
         }), 500
 
 # New endpoint: Generate coupon
-@app.route('/coupons', methods=['POST'])
+@api.route('/coupons', methods=['POST'])
 def generate_coupon():
     try:
         data = request.json
@@ -830,29 +990,39 @@ def generate_coupon():
         }), 500
 
 # New endpoint: Get all coupon generation history
-@app.route('/coupons/history', methods=['GET'])
+@api.route('/coupons/history', methods=['GET'])
 def coupon_history():
     try:
+        limit, cursor, ndjson = get_page_args(request.args)
         coupons_ref = db.collection("coupons")
-        coupons = coupons_ref.order_by("created_at", direction=firestore.Query.DESCENDING).stream()
-        coupon_list = []
-        for coupon in coupons:
+        query = paginate_query(coupons_ref, coupons_ref, "created_at", limit, cursor)
+
+        def serialize(coupon):
             data = coupon.to_dict()
             data["code"] = coupon.id  # using document id as code
-            coupon_list.append(data)
-        return jsonify({"success": True, "coupons": coupon_list}), 200
+            return data
+
+        if ndjson:
+            return ndjson_response(query, serialize, "created_at", limit)
+
+        coupon_list, next_cursor = fetch_page(query, "created_at", limit, serialize)
+        response = {"success": True, "coupons": coupon_list}
+        if limit:
+            response["next_cursor"] = next_cursor
+        return jsonify(response), 200
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 # Reverted endpoint: Get redeemed coupon history for a user
-@app.route('/coupons/user-history', methods=['GET'])
+@api.route('/coupons/user-history', methods=['GET'])
 def user_coupon_history():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"success": False, "message": "Token required"}), 401
-        # Revert to extracting email via jwt.decode directly
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
         if not user_email:
             return jsonify({"success": False, "message": "Unable to extract user email from token"}), 400
@@ -869,18 +1039,14 @@ def user_coupon_history():
         return jsonify({"success": False, "message": str(e)}), 500
 
 # New route to get a single product
-@app.route('/products/<product_id>', methods=['GET'])
+@api.route('/products/<product_id>', methods=['GET'])
 def get_product(product_id):
     try:
-        product_ref = db.collection("products").document(product_id)
-        product = product_ref.get()
+        product_data = product_catalog.get(product_id)
         
-        if not product.exists:
+        if product_data is None:
             return jsonify({"success": False, "message": "Product not found"}), 404
         
-        product_data = product.to_dict()
-        product_data['id'] = product.id
-        
         return jsonify({
             "success": True,
             "product": product_data
@@ -891,8 +1057,295 @@ def get_product(product_id):
             "message": str(e)
         }), 500
 
+def require_admin():
+    """Error response unless the request carries an admin token, else None.
+
+    Guards the operational endpoints, which expose internals and must not be
+    open to everyone.
+    """
+    if not request.headers.get("Authorization"):
+        return jsonify({"error": "Token required"}), 401
+    try:
+        decoded = auth.current_claims()
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token has expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    if decoded.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+    return None
+
+def require_metrics_access():
+    """Like require_admin, but a scraper may also present METRICS_TOKEN (when set)"""
+    metrics_token = os.getenv("METRICS_TOKEN")
+    token = auth.extract_token(request.headers.get("Authorization"))
+    if metrics_token and token and hmac.compare_digest(token, metrics_token):
+        return None
+    return require_admin()
+
+# Product catalog cache statistics
+@api.route('/products/cache/stats', methods=['GET'])
+def product_cache_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({
+        "success": True,
+        "stats": product_catalog.stats()
+    }), 200
+
+# Force a reload of the product catalog cache
+@api.route('/products/cache/refresh', methods=['POST'])
+def refresh_product_cache():
+    denied = require_admin()
+    if denied:
+        return denied
+    try:
+        count = product_catalog.refresh()
+        return jsonify({
+            "success": True,
+            "message": "Product cache refreshed",
+            "count": count
+        }), 200
+    except Exception as e:
+        print(f"Error refreshing product cache: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 500
+
+# Queued order intake (ORDER_QUEUE_ENABLED=1): create_order reserves the wallet
+# funds, appends the order to a local SQLite queue and returns 202; background
+# workers then write queued orders to Firestore in batches (see order_queue.py)
+def reserve_wallet_funds(user_email, order_id, amount, cashback=0):
+    """Deduct an order's total (and credit any cashback) with a reservation marker"""
+    user_ref = db.collection('users').document(user_email)
+
+    def reserve_in_transaction(transaction, user_ref):
+        user_doc = user_ref.get(transaction=transaction)
+        if not user_doc.exists:
+            raise ValueError('User not found')
+
+        current_balance = user_doc.to_dict().get('wallet_balance', 0)
+        if current_balance < amount:
+            raise ValueError('Insufficient balance')
+
+        transaction.update(user_ref, {
+            'wallet_balance': current_balance - amount + cashback,
+            f'pending_orders.{order_id}': amount
+        })
+
+    try:
+        wallet_transactions.run(reserve_in_transaction, user_ref)
+    finally:
+        auth.invalidate_user(user_email)
+
+def release_wallet_funds(user_email, order_id, amount, cashback=0):
+    """Undo a reservation that never made it into the queue"""
+    user_ref = db.collection('users').document(user_email)
+    transaction = db.transaction()
+
+    @firestore.transactional
+    def release_in_transaction(transaction, user_ref):
+        user_doc = user_ref.get(transaction=transaction)
+        pending = (user_doc.to_dict() or {}).get('pending_orders', {}) if user_doc.exists else {}
+        if order_id not in pending:
+            return
+        transaction.update(user_ref, {
+            'wallet_balance': firestore.Increment(amount - cashback),
+            f'pending_orders.{order_id}': firestore.DELETE_FIELD
+        })
+
+    release_in_transaction(transaction, user_ref)
+    auth.invalidate_user(user_email)
+
+def enqueue_order(order_data, coupon_data=None):
+    order_id = order_data['order_id']
+    user_email = order_data['user_email']
+    total = order_data['total']
+    cashback = coupon_data.get('cashback', 0) if coupon_data else 0
+
+    payload = {
+        'order': {**order_data, 'created_at': datetime.now(pytz.UTC).isoformat()},
+        'coupon': coupon_data
+    }
+
+    # Written before the reservation so a crash in between can be resolved on
+    # restart by checking the user's pending_orders marker
+    order_queue.add(order_id, payload, state='reserving')
+    try:
+        reserve_wallet_funds(user_email, order_id, total, cashback)
+    except ValueError as e:
+        order_queue.remove([order_id])
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except TransactionContention:
+        order_queue.remove([order_id])
+        return jsonify({
+            'success': False,
+            'message': 'Wallet is busy, please try again'
+        }), 409
+    except Exception:
+        order_queue.remove([order_id])
+        raise
+
+    try:
+        order_queue.set_state(order_id, 'queued')
+    except Exception:
+        release_wallet_funds(user_email, order_id, total, cashback)
+        raise
+    order_queue_worker.notify()
+
+    return jsonify({
+        'success': True,
+        'message': 'Order accepted',
+        'order_id': order_id,
+        'status': 'queued'
+    }), 202
+
+def write_queued_orders(entries):
+    """Write a batch of queued orders to Firestore and return the entries written.
+
+    A batch is replayed if its lease runs out before it leaves the queue (a
+    crash after the commit, a slow commit), and by then the order may have
+    been accepted or cancelled. Orders are therefore created, never
+    overwritten: a replay fails with AlreadyExists, and one order on its own
+    that already exists is skipped as committed.
+    """
+    batch = db.batch()
+    for order_id, payload in entries:
+        order_data = dict(payload['order'])
+        order_data['created_at'] = datetime.fromisoformat(order_data['created_at'])
+        user_email = order_data['user_email']
+
+        batch.create(db.collection('orders').document(order_id), order_data)
+        batch.set(db.collection('users').document(user_email), {
+            'pending_orders': {order_id: firestore.DELETE_FIELD}
+        }, merge=True)
+
+        # The debit and cashback were applied with the reservation; the ledger
+        # entries are written with the order, so a released reservation never
+        # shows up in the history
+        wallet_ledger.record(
+            batch, db, user_email, wallet_ledger.ORDER, -order_data['total'],
+            wallet_ledger.payment_description(order_id, order_data),
+            entry_id=wallet_ledger.payment_entry_id(order_id), order_id=order_id,
+            timestamp=order_data['created_at']
+        )
+        coupon_data = payload.get('coupon')
+        if coupon_data:
+            wallet_ledger.record(
+                batch, db, user_email, wallet_ledger.CASHBACK, coupon_data['cashback'],
+                f'Cashback from coupon {coupon_data["code"]}',
+                entry_id=wallet_ledger.cashback_entry_id(order_id), order_id=order_id
+            )
+    try:
+        batch.commit()
+    except AlreadyExists:
+        if len(entries) > 1:
+            # The worker retries the orders one at a time to find which exist
+            raise
+        return []
+    return entries
+
+def after_queued_orders(entries):
+    for order_id, payload in entries:
+        order_data = payload['order']
+        record_order_event(order_data, 'created', created_at=order_data['created_at'])
+        auth.invalidate_user(order_data['user_email'])
+
+def fail_queued_orders(entries):
+    """Refund and notify the users of orders the queue gave up on"""
+    for order_id, payload in entries:
+        order_data = payload['order']
+        coupon_data = payload.get('coupon')
+        cashback = coupon_data.get('cashback', 0) if coupon_data else 0
+        try:
+            release_wallet_funds(order_data['user_email'], order_id, order_data['total'], cashback)
+        except Exception as e:
+            print(f"Error releasing funds for failed order {order_id}: {str(e)}")
+            continue
+        create_notification(
+            order_data['user_email'],
+            NOTIFICATION_TYPES['ORDER_FAILED'],
+            f"Your order #{order_id[:8]} could not be placed. ₹{order_data['total'] - cashback:.2f} has been returned to your wallet.",
+            order_id
+        )
+
+def recover_order_queue():
+    """Resolve entries left in 'reserving' by a crash between enqueue and reservation"""
+    for order_id, payload in order_queue.entries('reserving', older_than=LEASE_SECONDS):
+        user_doc = db.collection('users').document(payload['order']['user_email']).get()
+        pending = user_doc.to_dict().get('pending_orders', {}) if user_doc.exists else {}
+        if order_id in pending:
+            order_queue.set_state(order_id, 'queued')
+        else:
+            order_queue.remove([order_id])
+
+# Each queued order is up to 4 writes in its batch (the order, the user's
+# pending_orders marker, the payment and cashback ledger entries), so a
+# batch can't hold more than 500 // 4 of them
+ORDER_QUEUE_WRITES_PER_ORDER = 4
+ORDER_QUEUE_MAX_BATCH_SIZE = 500 // ORDER_QUEUE_WRITES_PER_ORDER
+
+order_queue = None
+order_queue_worker = None
+if os.getenv("ORDER_QUEUE_ENABLED", "0") == "1":
+    order_queue = OrderQueue(os.getenv("ORDER_QUEUE_PATH", "data/order_queue.db"))
+    order_queue_worker = OrderQueueWorker(
+        order_queue,
+        write_queued_orders,
+        after_commit=after_queued_orders,
+        workers=int(os.getenv("ORDER_QUEUE_WORKERS", 2)),
+        batch_size=min(int(os.getenv("ORDER_QUEUE_BATCH_SIZE", 100)), ORDER_QUEUE_MAX_BATCH_SIZE),
+        max_attempts=int(os.getenv("ORDER_QUEUE_MAX_ATTEMPTS", 8)),
+        on_failed=fail_queued_orders
+    )
+
+@api.route('/orders/queue/stats', methods=['GET'])
+def order_queue_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    if order_queue_worker is None:
+        return jsonify({
+            'success': True,
+            'enabled': False
+        }), 200
+
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': order_queue_worker.stats()
+    }), 200
+
+@api.route('/images/uploads/stats', methods=['GET'])
+def image_upload_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({
+        'success': True,
+        'async': IMAGE_UPLOAD_ASYNC,
+        'stats': image_uploader.stats(),
+        'processing': image_processor.stats() if image_processor is not None else None,
+        'dedup': image_index.stats() if image_index is not None else None
+    }), 200
+
+@api.route('/orders/transactions/stats', methods=['GET'])
+def wallet_transaction_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({
+        'success': True,
+        'stats': wallet_transactions.stats()
+    }), 200
+
 # Add new routes for orders
-@app.route('/orders', methods=['POST'])
+@api.route('/orders', methods=['POST'])
 def create_order():
     try:
         data = request.json
@@ -916,16 +1369,6 @@ def create_order():
         delivery_charge = DELIVERY_LOCATIONS[delivery_option]['charge']
         total = subtotal + delivery_charge
 
-        # Fetch user's wallet balance
-        user_ref = db.collection('users').document(user_email)
-        user_data = user_ref.get().to_dict()
-        
-        if user_data['wallet_balance'] < total:
-            return jsonify({
-                'success': False,
-                'message': 'Insufficient balance'
-            }), 400
-
         # Create order with enriched items including both original and discounted prices
         order_ref = db.collection('orders').document()
         order_data = {
@@ -952,50 +1395,56 @@ def create_order():
             'timing_slot': MEAL_TIMINGS.get(meal_timing, {})  # Add timing slot information
         }
 
-        # Update user wallet and create order in transaction
-        transaction = db.transaction()
+        # Queued intake: reserve funds, persist locally and respond immediately
+        if order_queue is not None:
+            return enqueue_order(order_data, data.get('coupon'))
 
-        @firestore.transactional
-        def create_order_transaction(transaction, user_ref, order_ref, order_data, current_balance):
-            new_balance = current_balance - total
-            transaction.update(user_ref, {'wallet_balance': new_balance})
+        user_ref = db.collection('users').document(user_email)
+        coupon_data = data.get('coupon')
+        cashback = coupon_data.get('cashback', 0) if coupon_data else 0
+
+        # Wallet check, debit, cashback credit, order and ledger entry all
+        # commit together, so concurrent orders can't spend the same balance
+        def create_order_transaction(transaction):
+            user_doc = user_ref.get(transaction=transaction)
+            if not user_doc.exists:
+                raise ValueError('User not found')
+
+            current_balance = user_doc.to_dict().get('wallet_balance', 0)
+            if current_balance < total:
+                raise ValueError('Insufficient balance')
+
+            transaction.update(user_ref, {'wallet_balance': current_balance - total + cashback})
             transaction.set(order_ref, order_data)
 
-        create_order_transaction(
-            transaction, 
-            user_ref, 
-            order_ref, 
-            order_data, 
-            user_data['wallet_balance']
-        )
+            wallet_ledger.record(
+                transaction, db, user_email, wallet_ledger.ORDER, -total,
+                wallet_ledger.payment_description(order_ref.id, order_data),
+                entry_id=wallet_ledger.payment_entry_id(order_ref.id), order_id=order_ref.id
+            )
+            if coupon_data:
+                wallet_ledger.record(
+                    transaction, db, user_email, wallet_ledger.CASHBACK, cashback,
+                    f'Cashback from coupon {coupon_data.get("code")}',
+                    entry_id=wallet_ledger.cashback_entry_id(order_ref.id), order_id=order_ref.id
+                )
 
-        # Handle coupon if applied
-        coupon_data = data.get('coupon')
-        if coupon_data:
-            try:
-                # Add cashback to user's wallet
-                current_balance = user_data.get('wallet_balance', 0) - total  # Subtract order total first
-                new_balance = current_balance + coupon_data['cashback']
-                
-                # Update wallet balance
-                user_ref.update({
-                    'wallet_balance': new_balance
-                })
-                
-                # Create cashback transaction record
-                transaction_ref = db.collection('transactions').document()
-                transaction_ref.set({
-                    'user_email': user_email,
-                    'type': 'CASHBACK',
-                    'amount': coupon_data['cashback'],
-                    'description': f'Cashback from coupon {coupon_data["code"]}',
-                    'order_id': order_ref.id,
-                    'timestamp': firestore.SERVER_TIMESTAMP
-                })
+        try:
+            wallet_transactions.run(create_order_transaction)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        except TransactionContention:
+            return jsonify({
+                'success': False,
+                'message': 'Wallet is busy, please try again'
+            }), 409
+        finally:
+            auth.invalidate_user(user_email)
 
-            except Exception as e:
-                print(f"Error processing coupon cashback: {str(e)}")
-                # Continue with order creation even if cashback fails
+        record_order_event(order_data, 'created', created_at=datetime.now(pytz.UTC))
 
         return jsonify({
             'success': True,
@@ -1010,7 +1459,7 @@ def create_order():
             'message': str(e)
         }), 500
 
-@app.route('/orders/<order_id>/status', methods=['PUT'])
+@api.route('/orders/<order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
     try:
         data = request.json
@@ -1023,24 +1472,33 @@ def update_order_status(order_id):
                 'message': 'Status is required'
             }), 400
 
-        # Get order document
         order_ref = db.collection('orders').document(order_id)
-        order = order_ref.get()
-        
-        if not order.exists:
-            return jsonify({
-                'ok': False,
-                'message': 'Order not found'
-            }), 404
-
-        order_data = order.to_dict()
-        user_email = order_data.get('user_email')
 
         # Handle status update in a transaction
         transaction = db.transaction()
         
         @firestore.transactional
         def update_order_in_transaction(transaction, order_ref):
+            # Every read comes before the first write (Firestore rejects a read
+            # after a write), and the transition is based on this snapshot, so
+            # two concurrent updates can't both move the loyalty counters
+            order = order_ref.get(transaction=transaction)
+            if not order.exists:
+                return None
+            order_data = order.to_dict()
+            user_email = order_data.get('user_email')
+            
+            # Loyalty counters move when an order enters or leaves 'completed'
+            was_completed = order_data.get('status') == 'completed'
+            is_completed = new_status == 'completed'
+            
+            user_ref = db.collection('users').document(user_email)
+            user_data = None
+            if new_status == 'cancelled' or was_completed != is_completed:
+                user_doc = user_ref.get(transaction=transaction)
+                if user_doc.exists:
+                    user_data = user_doc.to_dict()
+            
             # Update order status
             transaction.update(order_ref, {
                 'status': new_status,
@@ -1048,33 +1506,57 @@ def update_order_status(order_id):
                 'status_reason': reason
             })
             
+            if user_data is None:
+                return order_data
+            user_updates = {}
+            
+            # Users without counters yet are backfilled on their next loyalty read
+            if was_completed != is_completed and has_loyalty_counters(user_data):
+                user_updates.update(completion_increments(
+                    order_data.get('total', 0),
+                    sign=1 if is_completed else -1
+                ))
+            
             # If cancelling order, process refund
             if new_status == 'cancelled':
-                user_ref = db.collection('users').document(user_email)
-                user_doc = user_ref.get(transaction=transaction)
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    current_balance = user_data.get('wallet_balance', 0)
-                    refund_amount = order_data.get('total', 0)
-                    
-                    transaction.update(user_ref, {
-                        'wallet_balance': current_balance + refund_amount
-                    })
-                    
-                    transaction.update(order_ref, {
-                        'refund_amount': refund_amount,
-                        'refund_processed_at': firestore.SERVER_TIMESTAMP
-                    })
+                current_balance = user_data.get('wallet_balance', 0)
+                refund_amount = order_data.get('total', 0)
+                user_updates['wallet_balance'] = current_balance + refund_amount
+                
+                transaction.update(order_ref, {
+                    'refund_amount': refund_amount,
+                    'refund_processed_at': firestore.SERVER_TIMESTAMP
+                })
+                wallet_ledger.record(
+                    transaction, db, user_email, wallet_ledger.REFUND, refund_amount,
+                    wallet_ledger.refund_description(order_id),
+                    entry_id=wallet_ledger.refund_entry_id(order_id, order_data), order_id=order_id
+                )
+            
+            if user_updates:
+                transaction.update(user_ref, user_updates)
+            return order_data
 
-        # Execute the transaction
-        update_order_in_transaction(transaction, order_ref)
+        # Execute the transaction; order_data is the order as it was before the change
+        order_data = update_order_in_transaction(transaction, order_ref)
+        if order_data is None:
+            return jsonify({
+                'ok': False,
+                'message': 'Order not found'
+            }), 404
+        user_email = order_data.get('user_email')
+        auth.invalidate_user(user_email)
+        publish_events(order_status_events(order_id, {**order_data, 'status': new_status, 'status_reason': reason}))
+
+        # Cancelled orders don't count towards sales or revenue
+        previous_status = order_data.get('status')
+        if new_status == 'cancelled' and previous_status != 'cancelled':
+            record_order_event(order_data, 'cancelled')
+        elif previous_status == 'cancelled' and new_status != 'cancelled':
+            record_order_event(order_data, 'uncancelled')
 
         # Create notification for user
-        notification_message = {
-            'ready': 'Your order is ready for pickup! 🍽️',
-            'completed': 'Your order has been completed. Thank you for ordering from us! 🤗',
-            'cancelled': 'Your order has been cancelled and refunded. 💰'
-        }.get(new_status)
+        notification_message = ORDER_STATUS_MESSAGES.get(new_status)
 
         if notification_message:
             create_notification(
@@ -1096,28 +1578,225 @@ def update_order_status(order_id):
             'message': f'Error updating order status: {str(e)}'
         }), 500
 
-@app.route('/orders/user/<user_email>', methods=['GET'])
+def apply_status_chunk(transaction, order_ids, new_status, reason):
+    """Move up to BULK_STATUS_CHUNK_SIZE orders to new_status in one transaction.
+
+    Orders and their users are read with one get_all each; refunds and
+    loyalty counters are summed per user, so a user with several orders in
+    the chunk gets a single update. Returns (results in order_ids order,
+    {order_id: order data before the change} for the orders that changed).
+    """
+    order_refs = [db.collection('orders').document(order_id) for order_id in order_ids]
+    snapshots = {doc.id: doc for doc in db.get_all(order_refs, transaction=transaction)}
+
+    results = {}
+    changed = {}
+    for order_id in order_ids:
+        doc = snapshots.get(order_id)
+        if doc is None or not doc.exists:
+            results[order_id] = {'order_id': order_id, 'ok': False, 'error': 'Order not found'}
+            continue
+        order_data = doc.to_dict()
+        current_status = order_data.get('status')
+        if current_status == new_status:
+            results[order_id] = {'order_id': order_id, 'ok': True, 'changed': False, 'status': current_status}
+        elif new_status not in ORDER_TRANSITIONS.get(current_status, ()):
+            results[order_id] = {
+                'order_id': order_id,
+                'ok': False,
+                'status': current_status,
+                'error': f'Cannot change a {current_status} order to {new_status}'
+            }
+        else:
+            changed[order_id] = order_data
+
+    # Order totals per user: refunded on cancellation, added to the loyalty
+    # counters on completion
+    user_totals = {}
+    user_points = {}
+    for order_data in changed.values():
+        user_email = order_data.get('user_email')
+        if user_email:
+            user_totals[user_email] = user_totals.get(user_email, 0) + order_data.get('total', 0)
+            user_points[user_email] = user_points.get(user_email, 0) + order_points(order_data.get('total', 0))
+
+    users = {}
+    needs_user = new_status in (ORDER_STATUS['CANCELLED'], ORDER_STATUS['COMPLETED'])
+    if user_totals and needs_user:
+        user_refs = [db.collection('users').document(user_email) for user_email in user_totals]
+        users = {
+            doc.id: doc.to_dict()
+            for doc in db.get_all(user_refs, transaction=transaction) if doc.exists
+        }
+
+    for order_ref in order_refs:
+        order_data = changed.get(order_ref.id)
+        if order_data is None:
+            continue
+        updates = {
+            'status': new_status,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'status_reason': reason
+        }
+        result = {
+            'order_id': order_ref.id,
+            'ok': True,
+            'changed': True,
+            'previous_status': order_data.get('status'),
+            'status': new_status
+        }
+        # Like the single-order route, an order whose user is gone is cancelled without a refund
+        if new_status == ORDER_STATUS['CANCELLED'] and order_data.get('user_email') in users:
+            updates['refund_amount'] = order_data.get('total', 0)
+            updates['refund_processed_at'] = firestore.SERVER_TIMESTAMP
+            result['refund_amount'] = updates['refund_amount']
+            # One ledger entry per order, even though the balance update is per user
+            wallet_ledger.record(
+                transaction, db, order_data['user_email'], wallet_ledger.REFUND, updates['refund_amount'],
+                wallet_ledger.refund_description(order_ref.id),
+                entry_id=wallet_ledger.refund_entry_id(order_ref.id, order_data), order_id=order_ref.id
+            )
+        transaction.update(order_ref, updates)
+        results[order_ref.id] = result
+
+    for user_email, user_data in users.items():
+        user_ref = db.collection('users').document(user_email)
+        if new_status == ORDER_STATUS['CANCELLED']:
+            transaction.update(user_ref, {
+                'wallet_balance': user_data.get('wallet_balance', 0) + user_totals[user_email]
+            })
+        elif has_loyalty_counters(user_data):
+            # Users without counters yet are backfilled on their next loyalty read
+            transaction.update(user_ref, completion_increments(user_totals[user_email], user_points[user_email]))
+
+    return [results[order_id] for order_id in order_ids], changed
+
+@api.route('/orders/status', methods=['PUT'])
+def bulk_update_order_status():
+    """Move many orders to one status, e.g. closing out a meal slot.
+
+    Body: {"order_ids": [...], "status": "...", "reason": "..."}. Orders are
+    applied in transactions of BULK_STATUS_CHUNK_SIZE, so 40 orders cost a
+    handful of Firestore round trips instead of 40 requests' worth. Every
+    order gets an entry in "results"; one that can't move (not found, or not
+    a transition in ORDER_TRANSITIONS) doesn't stop the others, and an
+    order already in the target status counts as done.
+    """
+    try:
+        try:
+            decoded = auth.current_claims()
+        except jwt.ExpiredSignatureError:
+            return jsonify({'ok': False, 'message': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'ok': False, 'message': 'Invalid token'}), 401
+        if decoded.get('role') not in ('canteen', 'admin'):
+            return jsonify({'ok': False, 'message': 'Canteen access required'}), 403
+
+        data = request.json or {}
+        new_status = data.get('status')
+        reason = data.get('reason', '')
+        order_ids = data.get('order_ids')
+
+        if new_status not in ORDER_STATUS.values():
+            return jsonify({
+                'ok': False,
+                'message': f"Status must be one of: {', '.join(ORDER_STATUS.values())}"
+            }), 400
+        if not isinstance(order_ids, list) or not order_ids:
+            return jsonify({'ok': False, 'message': 'order_ids must be a non-empty list'}), 400
+        order_ids = list(dict.fromkeys(str(order_id) for order_id in order_ids if order_id))
+        if len(order_ids) > BULK_STATUS_MAX_ORDERS:
+            return jsonify({
+                'ok': False,
+                'message': f'At most {BULK_STATUS_MAX_ORDERS} orders can be updated at once'
+            }), 400
+
+        results = []
+        changed = {}
+        for start in range(0, len(order_ids), BULK_STATUS_CHUNK_SIZE):
+            chunk = order_ids[start:start + BULK_STATUS_CHUNK_SIZE]
+            try:
+                chunk_results, chunk_changed = wallet_transactions.run(
+                    apply_status_chunk, chunk, new_status, reason
+                )
+            except Exception as e:
+                # Nothing in this chunk was written; the other chunks still go ahead
+                print(f"Error updating order status chunk: {str(e)}")
+                error = 'Busy, please retry' if isinstance(e, TransactionContention) else str(e)
+                chunk_results = [{'order_id': order_id, 'ok': False, 'error': error} for order_id in chunk]
+                chunk_changed = {}
+            results.extend(chunk_results)
+            changed.update(chunk_changed)
+
+        notification_message = ORDER_STATUS_MESSAGES.get(new_status)
+        for user_email in {order_data.get('user_email') for order_data in changed.values()}:
+            if user_email:
+                auth.invalidate_user(user_email)
+        for order_id, order_data in changed.items():
+            publish_events(order_status_events(order_id, {**order_data, 'status': new_status, 'status_reason': reason}))
+            if new_status == ORDER_STATUS['CANCELLED']:
+                record_order_event(order_data, 'cancelled')
+            if notification_message:
+                # Queued on the notification writer, so these share batch commits
+                create_notification(
+                    user_email=order_data.get('user_email'),
+                    type=f'order_{new_status}',
+                    message=notification_message,
+                    order_id=order_id
+                )
+
+        failed = sum(1 for result in results if not result['ok'])
+        return jsonify({
+            'ok': failed == 0,
+            'status': new_status,
+            'updated': len(changed),
+            'unchanged': len(results) - len(changed) - failed,
+            'failed': failed,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        print(f"Error bulk updating order status: {str(e)}")
+        return jsonify({
+            'ok': False,
+            'message': f'Error updating order status: {str(e)}'
+        }), 500
+
+@api.route('/orders/user/<user_email>', methods=['GET'])
 def get_user_orders(user_email):
     try:
-        orders = db.collection('orders')\
-                  .where('user_email', '==', user_email)\
-                  .order_by('created_at', direction=firestore.Query.DESCENDING)\
-                  .stream()
-        
-        orders_list = []
-        for order in orders:
+        limit, cursor, ndjson = get_page_args(request.args)
+        orders_ref = db.collection('orders')
+        query = paginate_query(
+            orders_ref.where('user_email', '==', user_email),
+            orders_ref, 'created_at', limit, cursor
+        )
+
+        def serialize(order):
             order_data = order.to_dict()
             order_data['id'] = order.id
             # Convert Firestore timestamp to string for JSON serialization
             if 'created_at' in order_data and order_data['created_at']:
                 order_data['created_at'] = order_data['created_at'].isoformat()
-            orders_list.append(order_data)
-            
-        return jsonify({
+            return order_data
+
+        if ndjson:
+            return ndjson_response(query, serialize, 'created_at', limit)
+
+        orders_list, next_cursor = fetch_page(query, 'created_at', limit, serialize)
+        response = {
             'success': True,
             'orders': orders_list
-        }), 200
+        }
+        if limit:
+            response['next_cursor'] = next_cursor
+        return jsonify(response), 200
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         print(f"Error in get_user_orders: {str(e)}")  # Add logging
         return jsonify({
@@ -1125,15 +1804,17 @@ def get_user_orders(user_email):
             'error': str(e)
         }), 500
 
-@app.route('/orders/canteen', methods=['GET'])
+@api.route('/orders/canteen', methods=['GET'])
 def get_canteen_orders():
     try:
         # Get filter parameters
         status = request.args.get('status', '')
         date = request.args.get('date', '')
+        limit, cursor, ndjson = get_page_args(request.args)
         
         # Query orders
-        query = db.collection('orders')
+        orders_ref = db.collection('orders')
+        query = orders_ref
         
         if status:
             query = query.where('status', '==', status)
@@ -1144,22 +1825,74 @@ def get_canteen_orders():
             query = query.where('created_at', '>=', start_date)\
                         .where('created_at', '<', end_date)
         
-        orders = query.order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        
-        orders_list = []
-        for order in orders:
+        query = paginate_query(query, orders_ref, 'created_at', limit, cursor)
+
+        def serialize(order):
             order_data = order.to_dict()
             order_data['id'] = order.id
-            orders_list.append(order_data)
-            
-        return jsonify({
+            return order_data
+
+        if ndjson:
+            return ndjson_response(query, serialize, 'created_at', limit)
+
+        orders_list, next_cursor = fetch_page(query, 'created_at', limit, serialize)
+        response = {
             'success': True,
             'orders': orders_list
-        }), 200
+        }
+        if limit:
+            response['next_cursor'] = next_cursor
+        return jsonify(response), 200
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Live version of /orders/canteen for the active statuses: an initial
+# board_snapshot event, then board_delta events with only what changed.
+@api.route('/orders/canteen/stream', methods=['GET'])
+def stream_canteen_orders():
+    token = auth.extract_token(request.headers.get("Authorization") or request.args.get('token'))
+    if not token:
+        return jsonify({"error": "Token required"}), 401
+    try:
+        decoded = auth.decode(token)
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token has expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    if decoded.get('role') not in ('canteen', 'admin'):
+        return jsonify({"error": "Canteen access required"}), 403
+
+    if event_broker.subscriptions() >= SSE_MAX_STREAMS:
+        response = jsonify({"error": "Too many open event streams"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    try:
+        feed = canteen_board.feed(request.args.get('status', 'pending'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Subscribe before taking the snapshot so no delta falls in between
+    subscription = event_broker.subscribe([feed.topic])
+    try:
+        version, orders = feed.snapshot()
+    except Exception as e:
+        event_broker.unsubscribe(subscription)
+        return jsonify({'error': str(e)}), 503
+
+    initial = [('board_snapshot', {'status': feed.status_filter, 'version': version, 'orders': orders}, None)]
+    return Response(stream_events(
+        event_broker, subscription,
+        initial_events=initial,
+        accept=lambda event: event[1]['version'] > version
+    ), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # Add more utility functions
 def get_time_slots():
     """Generate available time slots for order scheduling"""
@@ -1183,7 +1916,7 @@ def get_time_slots():
     
     return slots
 
-@app.route('/utility/time-slots', methods=['GET'])
+@api.route('/utility/time-slots', methods=['GET'])
 def available_time_slots():
     try:
         slots = get_time_slots()
@@ -1194,14 +1927,14 @@ def available_time_slots():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/utility/delivery-locations', methods=['GET'])
+@api.route('/utility/delivery-locations', methods=['GET'])
 def get_delivery_locations():
     return jsonify({
         'success': True,
         'locations': DELIVERY_LOCATIONS
     }), 200
 
-@app.route('/utility/meal-timings', methods=['GET'])
+@api.route('/utility/meal-timings', methods=['GET'])
 def get_meal_timings():
     return jsonify({
         'success': True,
@@ -1210,7 +1943,7 @@ def get_meal_timings():
 
 # Add these new routes after your existing order routes
 
-@app.route('/orders/<order_id>/cancel', methods=['POST'])
+@api.route('/orders/<order_id>/cancel', methods=['POST'])
 def cancel_order(order_id):
     try:
         # Get the order reference and snapshot
@@ -1254,11 +1987,21 @@ def cancel_order(order_id):
             transaction.update(order_ref, {
                 'status': 'cancelled',
                 'cancelled_at': firestore.SERVER_TIMESTAMP,
+                'updated_at': firestore.SERVER_TIMESTAMP,
                 'refund_amount': refund_amount
             })
+
+            wallet_ledger.record(
+                transaction, db, order_data['user_email'], wallet_ledger.REFUND, refund_amount,
+                wallet_ledger.refund_description(order_id),
+                entry_id=wallet_ledger.refund_entry_id(order_id, order_data), order_id=order_id
+            )
         
         # Execute the transaction
         cancel_order_transaction(transaction, order_ref, user_ref)
+        auth.invalidate_user(order_data['user_email'])
+        publish_events(order_status_events(order_id, {**order_data, 'status': 'cancelled'}))
+        record_order_event(order_data, 'cancelled')
         
         # Create notification for user
         create_notification(
@@ -1285,97 +2028,58 @@ def cancel_order(order_id):
             'error': 'An error occurred while cancelling the order'
         }), 500
 
-@app.route('/wallet/transactions', methods=['GET'])
+@api.route('/wallet/transactions', methods=['GET'])
 def get_wallet_transactions():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"success": False, "message": "Token required"}), 401
 
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
-
-        transactions = []
-
-        # Get user creation date and welcome bonus
-        user_ref = db.collection("users").document(user_email)
-        user_data = user_ref.get().to_dict()
-        if user_data.get('created_at'):
-            transactions.append({
-                'id': f'welcome_{user_email}',
-                'type': 'WELCOME_BONUS',
-                'amount': 50.00,  # Welcome bonus amount
-                'description': 'Welcome bonus credit',
-                'timestamp': user_data.get('created_at'),
-                'status': 'completed'
-            })
-
-        # Get order-related transactions
-        orders = db.collection('orders')\
-            .where('user_email', '==', user_email)\
-            .order_by('created_at', direction=firestore.Query.DESCENDING)\
-            .stream()
-
-        # Add order transactions
-        for order in orders:
-            order_data = order.to_dict()
-            
-            # Add order payment
-            transactions.append({
-                'id': f'{order.id}_payment',
-                'type': 'ORDER',
-                'amount': -order_data.get('total', 0),
-                'description': f"Payment for Order #{order.id[:8]} - {len(order_data.get('items', []))} items",
-                'timestamp': order_data.get('created_at'),
-                'status': order_data.get('status')
-            })
-
-            # Add refund if order was cancelled
-            if order_data.get('status') == 'cancelled' and order_data.get('refund_amount'):
-                transactions.append({
-                    'id': f'{order.id}_refund',
-                    'type': 'REFUND',
-                    'amount': order_data.get('refund_amount', 0),
-                    'description': f"Refund for Order #{order.id[:8]}",
-                    'timestamp': order_data.get('cancelled_at'),
-                    'status': 'completed'
-                })
-
-        # Get coupon redemptions
-        coupons = db.collection('coupons')\
-            .where('used_by', '==', user_email)\
-            .order_by('used_at', direction=firestore.Query.DESCENDING)\
-            .stream()
-
-        # Add coupon transactions
-        for coupon in coupons:
-            coupon_data = coupon.to_dict()
-            transactions.append({
-                'id': coupon.id,
-                'type': 'COUPON',
-                'amount': coupon_data.get('amount', 0),
-                'description': f"Coupon redeemed: {coupon.id}",
-                'timestamp': coupon_data.get('used_at'),
-                'status': 'completed'
-            })
-
-        # Sort all transactions by timestamp
-        sorted_transactions = sorted(
-            transactions, 
-            key=lambda x: x['timestamp'] if x['timestamp'] else datetime.datetime.min, 
-            reverse=True
+        # The ledger grows with every order, so it is always paged
+        limit, cursor, ndjson = get_page_args(request.args, default_limit=DEFAULT_PAGE_SIZE)
+
+        user_data = auth.get_user(user_email)
+        if user_data is None:
+            return jsonify({"success": False, "message": "User not found"}), 404
+
+        # Every balance change writes a ledger entry (wallet_ledger.py); users
+        # from before the ledger get their history written into it once
+        if not user_data.get(wallet_ledger.BACKFILL_FIELD):
+            wallet_ledger.ensure_wallet_ledger(db, user_email, user_data)
+            auth.invalidate_user(user_email)
+
+        ledger_ref = db.collection(wallet_ledger.LEDGER_COLLECTION)
+        query = paginate_query(
+            ledger_ref.where('user_email', '==', user_email),
+            ledger_ref, 'timestamp', limit, cursor
         )
 
-        # Convert timestamps to ISO format
-        for transaction in sorted_transactions:
-            if transaction['timestamp']:
+        def serialize(entry):
+            transaction = entry.to_dict()
+            transaction['id'] = entry.id
+            if isinstance(transaction.get('timestamp'), datetime):
                 transaction['timestamp'] = transaction['timestamp'].isoformat()
+            return transaction
 
-        return jsonify({
+        if ndjson:
+            return ndjson_response(query, serialize, 'timestamp', limit)
+
+        transactions, next_cursor = fetch_page(query, 'timestamp', limit, serialize)
+        response = {
             'success': True,
-            'transactions': sorted_transactions
-        }), 200
+            'transactions': transactions
+        }
+        if limit:
+            response['next_cursor'] = next_cursor
+        return jsonify(response), 200
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         print(f"Error fetching wallet transactions: {str(e)}")
         return jsonify({
@@ -1384,7 +2088,7 @@ def get_wallet_transactions():
         }), 500
 
 # Add new route for changing password
-@app.route('/change-password', methods=['POST'])
+@api.route('/change-password', methods=['POST'])
 def change_password():
     try:
         # Get and validate token
@@ -1392,8 +2096,6 @@ def change_password():
         if not auth_header:
             return jsonify({"success": False, "message": "Token required"}), 401
 
-        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
-        
         # Get request data
         data = request.json
         if not data:
@@ -1412,7 +2114,7 @@ def change_password():
             }), 400
 
         # Decode token and get user
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
         
         if not user_email:
@@ -1421,19 +2123,17 @@ def change_password():
                 "message": "Invalid token format"
             }), 401
 
-        # Get user from database
+        # Get user from database (not the cache: the password may have just changed on another worker)
         user_ref = db.collection("users").document(user_email)
-        user_doc = user_ref.get()
+        user_data = auth.get_user(user_email, fresh=True)
         
-        # Check if user exists using the exists property
-        if not user_doc.exists:  # Changed from exists to exists
+        if user_data is None:
             return jsonify({
                 "success": False,
                 "message": "User not found"
             }), 404
 
         # Verify current password
-        user_data = user_doc.to_dict()
         stored_password = user_data.get("password")
 
         if not pbkdf2_sha256.verify(current_password, stored_password):
@@ -1448,6 +2148,7 @@ def change_password():
             "password": hashed_password,
             "password_updated_at": firestore.SERVER_TIMESTAMP
         })
+        auth.invalidate_user(user_email)
 
         return jsonify({
             "success": True,
@@ -1461,14 +2162,14 @@ def change_password():
             "message": f"An error occurred while changing password: {str(e)}"
         }), 500
 
-@app.route('/notifications', methods=['GET'])
+@api.route('/notifications', methods=['GET'])
 def get_notifications():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"success": False, "message": "Token required"}), 401
 
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
 
         # Get notifications from Firestore with proper ordering
@@ -1510,7 +2211,57 @@ def get_notifications():
             'error': str(e)
         }), 500
 
-@app.route('/notifications/<notification_id>/read', methods=['PUT'])
+# Server-Sent Events: new notifications and order status changes for the caller.
+# EventSource can't set headers, so the token may also come as ?token=.
+@api.route('/events', methods=['GET'])
+def event_stream():
+    token = auth.extract_token(request.headers.get("Authorization") or request.args.get('token'))
+    if not token:
+        return jsonify({"success": False, "message": "Token required"}), 401
+    try:
+        decoded = auth.decode(token)
+    except jwt.ExpiredSignatureError:
+        return jsonify({"success": False, "message": "Token has expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"success": False, "message": "Invalid token"}), 401
+
+    if event_broker.subscriptions() >= SSE_MAX_STREAMS:
+        # The client falls back to polling /notifications
+        response = jsonify({"success": False, "message": "Too many open event streams"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    subscription = event_broker.subscribe([f"user:{decoded.get('email')}"])
+    return Response(stream_events(event_broker, subscription), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let nginx buffer the stream
+    })
+
+@api.route('/events/stats', methods=['GET'])
+def event_stream_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({
+        'success': True,
+        'broker': event_broker.stats(),
+        'feeds': [feed.stats() for feed in event_feeds],
+        'canteen_board': canteen_board.stats(),
+        'max_streams': SSE_MAX_STREAMS
+    }), 200
+
+@api.route('/notifications/writer/stats', methods=['GET'])
+def notification_writer_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({
+        'success': True,
+        'enabled': notification_writer is not None,
+        'stats': notification_writer.stats() if notification_writer is not None else None
+    }), 200
+
+@api.route('/notifications/<notification_id>/read', methods=['PUT'])
 def mark_notification_read(notification_id):
     try:
         token = request.headers.get("Authorization")
@@ -1535,77 +2286,21 @@ def mark_notification_read(notification_id):
         ), 500
 
 # Admin Routes
-@app.route('/admin/dashboard', methods=['GET'])
+@api.route('/admin/dashboard', methods=['GET'])
 def get_admin_dashboard():
     try:
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             return jsonify({"error": "Token required"}), 401
 
-        # Extract token from Bearer header
-        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
-
         try:
             # Verify token
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = auth.current_claims()
             if decoded.get('role') != 'admin':
                 return jsonify({"error": "Admin access required"}), 403
 
-            # Get statistics
-            users = db.collection('users').stream()
-            canteens = db.collection('users').where('role', '==', 'canteen').stream()
-            orders = db.collection('orders').stream()
-
-            total_users = 0
-            total_canteens = 0
-            total_orders = 0
-            total_revenue = 0
-            cancelled_orders = 0
-            total_refunded = 0
-
-            # Process orders for detailed stats
-            order_list = []
-            for order in orders:
-                order_data = order.to_dict()
-                total_orders += 1
-                
-                if order_data.get('status') == 'cancelled':
-                    cancelled_orders += 1
-                    total_refunded += order_data.get('refund_amount', 0)
-                elif order_data.get('status') != 'cancelled':
-                    total_revenue += order_data.get('total', 0)
-                
-                # Add order to list for analytics
-                order_list.append({
-                    'created_at': order_data.get('created_at'),
-                    'total': order_data.get('total', 0),
-                    'status': order_data.get('status')
-                })
-
-            # Count users and canteens
-            for _ in users:
-                total_users += 1
-            for _ in canteens:
-                total_canteens += 1
-
-            # Generate analytics
-            daily_analytics = calculate_time_based_analytics(order_list, 'daily')
-            weekly_analytics = calculate_time_based_analytics(order_list, 'weekly')
-            monthly_analytics = calculate_time_based_analytics(order_list, 'monthly')
-
-            return jsonify({
-                'totalUsers': total_users,
-                'totalCanteens': total_canteens,
-                'totalOrders': total_orders,
-                'totalRevenue': total_revenue,
-                'cancelledOrders': cancelled_orders,
-                'totalRefunded': total_refunded,
-                'analytics': {
-                    'daily': daily_analytics,
-                    'weekly': weekly_analytics,
-                    'monthly': monthly_analytics
-                }
-            }), 200
+            # Counters and chart buckets are maintained incrementally (analytics_rollups.py)
+            return jsonify(load_dashboard(db)), 200
 
         except jwt.InvalidTokenError:
             return jsonify({"error": "Invalid token"}), 401
@@ -1617,7 +2312,7 @@ def get_admin_dashboard():
         return jsonify({"error": str(e)}), 500
 
 # Add this new route for creating admin account
-@app.route('/create-admin', methods=['POST'])
+@api.route('/create-admin', methods=['POST'])
 def create_admin():
     data = request.json
     email = data.get('email')
@@ -1640,18 +2335,19 @@ def create_admin():
         "role": "admin",
         "created_at": firestore.SERVER_TIMESTAMP
     })
+    record_user_event('admin')
 
     return jsonify({"message": "Admin account created successfully"}), 201
 
 # Add these new routes for admin canteen management
-@app.route('/admin/canteens', methods=['GET'])
+@api.route('/admin/canteens', methods=['GET'])
 def get_canteens():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"error": "Token required"}), 401
 
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         if decoded.get('role') != 'admin':
             return jsonify({"error": "Admin access required"}), 403
 
@@ -1677,7 +2373,7 @@ def get_canteens():
         print(f"Error fetching canteens: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/admin/canteens/<canteen_id>', methods=['DELETE'])
+@api.route('/admin/canteens/<canteen_id>', methods=['DELETE'])
 def delete_canteen(canteen_id):
     try:
         token = request.headers.get("Authorization")
@@ -1685,9 +2381,8 @@ def delete_canteen(canteen_id):
             return jsonify({"error": "Token required"}), 401
 
         # Extract and verify token
-        token = token.split(' ')[1] if token.startswith('Bearer ') else token
         try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = auth.current_claims()
             if decoded.get('role') != 'admin':
                 return jsonify({"error": "Admin access required"}), 403
         except jwt.InvalidTokenError:
@@ -1697,9 +2392,8 @@ def delete_canteen(canteen_id):
         data = request.json
         admin_password = data.get('password')
         
-        # Verify admin's password
-        admin_ref = db.collection('users').document(decoded.get('email'))
-        admin_data = admin_ref.get().to_dict()
+        # Verify admin's password (against the stored hash, not a cached copy)
+        admin_data = auth.current_user(fresh=True)
         if not pbkdf2_sha256.verify(admin_password, admin_data.get('password')):
             return jsonify({"error": "Invalid admin password"}), 401
 
@@ -1716,6 +2410,8 @@ def delete_canteen(canteen_id):
 
         # Delete the canteen
         canteen_ref.delete()
+        auth.invalidate_user(canteen_id)
+        record_user_event('canteen', sign=-1)
 
         return jsonify({
             'success': True,
@@ -1727,14 +2423,14 @@ def delete_canteen(canteen_id):
         return jsonify({"error": str(e)}), 500
 
 # Update the create-canteen route to check for admin privileges
-@app.route('/admin/canteens', methods=['POST'])
+@api.route('/admin/canteens', methods=['POST'])
 def admin_create_canteen():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"error": "Token required"}), 401
 
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         if decoded.get('role') != 'admin':
             return jsonify({"error": "Admin access required"}), 403
 
@@ -1761,6 +2457,7 @@ def admin_create_canteen():
             "active": True,
             "created_at": firestore.SERVER_TIMESTAMP
         })
+        record_user_event('canteen')
 
         return jsonify({
             "success": True,
@@ -1772,15 +2469,14 @@ def admin_create_canteen():
         return jsonify({"error": str(e)}), 500
 
 # Add these new routes for admin user management
-@app.route('/admin/users', methods=['GET'])
+@api.route('/admin/users', methods=['GET'])
 def get_users():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"error": "Token required"}), 401
 
-        # Fix the syntax error in jwt.decode and if statement
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         if decoded.get('role') != 'admin':
             return jsonify({"error": "Admin access required"}), 403
 
@@ -1807,15 +2503,14 @@ def get_users():
         print(f"Error fetching users: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/admin/users/<user_id>/balance', methods=['POST'])
+@api.route('/admin/users/<user_id>/balance', methods=['POST'])
 def update_user_balance(user_id):
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"error": "Token required"}), 401
 
-        # Fix the syntax error in jwt.decode
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         if decoded.get('role') != 'admin':
             return jsonify({"error": "Admin access required"}), 403
 
@@ -1831,19 +2526,14 @@ def update_user_balance(user_id):
         current_balance = user.to_dict().get('wallet_balance', 0)
         new_balance = current_balance + amount
 
-        user_ref.update({
+        # Balance and ledger entry commit together
+        batch = db.batch()
+        batch.update(user_ref, {
             'wallet_balance': new_balance
         })
-
-        # Create transaction record
-        transaction_ref = db.collection('transactions').document()
-        transaction_ref.set({
-            'user_email': user_id,
-            'amount': amount,
-            'type': 'ADMIN_CREDIT',
-            'timestamp': firestore.SERVER_TIMESTAMP,
-            'description': f'Admin added ₹{amount}'
-        })
+        wallet_ledger.record(batch, db, user_id, wallet_ledger.ADMIN_CREDIT, amount, f'Admin added ₹{amount}')
+        batch.commit()
+        auth.invalidate_user(user_id)
 
         return jsonify({
             'success': True,
@@ -1856,7 +2546,7 @@ def update_user_balance(user_id):
         return jsonify({"error": str(e)}), 500
 
 # Add this new route for deleting users (admin only)
-@app.route('/admin/users/<user_id>/delete', methods=['DELETE'])
+@api.route('/admin/users/<user_id>/delete', methods=['DELETE'])
 def delete_user(user_id):
     try:
         auth_header = request.headers.get("Authorization")
@@ -1864,10 +2554,8 @@ def delete_user(user_id):
             return jsonify({"error": "Token required"}), 401
 
         # Extract and verify token
-        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
         try:
-            # Fix the syntax error in jwt.decode
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = auth.current_claims()
             if decoded.get('role') != 'admin':
                 return jsonify({"error": "Admin access required"}), 403
         except jwt.InvalidTokenError:
@@ -1877,9 +2565,8 @@ def delete_user(user_id):
         data = request.json
         admin_password = data.get('password')
         
-        # Verify admin's password
-        admin_ref = db.collection('users').document(decoded.get('email'))
-        admin_data = admin_ref.get().to_dict()
+        # Verify admin's password (against the stored hash, not a cached copy)
+        admin_data = auth.current_user(fresh=True)
         if not pbkdf2_sha256.verify(admin_password, admin_data.get('password')):
             return jsonify({"error": "Invalid admin password"}), 401
 
@@ -1891,6 +2578,8 @@ def delete_user(user_id):
 
         # Delete the user
         user_ref.delete()
+        auth.invalidate_user(user_id)
+        record_user_event(user_data.get('role', 'user'), sign=-1)
 
         return jsonify({
             'success': True,
@@ -1902,11 +2591,12 @@ def delete_user(user_id):
         return jsonify({"error": str(e)}), 500
 
 # Add after other product-related routes
-@app.route('/products/<product_id>/analytics', methods=['GET'])
+@api.route('/products/<product_id>/analytics', methods=['GET'])
 def get_product_analytics(product_id):
     try:
-        # Get all orders that contain this product
-        orders = db.collection('orders').stream()
+        # Per-day quantities come from the product's sales aggregate, which
+        # already excludes cancelled orders and is bucketed by UTC date
+        daily_sales = load_daily_sales(db, product_id)
         
         # Initialize data structure for last 7 days with timezone awareness
         today = datetime.now(pytz.UTC)
@@ -1916,45 +2606,13 @@ def get_product_analytics(product_id):
         }
         total_sold = 0
         
-        # Process orders
-        for order in orders:
-            order_data = order.to_dict()
-            
-            # Skip cancelled orders
-            if order_data.get('status') == 'cancelled':
-                continue
-                
-            # Handle order date with proper timezone
-            order_date = order_data.get('created_at')
-            if not order_date:
-                continue
-                
-            # Convert string date to datetime if needed
-            if isinstance(order_date, str):
-                try:
-                    # Parse ISO format string to timezone-aware datetime
-                    order_date = datetime.fromisoformat(order_date.replace('Z', '+00:00')).replace(tzinfo=pytz.UTC)
-                except ValueError:
-                    continue
-            # Convert Firestore timestamp to datetime if needed
-            elif hasattr(order_date, 'timestamp'):
-                # Firestore timestamp is already UTC
-                order_date = datetime.fromtimestamp(order_date.timestamp(), pytz.UTC)
-                
-            # Ensure order_date is timezone-aware
-            if order_date.tzinfo is None:
-                order_date = pytz.UTC.localize(order_date)
-                
-            # Check if order is within last 7 days
-            if (today - order_date).days > 7:
-                continue
-            
-            # Process order items
-            for item in order_data.get('items', []):
-                if item.get('id') == product_id:
-                    day_key = order_date.strftime('%a')
-                    sales_data[day_key] += item.get('quantity', 0)
-                    total_sold += item.get('quantity', 0)
+        # Orders up to 7 days old are counted, so the oldest day shares
+        # today's weekday label
+        for i in range(8):
+            day = today - timedelta(days=i)
+            quantity = daily_sales.get(day.strftime('%Y-%m-%d'), 0)
+            sales_data[day.strftime('%a')] += quantity
+            total_sold += quantity
         
         # Convert to arrays for frontend
         dates = list(sales_data.keys())
@@ -1974,7 +2632,7 @@ def get_product_analytics(product_id):
             'error': str(e)
         }), 500
 
-@app.route('/user/update', methods=['PUT'])
+@api.route('/user/update', methods=['PUT'])
 def update_user_profile():
     try:
         # Get and validate token
@@ -1983,8 +2641,7 @@ def update_user_profile():
             return jsonify({"success": False, "message": "Token required"}), 401
 
         # Extract token and decode
-        token = token.split(' ')[1] if token.startswith('Bearer ') else token
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
 
         if not user_email:
@@ -2005,10 +2662,8 @@ def update_user_profile():
 
         # Get user document
         user_ref = db.collection("users").document(user_email)
-        user_doc = user_ref.get()
 
-        # Check if user exists using the exists property
-        if not user_doc.exists:  # Changed from exists() to exists
+        if auth.get_user(user_email) is None:
             return jsonify({
                 "success": False,
                 "message": "User not found"
@@ -2019,6 +2674,7 @@ def update_user_profile():
             "name": name,
             "updated_at": firestore.SERVER_TIMESTAMP
         })
+        auth.invalidate_user(user_email)
 
         return jsonify({
             "success": True,
@@ -2036,65 +2692,26 @@ def update_user_profile():
 # Add these new routes for popular and discounted products
 
 def calculate_product_metrics():
-    """Calculate real metrics for all products based on order history"""
+    """Read per-product sales metrics from the incrementally maintained aggregates"""
     try:
-        products_metrics = {}
-        orders = db.collection('orders').stream()
-        
-        for order in orders:
-            order_data = order.to_dict()
-            # Skip cancelled orders
-            if order_data.get('status') == 'cancelled':
-                continue
-                
-            # Process each item in order
-            for item in order_data.get('items', []):
-                product_id = item.get('id')
-                if not product_id:
-                    continue
-                    
-                if product_id not in products_metrics:
-                    products_metrics[product_id] = {
-                        'total_orders': 0,
-                        'total_quantity': 0,
-                        'ratings': [],
-                        'last_month_orders': 0
-                    }
-                
-                # Update metrics
-                products_metrics[product_id]['total_orders'] += 1
-                products_metrics[product_id]['total_quantity'] += item.get('quantity', 0)
-                
-                # Check if order is from last month
-                order_date = order_data.get('created_at')
-                if order_date:
-                    if isinstance(order_date, str):
-                        order_date = datetime.fromisoformat(order_date.replace('Z', '+00:00'))
-                    one_month_ago = datetime.now(pytz.UTC) - timedelta(days=30)
-                    if order_date > one_month_ago:
-                        products_metrics[product_id]['last_month_orders'] += item.get('quantity', 0)
-                
-        return products_metrics
+        return load_product_metrics(db)
     except Exception as e:
         print(f"Error calculating product metrics: {str(e)}")
         return {}
 
 # Replace the existing popular products endpoint
-@app.route('/products/popular', methods=['GET'])
+@api.route('/products/popular', methods=['GET'])
 def get_popular_products():
     try:
-        products_ref = db.collection("products")
-        products = products_ref.stream()
+        products = product_catalog.all()
         metrics = calculate_product_metrics()
         
         # Convert to list and add real data
         product_list = []
-        for product in products:
-            product_data = product.to_dict()
-            product_data["id"] = product.id
+        for product_data in products:
             
             # Add real metrics
-            product_metrics = metrics.get(product.id, {})
+            product_metrics = metrics.get(product_data['id'], {})
             product_data["order_count"] = product_metrics.get('last_month_orders', 0)
             product_data["rating"] = 4.5  # Default rating
             product_list.append(product_data)
@@ -2118,20 +2735,17 @@ def get_popular_products():
         return jsonify({"success": False, "error": str(e)}), 500
 
 # Replace the existing discounted products endpoint
-@app.route('/products/discounted', methods=['GET'])
+@api.route('/products/discounted', methods=['GET'])
 def get_discounted_products():
     try:
-        products_ref = db.collection("products")
-        products = products_ref.stream()
+        products = product_catalog.all()
         metrics = calculate_product_metrics()
         
         product_list = []
-        for product in products:
-            product_data = product.to_dict()
-            product_data["id"] = product.id
+        for product_data in products:
             
             # Get real metrics
-            product_metrics = metrics.get(product.id, {})
+            product_metrics = metrics.get(product_data['id'], {})
             monthly_orders = product_metrics.get('last_month_orders', 0)
             product_data["order_count"] = monthly_orders
             product_list.append(product_data)
@@ -2158,7 +2772,7 @@ def get_discounted_products():
         return jsonify({"success": False, "error": str(e)}), 500
 
 # Add new route to get product ratings
-@app.route('/products/<product_id>/rating', methods=['POST'])
+@api.route('/products/<product_id>/rating', methods=['POST'])
 def rate_product(product_id):
     try:
         data = request.json
@@ -2192,7 +2806,7 @@ def rate_product(product_id):
             "error": str(e)}
         ), 500
 
-@app.route('/apply-coupon', methods=['POST'])
+@api.route('/apply-coupon', methods=['POST'])
 def apply_coupon():
     try:
         data = request.json
@@ -2261,31 +2875,23 @@ def apply_coupon():
             'message': 'Failed to apply coupon'
         }), 500
 
-@app.route('/user/favorites', methods=['GET', 'POST'])
+@api.route('/user/favorites', methods=['GET', 'POST'])
 def handle_favorites():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"error": "Token required"}), 401
 
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
 
         if request.method == 'GET':
             # Get user's favorites
-            user_ref = db.collection('users').document(user_email)
-            user_data = user_ref.get().to_dict()
+            user_data = auth.get_user(user_email)
             favorites = user_data.get('favorites', [])
             
-            # Get favorite products details
-            favorite_products = []
-            for product_id in favorites:
-                product_ref = db.collection('products').document(product_id)
-                product = product_ref.get()
-                if product.exists:
-                    product_data = product.to_dict()
-                    product_data['id'] = product.id
-                    favorite_products.append(product_data)
+            # Get favorite products details (batched, from memory when possible)
+            favorite_products = product_catalog.get_many(favorites)
 
             return jsonify({
                 'success': True,
@@ -2297,85 +2903,59 @@ def handle_favorites():
             product_id = data.get('product_id')
             
             user_ref = db.collection('users').document(user_email)
-            user_data = user_ref.get().to_dict()
-            favorites = set(user_data.get('favorites', []))
+            user_data = auth.get_user(user_email, fresh=True)
+            favorites = list(user_data.get('favorites', []))
 
+            # ArrayUnion/ArrayRemove touch only this product, so toggles made
+            # at the same time (e.g. through another worker) aren't overwritten
             if product_id in favorites:
                 favorites.remove(product_id)
+                user_ref.update({'favorites': firestore.ArrayRemove([product_id])})
             else:
-                favorites.add(product_id)
-
-            user_ref.update({
-                'favorites': list(favorites)
-            })
+                favorites.append(product_id)
+                user_ref.update({'favorites': firestore.ArrayUnion([product_id])})
+            auth.invalidate_user(user_email)
 
             return jsonify({
                 'success': True,
-                'favorites': list(favorites)
+                'favorites': favorites
             }), 200
 
     except Exception as e:
         print(f"Error handling favorites: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/user/loyalty', methods=['GET'])
+@api.route('/user/loyalty', methods=['GET'])
 def get_loyalty_status():
     try:
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"error": "Token required"}), 401
 
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
 
-        # Get user's total spent
-        orders = db.collection('orders')\
-            .where('user_email', '==', user_email)\
-            .where('status', '==', 'completed')\
-            .stream()
+        # Totals are counters on the user document, kept current by
+        # update_order_status (backfilled from order history on first read)
+        user_data = auth.get_user(user_email)
+        if user_data is None:
+            return jsonify({'error': 'User not found'}), 404
 
-        total_spent = sum(order.to_dict().get('total', 0) for order in orders)
-        
-        # Calculate points (1 point per 10 rupees spent)
-        points = int(total_spent * 0.1)  # 10% of spent amount as points
+        total_spent, points_balance = ensure_loyalty_counters(db, user_email, user_data)
+        if not has_loyalty_counters(user_data):
+            auth.invalidate_user(user_email)
         
-        # Determine tier
-        tier = 'BRONZE'
-        for t, requirements in LOYALTY_TIERS.items():
-            if total_spent >= requirements['min_spent']:
-                tier = t
-
-        # Get available rewards
-        rewards = []
-        if points >= 100:
-            rewards.append({
-                'id': 'REWARD100',
-                'description': '₹100 Cashback',
-                'points_required': 100,
-                'type': 'cashback',
-                'value': 100
-            })
-        if points >= 500:
-            rewards.append({
-                'id': 'REWARD500',
-                'description': '₹500 Cashback',
-                'points_required': 500,
-                'type': 'cashback',
-                'value': 500
-            })
+        # 1 point per 10 rupees spent, less points already redeemed
+        points = int(points_balance)
 
         return jsonify({
             'success': True,
             'loyalty_status': {
-                'tier': tier,
+                'tier': tier_for(total_spent),
                 'points': points,
                 'total_spent': total_spent,
-                'available_rewards': rewards,
-                'next_tier': next(
-                    (t for t, r in LOYALTY_TIERS.items() 
-                     if r['min_spent'] > total_spent),
-                    None
-                )
+                'available_rewards': available_rewards(points),
+                'next_tier': next_tier_for(total_spent)
             }
         }), 200
 
@@ -2383,7 +2963,7 @@ def get_loyalty_status():
         print(f"Error getting loyalty status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/user/redeem-points', methods=['POST'])
+@api.route('/user/redeem-points', methods=['POST'])
 def redeem_loyalty_points():
     try:
         token = request.headers.get("Authorization")
@@ -2393,43 +2973,46 @@ def redeem_loyalty_points():
         data = request.json
         reward_id = data.get('reward_id')
         
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        decoded = auth.current_claims()
         user_email = decoded.get("email")
 
-        # Verify points and apply reward
-        user_ref = db.collection('users').document(user_email)
-        loyalty_status = get_loyalty_status().get_json()
-        
-        if not loyalty_status.get('success'):
-            return jsonify({'error': 'Could not verify points'}), 400
-
-        points = loyalty_status['loyalty_status']['points']
-        
-        # Define rewards and their costs
-        rewards = {
-            'REWARD100': {'points': 100, 'value': 100},
-            'REWARD500': {'points': 500, 'value': 500}
-        }
-
-        if reward_id not in rewards:
+        if reward_id not in LOYALTY_REWARDS:
             return jsonify({'error': 'Invalid reward'}), 400
 
-        reward = rewards[reward_id]
-        if points < reward['points']:
-            return jsonify({'error': 'Insufficient points'}), 400
+        reward = LOYALTY_REWARDS[reward_id]
+
+        # Make sure the points counter exists before redeeming against it
+        user_data = auth.get_user(user_email)
+        if user_data is None:
+            return jsonify({'error': 'User not found'}), 404
+        ensure_loyalty_counters(db, user_email, user_data)
 
-        # Update user's wallet
+        # Check points and update user's wallet atomically
+        user_ref = db.collection('users').document(user_email)
         transaction = db.transaction()
         @firestore.transactional
         def update_wallet_in_transaction(transaction, user_ref):
-            user = user_ref.get(transaction=transaction)
+            user = user_ref.get(transaction=transaction).to_dict()
+            if user.get('points_balance', 0) < reward['points']:
+                raise ValueError('Insufficient points')
+
             current_balance = user.get('wallet_balance', 0)
             transaction.update(user_ref, {
                 'wallet_balance': current_balance + reward['value'],
+                'points_balance': firestore.Increment(-reward['points']),
                 'points_redeemed': firestore.Increment(reward['points'])
             })
+            wallet_ledger.record(
+                transaction, db, user_email, wallet_ledger.LOYALTY_REWARD, reward['value'],
+                f"Redeemed {reward['points']} points: {reward['description']}"
+            )
 
-        update_wallet_in_transaction(transaction, user_ref)
+        try:
+            update_wallet_in_transaction(transaction, user_ref)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        finally:
+            auth.invalidate_user(user_email)
 
         return jsonify({
             'success': True,
@@ -2440,5 +3023,62 @@ def redeem_loyalty_points():
         print(f"Error redeeming points: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Background threads (queue drain workers, catalog listener) don't survive a
+# fork, so they are started per process: by gunicorn's post_worker_init hook in
+# production (see gunicorn.conf.py) or below for the dev server
+def start_background_services(warm_up=False):
+    if order_queue_worker is not None:
+        recover_order_queue()
+        order_queue_worker.start()
+    for feed in event_feeds:
+        feed.start()
+    if warm_up:
+        # Opens the Firestore channel and loads the catalog before the first request
+        product_catalog.refresh()
+
+def stop_background_services():
+    if order_queue_worker is not None:
+        order_queue_worker.stop()
+    for feed in event_feeds:
+        feed.stop()
+    canteen_board.close()
+    # Write out queued notifications before the worker exits
+    if notification_writer is not None:
+        notification_writer.stop()
+    # Let queued image uploads finish so their products get an image_url
+    image_uploader.stop()
+    if image_processor is not None:
+        image_processor.close()
+    product_catalog.close()
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    config is an optional dict applied on top of the environment. Besides
+    regular Flask settings it understands:
+      FIRESTORE_CLIENT - client to use instead of the default (emulator, fake)
+      WARM_UP_FIRESTORE - create the Firestore client now rather than on first use
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
+    app.config.update(config or {})
+
+    # Secret key for JWT
+    if not app.config['SECRET_KEY']:
+        raise ValueError("SECRET_KEY environment variable is not set.")
+    auth.secret_key = app.config['SECRET_KEY']
+
+    if app.config.get('FIRESTORE_CLIENT') is not None:
+        firebase_client.configure(client=app.config['FIRESTORE_CLIENT'])
+    if app.config.get('WARM_UP_FIRESTORE'):
+        firebase_client.warm_up()
+
+    CORS(app)
+    request_metrics.init_app(app, authorize=require_metrics_access)
+    app.register_blueprint(api)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
+    start_background_services()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,98 @@
+import time
+
+import jwt
+from flask import g, has_request_context, request
+
+from ttl_cache import TTLCache
+
+# Tokens without an exp claim are still re-verified every few minutes
+DEFAULT_TOKEN_TTL = 300
+
+
+class Authenticator:
+    """Verifies bearer tokens once and shares the caller across the request.
+
+    Decoded claims are cached in a bounded LRU keyed by the raw token until
+    the token's `exp`, so repeat requests skip signature verification. Within
+    a request the claims and any `users` documents read through get_user()
+    are memoised on flask.g, so a handler never reads the same user twice.
+
+    With user_cache_ttl > 0 user documents are also shared across requests
+    in a size-bounded LRU. Every route that writes a user document must call
+    invalidate_user() afterwards; a read that was already in flight when the
+    invalidation happened is not cached, so a balance is never served stale
+    after a write made by this process. Other workers' writes can still be up
+    to user_cache_ttl old, so credential checks and read-modify-write paths
+    pass fresh=True.
+    """
+
+    def __init__(self, secret_key, db, token_cache_size=10000,
+                 user_cache_ttl=0, user_cache_size=1024):
+        self.secret_key = secret_key
+        self._db = db
+        self.token_cache = TTLCache(maxsize=token_cache_size, ttl=DEFAULT_TOKEN_TTL)
+        self.user_cache = TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)
+        self.user_invalidations = 0
+
+    @staticmethod
+    def extract_token(auth_header):
+        """Accept both "Bearer <token>" and a bare token."""
+        if not auth_header:
+            return None
+        return auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
+
+    def decode(self, token):
+        """Verify a token, raising jwt.ExpiredSignatureError / jwt.InvalidTokenError like jwt.decode."""
+        claims = self.token_cache.get(token)
+        if claims is not None:
+            return claims
+
+        claims = jwt.decode(token, self.secret_key, algorithms=["HS256"])
+        exp = claims.get('exp')
+        self.token_cache.set(token, claims, ttl=exp - time.time() if exp else None)
+        return claims
+
+    def current_claims(self):
+        """Claims for this request's Authorization header, parsed once per request."""
+        if '_auth_claims' not in g:
+            token = self.extract_token(request.headers.get("Authorization"))
+            if not token:
+                raise jwt.InvalidTokenError("Token required")
+            g._auth_claims = self.decode(token)
+        return g._auth_claims
+
+    def current_email(self):
+        return self.current_claims().get('email')
+
+    def get_user(self, email, fresh=False):
+        """Data of users/<email> as a dict, or None if it doesn't exist.
+
+        fresh=True reads Firestore even if the document is cached (and
+        refreshes the cache).
+        """
+        docs = g.setdefault('_auth_user_docs', {})
+        if email in docs and not fresh:
+            return docs[email]
+
+        data = None if fresh else self.user_cache.get(email)
+        if data is None:
+            generation = self.user_invalidations
+            snapshot = self._db.collection('users').document(email).get()
+            data = snapshot.to_dict() if snapshot.exists else None
+            # Skip caching if any user was invalidated while we were reading
+            if data is not None and generation == self.user_invalidations:
+                self.user_cache.set(email, data)
+
+        docs[email] = data
+        return data
+
+    def current_user(self, fresh=False):
+        """The calling user's document data (see get_user)."""
+        return self.get_user(self.current_email(), fresh=fresh)
+
+    def invalidate_user(self, email):
+        """Forget a user document after it has been written."""
+        self.user_invalidations += 1
+        self.user_cache.pop(email)
+        if has_request_context():
+            g.get('_auth_user_docs', {}).pop(email, None)
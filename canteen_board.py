@@ -0,0 +1,145 @@
+import threading
+from datetime import datetime
+
+# Orders the canteen is still working on
+ACTIVE_STATUSES = ('pending', 'accepted', 'ready')
+# Board filters that can be streamed -> statuses they show
+BOARD_FILTERS = {status: (status,) for status in ACTIVE_STATUSES}
+BOARD_FILTERS['active'] = ACTIVE_STATUSES
+
+# How long a new screen waits for a just-started listener's first snapshot
+SNAPSHOT_TIMEOUT = 10
+
+
+def serialize_order(order_id, order_data):
+    order = {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in order_data.items()
+    }
+    order['id'] = order_id
+    return order
+
+
+def _newest_first(orders):
+    return sorted(orders, key=lambda order: str(order.get('created_at') or ''), reverse=True)
+
+
+class BoardFeed:
+    """The orders matching one board filter, kept current by one on_snapshot listener.
+
+    Each listener callback is published to the broker topic `board:<filter>`
+    as a single "board_delta" event (added and modified orders, removed ids)
+    with an increasing version. Deltas are published under the feed lock,
+    so they reach subscribers in version order and a snapshot() always
+    lines up with them: a screen that subscribes first and then takes a
+    snapshot applies exactly the deltas with a higher version.
+    """
+
+    def __init__(self, db, broker, status_filter):
+        self._db = db
+        self._broker = broker
+        self.status_filter = status_filter
+        self.statuses = BOARD_FILTERS[status_filter]
+        self.topic = f'board:{status_filter}'
+
+        self._orders = {}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._watch = None
+
+        self.version = 0
+        self.deltas = 0
+
+    def start(self):
+        query = self._db.collection('orders')
+        if len(self.statuses) == 1:
+            query = query.where('status', '==', self.statuses[0])
+        else:
+            query = query.where('status', 'in', list(self.statuses))
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        added, modified, removed = [], [], []
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    if self._orders.pop(doc.id, None) is not None:
+                        removed.append(doc.id)
+                    continue
+                order = serialize_order(doc.id, doc.to_dict() or {})
+                (added if change.type.name == 'ADDED' else modified).append(order)
+                self._orders[doc.id] = order
+
+            self.version += 1
+            if not self._ready.is_set():
+                # The first callback is the initial result set, not a change
+                self._ready.set()
+                return
+            if added or modified or removed:
+                self.deltas += 1
+                self._broker.publish(self.topic, 'board_delta', {
+                    'status': self.status_filter,
+                    'version': self.version,
+                    'added': added,
+                    'modified': modified,
+                    'removed': removed
+                }, f'{self.topic}:{self.version}')
+
+    def snapshot(self, timeout=SNAPSHOT_TIMEOUT):
+        """(version, orders newest first) from memory; no Firestore reads."""
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f'Order board listener for {self.status_filter} has not loaded yet')
+        with self._lock:
+            return self.version, _newest_first(self._orders.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'filter': self.status_filter,
+                'orders': len(self._orders),
+                'version': self.version,
+                'deltas': self.deltas,
+                'loaded': self._ready.is_set()
+            }
+
+
+class CanteenBoard:
+    """One shared BoardFeed per board filter, started when the first screen asks for it.
+
+    A feed keeps listening after its last screen disconnects; it only holds
+    the active orders, and the next screen gets its snapshot without a query.
+    """
+
+    def __init__(self, db, broker):
+        self._db = db
+        self._broker = broker
+        self._feeds = {}
+        self._lock = threading.Lock()
+
+    def feed(self, status_filter):
+        if status_filter not in BOARD_FILTERS:
+            raise ValueError(f"Live updates are only available for: {', '.join(BOARD_FILTERS)}")
+        with self._lock:
+            feed = self._feeds.get(status_filter)
+            if feed is None:
+                feed = BoardFeed(self._db, self._broker, status_filter)
+                feed.start()
+                self._feeds[status_filter] = feed
+            return feed
+
+    def close(self):
+        with self._lock:
+            feeds, self._feeds = list(self._feeds.values()), {}
+        for feed in feeds:
+            feed.close()
+
+    def stats(self):
+        with self._lock:
+            feeds = list(self._feeds.values())
+        return [feed.stats() for feed in feeds]
@@ -0,0 +1,210 @@
+import threading
+
+# Documents requested per db.get_all() round trip
+GET_ALL_CHUNK_SIZE = 100
+
+
+def _setter(product_id, product_data):
+    # Each catalog gets its own copy, so a replayed change doesn't share
+    # (and later mutate) the dict held by the catalog it replaced
+    def apply(products):
+        products[product_id] = dict(product_data)
+    return apply
+
+
+class ProductCatalogCache:
+    """In-memory copy of the `products` collection shared by all product routes.
+
+    The catalog is loaded once on first use and then kept current by a
+    Firestore `on_snapshot` listener. Routes that write products also call
+    put/update/remove so this process sees its own writes immediately, even
+    when the listener is disabled or has not delivered the change yet.
+    """
+
+    def __init__(self, db, collection='products', use_listener=True):
+        self._db = db
+        self._collection = collection
+        self._use_listener = use_listener
+        self._products = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._watch = None
+        # One change log per refresh in progress (see refresh())
+        self._refresh_logs = []
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.listener_events = 0
+
+    # Loading and invalidation
+
+    def refresh(self):
+        """Reload the whole catalog from Firestore.
+
+        Listener events and write-through calls that arrive while the
+        collection is streaming are logged and replayed onto the new copy
+        before it replaces the old one, so the swap can't undo them.
+        """
+        changes = []
+        with self._lock:
+            self._refresh_logs.append(changes)
+        try:
+            products = {}
+            for product in self._db.collection(self._collection).stream():
+                products[product.id] = product.to_dict()
+        except Exception:
+            with self._lock:
+                self._refresh_logs.remove(changes)
+            raise
+
+        with self._lock:
+            self._refresh_logs.remove(changes)
+            for apply in changes:
+                apply(products)
+            self._products = products
+            self._loaded = True
+            self.refreshes += 1
+
+        if self._use_listener and self._watch is None:
+            self._start_listener()
+
+        return len(products)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            self.hits += 1
+            return
+
+        with self._lock:
+            if self._loaded:
+                self.hits += 1
+                return
+            self.misses += 1
+            self.refresh()
+
+    def _start_listener(self):
+        try:
+            self._watch = self._db.collection(self._collection).on_snapshot(self._on_snapshot)
+        except Exception as e:
+            # Fall back to write-through updates only
+            print(f"Error starting product catalog listener: {str(e)}")
+            self._watch = None
+
+    def _apply(self, apply):
+        """Run apply(products) on the catalog and log it for any refresh in progress; hold the lock."""
+        apply(self._products)
+        for log in self._refresh_logs:
+            log.append(apply)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        with self._lock:
+            for change in changes:
+                self.listener_events += 1
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self._apply(lambda products, product_id=doc.id: products.pop(product_id, None))
+                else:
+                    self._apply(_setter(doc.id, doc.to_dict()))
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    # Write-through hooks
+
+    def put(self, product_id, product_data):
+        with self._lock:
+            self._apply(_setter(product_id, product_data))
+
+    def update(self, product_id, fields):
+        def apply(products):
+            if product_id in products:
+                products[product_id].update(fields)
+
+        with self._lock:
+            self._apply(apply)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._apply(lambda products: products.pop(product_id, None))
+
+    # Reads (always return copies so routes can decorate them freely)
+
+    def all(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [
+                {**data, 'id': product_id}
+                for product_id, data in sorted(self._products.items())
+            ]
+
+    def available(self):
+        return [p for p in self.all() if p.get('availability') == 'available']
+
+    def get(self, product_id):
+        self._ensure_loaded()
+        with self._lock:
+            data = self._products.get(product_id)
+        if data is not None:
+            return {**data, 'id': product_id}
+
+        # Not in memory: it may have been added by another worker before our
+        # listener caught up, so check Firestore directly.
+        self.misses += 1
+        product = self._db.collection(self._collection).document(product_id).get()
+        if not product.exists:
+            return None
+        self.put(product_id, product.to_dict())
+        return {**product.to_dict(), 'id': product_id}
+
+    def get_many(self, product_ids):
+        """Resolve a list of product ids to products, skipping ids that don't exist.
+
+        Ids are de-duplicated and results keep the order of first appearance.
+        Once the catalog is in memory this makes no Firestore calls; otherwise
+        (and for ids the catalog doesn't know yet) documents are fetched with
+        db.get_all() in chunks rather than one get() per id.
+        """
+        unique_ids = list(dict.fromkeys(str(pid) for pid in product_ids if pid))
+        found = {}
+
+        if self._loaded:
+            self.hits += 1
+            with self._lock:
+                for product_id in unique_ids:
+                    if product_id in self._products:
+                        found[product_id] = self._products[product_id]
+
+        missing = [pid for pid in unique_ids if pid not in found]
+        if missing:
+            if self._loaded:
+                self.misses += 1
+            collection = self._db.collection(self._collection)
+            for start in range(0, len(missing), GET_ALL_CHUNK_SIZE):
+                refs = [collection.document(pid) for pid in missing[start:start + GET_ALL_CHUNK_SIZE]]
+                for product in self._db.get_all(refs):
+                    if product.exists:
+                        found[product.id] = product.to_dict()
+                        if self._loaded:
+                            self.put(product.id, found[product.id])
+
+        return [
+            {**found[pid], 'id': pid}
+            for pid in unique_ids if pid in found
+        ]
+
+    def stats(self):
+        with self._lock:
+            size = len(self._products)
+        return {
+            'loaded': self._loaded,
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'listener_active': self._watch is not None,
+            'listener_events': self.listener_events
+        }
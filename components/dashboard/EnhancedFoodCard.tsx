@@ -2,6 +2,7 @@ import { useState } from 'react';
 import Image from 'next/image';
 import { motion, AnimatePresence } from 'framer-motion';
 import { FaStar, FaHeart, FaPlus, FaMinus, FaFire, FaAward } from 'react-icons/fa';
+import { getProductImageUrl } from '../../utils/imageHelpers';
 
 interface EnhancedFoodCardProps {
   product: any;
@@ -46,7 +47,7 @@ export default function EnhancedFoodCard({
         {/* Image */}
         <div className="relative h-40 overflow-hidden">
           <Image
-            src={product.image_url || '/images/default-food.jpg'}
+            src={getProductImageUrl(product, 400)}
             alt={product.name}
             layout="fill"
             objectFit="cover"
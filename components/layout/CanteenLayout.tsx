@@ -1,18 +1,15 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { useRouter } from 'next/router';
 import Link from 'next/link';
 import { motion, AnimatePresence } from 'framer-motion';
 import { FaUtensils, FaSignOutAlt, FaChartBar, FaClipboardList, FaCog, FaBell } from 'react-icons/fa';
+import { useServerEvents } from '../../hooks/useServerEvents';
 
 export default function CanteenLayout({ children }: { children: React.ReactNode }) {
   const router = useRouter();
   const [showLogoutConfirm, setShowLogoutConfirm] = useState(false);
   const [unreadNotifications, setUnreadNotifications] = useState(0);
 
-  useEffect(() => {
-    fetchNotifications();
-  }, []);
-
   const fetchNotifications = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -28,6 +25,16 @@ export default function CanteenLayout({ children }: { children: React.ReactNode
     }
   };
 
+  // Loads the count on connect, then keeps it current from pushed notifications
+  useServerEvents({
+    onSync: fetchNotifications,
+    onNotification: (notification) => {
+      if (!notification.read) {
+        setUnreadNotifications(prev => prev + 1);
+      }
+    },
+  });
+
   const menuItems = [
     { 
       href: '/canteen/orders', 
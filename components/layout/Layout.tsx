@@ -15,6 +15,7 @@ import {
   FaBell
 } from 'react-icons/fa';
 import Header from './Header';
+import { useServerEvents } from '../../hooks/useServerEvents';
 
 interface LayoutProps {
   children: React.ReactNode;
@@ -80,35 +81,43 @@ export default function Layout({ children }: LayoutProps) {
     };
     window.addEventListener('storage', handleStorageChange);
 
-    // Load notifications
-    const checkNotifications = async () => {
-      try {
-        const token = localStorage.getItem('token');
-        const response = await fetch('https://localhost969.pythonanywhere.com/notifications', {
-          headers: {
-            Authorization: token || '',
-          },
-        });
-        if (response.ok) {
-          const data = await response.json();
-          setNotifications(data.notifications);
-          setUnreadCount(data.notifications.filter((n: Notification) => !n.read).length);
-        }
-      } catch (error) {
-        console.error('Error fetching notifications:', error);
-      }
-    };
-
-    checkNotifications();
-    // Check for new notifications every minute
-    const notificationInterval = setInterval(checkNotifications, 60000);
-
     return () => {
       window.removeEventListener('storage', handleStorageChange);
-      clearInterval(notificationInterval);
     };
   }, [router.pathname]);
 
+  // Load notifications
+  const checkNotifications = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      const response = await fetch('https://localhost969.pythonanywhere.com/notifications', {
+        headers: {
+          Authorization: token || '',
+        },
+      });
+      if (response.ok) {
+        const data = await response.json();
+        setNotifications(data.notifications);
+        setUnreadCount(data.notifications.filter((n: Notification) => !n.read).length);
+      }
+    } catch (error) {
+      console.error('Error fetching notifications:', error);
+    }
+  };
+
+  // New notifications are pushed by the server instead of polled for
+  useServerEvents({
+    onSync: checkNotifications,
+    onNotification: (notification: Notification) => {
+      setNotifications(prev =>
+        prev.some(n => n.id === notification.id) ? prev : [notification, ...prev].slice(0, 50)
+      );
+      if (!notification.read) {
+        setUnreadCount(prev => prev + 1);
+      }
+    },
+  });
+
   const handleLogout = () => {
     localStorage.removeItem('token');
     localStorage.removeItem('userEmail');
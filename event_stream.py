@@ -0,0 +1,256 @@
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytz
+
+# Comment line sent when nothing else has been, so proxies keep the stream open
+# and a gone client is noticed
+HEARTBEAT_SECONDS = 15
+# Streams are closed after this long; EventSource reconnects on its own, which
+# re-checks the token and spreads clients over workers again
+MAX_STREAM_SECONDS = 600
+# Reconnect delay suggested to EventSource
+RETRY_MS = 3000
+
+
+def format_event(event_type, data, event_id=None):
+    """One Server-Sent Events message."""
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """A subscriber's bounded inbox; see EventBroker.subscribe."""
+
+    def __init__(self, topics, queue_size):
+        self.topics = topics
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next (event_type, data, event_id), or None after timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """In-process pub/sub fan-out for pushed events.
+
+    Subscribers hold a bounded queue; publish() never blocks, and a subscriber
+    that falls queue_size events behind is marked overflowed (its stream
+    then tells the client to reload instead of silently missing events).
+    Events with an id are delivered once even when published twice, which
+    happens when a worker sees its own write come back through a
+    FirestoreEventFeed.
+    """
+
+    def __init__(self, queue_size=100, remember_ids=4096):
+        self.queue_size = queue_size
+        self.remember_ids = remember_ids
+        self._topics = {}  # topic -> set of Subscription
+        self._recent_ids = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.delivered = 0
+        self.duplicates = 0
+        self.overflows = 0
+
+    def subscribe(self, topics):
+        subscription = Subscription(tuple(topics), self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def publish(self, topic, event_type, data, event_id=None):
+        """Queue an event for every subscriber of topic. Returns the number reached."""
+        with self._lock:
+            if event_id is not None:
+                key = (topic, event_id)
+                if key in self._recent_ids:
+                    self.duplicates += 1
+                    return 0
+                self._recent_ids[key] = True
+                if len(self._recent_ids) > self.remember_ids:
+                    self._recent_ids.popitem(last=False)
+            self.published += 1
+            subscribers = list(self._topics.get(topic, ()))
+
+        delivered = 0
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((event_type, data, event_id))
+                delivered += 1
+            except queue.Full:
+                if not subscription.overflowed:
+                    subscription.overflowed = True
+                    with self._lock:
+                        self.overflows += 1
+        with self._lock:
+            self.delivered += delivered
+        return delivered
+
+    def subscriptions(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._topics.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'topics': len(self._topics),
+                'subscriptions': sum(len(s) for s in self._topics.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+                'duplicates': self.duplicates,
+                'overflows': self.overflows
+            }
+
+
+def stream_events(broker, subscription, heartbeat=HEARTBEAT_SECONDS, max_seconds=MAX_STREAM_SECONDS,
+                  initial_events=(), accept=None):
+    """Generator of SSE text for a subscription; unsubscribes when the client goes away.
+
+    initial_events ((event_type, data, event_id) tuples) are sent right after
+    the "ready" event; queued events for which accept(event) is false are
+    skipped (e.g. deltas already contained in an initial snapshot).
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        yield format_event('ready', {'topics': list(subscription.topics)})
+        for event_type, data, event_id in initial_events:
+            yield format_event(event_type, data, event_id)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = subscription.get(min(heartbeat, remaining))
+            if subscription.overflowed:
+                # We dropped events for this client; it has to reload its state
+                yield format_event('resync', {'reason': 'overflow'})
+                return
+            if event is None:
+                yield ': ping\n\n'
+                continue
+            if accept is not None and not accept(event):
+                continue
+            event_type, data, event_id = event
+            yield format_event(event_type, data, event_id)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class FirestoreEventFeed:
+    """Publishes writes made by other workers to an EventBroker.
+
+    Listens to `collection` where `field` >= a recent timestamp. Every added
+    or modified document is passed to to_events(doc_id, data), which yields
+    (topic, event_type, data, event_id) tuples to publish. A listener keeps
+    every matching document in memory, so it is replaced every
+    rotate_seconds with one starting `overlap` seconds back; events seen
+    twice are dropped by the broker's id check.
+    """
+
+    def __init__(self, db, broker, collection, field, to_events, rotate_seconds=600, overlap=60):
+        self._db = db
+        self._broker = broker
+        self.collection = collection
+        self.field = field
+        self._to_events = to_events
+        self.rotate_seconds = rotate_seconds
+        self.overlap = overlap
+
+        self._watch = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.events = 0
+        self.rotations = 0
+        self.last_error = None
+
+    def _listen(self, since):
+        query = self._db.collection(self.collection).where(self.field, '>=', since)
+        return query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        for change in changes:
+            if change.type.name == 'REMOVED':
+                continue
+            doc = change.document
+            try:
+                for topic, event_type, data, event_id in self._to_events(doc.id, doc.to_dict() or {}):
+                    self._broker.publish(topic, event_type, data, event_id)
+                    self.events += 1
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error publishing {self.collection} event: {str(e)}")
+
+    def _rotate(self):
+        since = datetime.now(pytz.UTC) - timedelta(seconds=self.overlap)
+        watch = self._listen(since)
+        with self._lock:
+            old, self._watch = self._watch, watch
+        if old is not None:
+            old.unsubscribe()
+            self.rotations += 1
+
+    def _run(self):
+        while not self._stop.wait(self.rotate_seconds):
+            try:
+                self._rotate()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error restarting {self.collection} listener: {str(e)}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            self._rotate()
+        except Exception as e:
+            # Events from this worker are still pushed; other workers' aren't
+            self.last_error = str(e)
+            print(f"Error starting {self.collection} listener: {str(e)}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.collection}-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        with self._lock:
+            watch, self._watch = self._watch, None
+        if watch is not None:
+            watch.unsubscribe()
+
+    def stats(self):
+        return {
+            'collection': self.collection,
+            'listening': self._watch is not None,
+            'events': self.events,
+            'rotations': self.rotations,
+            'last_error': self.last_error
+        }
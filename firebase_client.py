@@ -0,0 +1,90 @@
+import os
+import threading
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+FIREBASE_OPTIONS = {
+    'storageBucket': 'quickbyte-f4aba.firebasestorage.app'  # Replace this with your Firebase storage bucket URL
+}
+
+_lock = threading.Lock()
+_client = None
+_factory = None
+
+
+def default_client_factory():
+    """Initialise the Firebase app from FIREBASE_CREDENTIALS and return a Firestore client.
+
+    Honours FIRESTORE_EMULATOR_HOST like any google-cloud client.
+    """
+    firebase_cred_path = os.getenv("FIREBASE_CREDENTIALS")  # Path to Firebase credentials JSON
+    if not firebase_cred_path:
+        raise ValueError("FIREBASE_CREDENTIALS environment variable is not set.")
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(firebase_cred_path), FIREBASE_OPTIONS)
+    return firestore.client()
+
+
+def local_client_factory():
+    """In-memory Firestore stand-in for local runs and benchmarks (see local_firestore.py)"""
+    from local_firestore import LocalFirestore
+    return LocalFirestore()
+
+
+# FIRESTORE_BACKEND picks the client get_db() builds when none was configured
+CLIENT_FACTORIES = {
+    'firestore': default_client_factory,
+    'memory': local_client_factory
+}
+
+
+def get_db():
+    """The process-wide Firestore client, created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                backend = os.getenv("FIRESTORE_BACKEND", "firestore")
+                if backend not in CLIENT_FACTORIES:
+                    raise ValueError(f"Unknown FIRESTORE_BACKEND: {backend}")
+                _client = (_factory or CLIENT_FACTORIES[backend])()
+    return _client
+
+
+def configure(client=None, factory=None):
+    """Swap the process-wide client.
+
+    Pass a ready client (emulator client, in-memory fake) or a zero-argument
+    factory that builds one on first use. With neither, the next get_db()
+    goes back to default_client_factory().
+    """
+    global _client, _factory
+    with _lock:
+        _client = client
+        _factory = factory
+
+
+def warm_up():
+    """Build the client now instead of on the first request."""
+    return get_db()
+
+
+class LazyClient:
+    """Stand-in for a Firestore client that resolves get_db() on every attribute access.
+
+    Modules can hold `db` from import time without initialising Firebase,
+    and configure() swaps the client underneath them.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __repr__(self):
+        return f'<LazyClient {_client!r}>'
+
+
+db = LazyClient()
@@ -0,0 +1,295 @@
+import time
+
+from flask import g, has_request_context
+from google.api_core import exceptions as gcp_exceptions
+
+# Operation names used in stats and the firestore_op_* metrics
+OP_GET = 'get'            # single document read
+OP_GET_ALL = 'get_all'    # batched document read
+OP_QUERY = 'query'        # query stream/get
+OP_WRITE = 'write'        # single document set/update/delete/create/add
+OP_BATCH = 'batch_commit'
+OP_TRANSACTION = 'transaction_commit'
+
+
+class FirestoreStats:
+    """Counters for the Firestore work done while handling one request."""
+
+    __slots__ = ('calls', 'reads', 'writes', 'queries', 'commits', 'transactions',
+                 'aborted', 'duration')
+
+    def __init__(self):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.commits = 0
+        self.transactions = 0
+        self.aborted = 0
+        self.duration = 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'reads': self.reads,
+            'writes': self.writes,
+            'queries': self.queries,
+            'commits': self.commits,
+            'transactions': self.transactions,
+            'transaction_retries': self.aborted,
+            'duration_ms': round(self.duration * 1000, 2)
+        }
+
+
+def current_stats():
+    """Stats of the request being handled, or None outside a request."""
+    if not has_request_context():
+        return None
+    if '_firestore_stats' not in g:
+        g._firestore_stats = FirestoreStats()
+    return g._firestore_stats
+
+
+class _Recorder:
+    """Process-wide sink for per-operation timings (read by request_metrics)."""
+
+    def __init__(self):
+        self.listeners = []
+
+    def record(self, op, duration, reads=0, writes=0, aborted=False):
+        stats = current_stats()
+        if stats is not None:
+            stats.calls += 1
+            stats.reads += reads
+            stats.writes += writes
+            stats.duration += duration
+            if op == OP_QUERY:
+                stats.queries += 1
+            elif op in (OP_BATCH, OP_TRANSACTION, OP_WRITE):
+                stats.commits += 1
+            if op == OP_TRANSACTION:
+                stats.transactions += 1
+                if aborted:
+                    stats.aborted += 1
+        for listener in self.listeners:
+            listener(op, duration, reads, writes, aborted)
+
+
+recorder = _Recorder()
+
+
+def _unwrap(value):
+    if isinstance(value, _Proxy):
+        return value._wrapped
+    if isinstance(value, dict):
+        return {k: _unwrap(v) for k, v in value.items()}
+    return value
+
+
+class _Proxy:
+    __slots__ = ('_wrapped',)
+
+    def __init__(self, wrapped):
+        object.__setattr__(self, '_wrapped', wrapped)
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._wrapped, name, value)
+
+    def __eq__(self, other):
+        return self._wrapped == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._wrapped)
+
+    def __repr__(self):
+        return repr(self._wrapped)
+
+
+class _Timer:
+    def __init__(self, op, writes=0):
+        self.op = op
+        self.writes = writes
+        self.reads = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        aborted = exc_type is not None and issubclass(exc_type, gcp_exceptions.Aborted)
+        recorder.record(self.op, time.perf_counter() - self.start,
+                        reads=self.reads, writes=self.writes if exc_type is None else 0,
+                        aborted=aborted)
+        return False
+
+
+class InstrumentedDocument(_Proxy):
+    __slots__ = ()
+
+    def collection(self, collection_id):
+        return InstrumentedCollection(self._wrapped.collection(collection_id))
+
+    def get(self, *args, **kwargs):
+        if 'transaction' in kwargs:
+            kwargs['transaction'] = _unwrap(kwargs['transaction'])
+        with _Timer(OP_GET) as timer:
+            timer.reads = 1
+            return self._wrapped.get(*args, **kwargs)
+
+    def _write(self, method, *args, **kwargs):
+        with _Timer(OP_WRITE, writes=1):
+            return getattr(self._wrapped, method)(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._write('set', *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write('update', *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write('delete', *args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._write('create', *args, **kwargs)
+
+
+def _counted_stream(stream, timer):
+    """Yield a query's documents; the query is recorded when the stream ends or is closed."""
+    with timer:
+        # Firestore bills one read for a query that matches nothing
+        timer.reads = 1
+        count = 0
+        for snapshot in stream:
+            count += 1
+            timer.reads = count
+            yield snapshot
+
+
+class InstrumentedQuery(_Proxy):
+    __slots__ = ()
+
+    def _chain(self, method, *args, **kwargs):
+        return InstrumentedQuery(getattr(self._wrapped, method)(*args, **kwargs))
+
+    def where(self, *args, **kwargs):
+        return self._chain('where', *args, **kwargs)
+
+    def order_by(self, *args, **kwargs):
+        return self._chain('order_by', *args, **kwargs)
+
+    def limit(self, *args, **kwargs):
+        return self._chain('limit', *args, **kwargs)
+
+    def offset(self, *args, **kwargs):
+        return self._chain('offset', *args, **kwargs)
+
+    def select(self, *args, **kwargs):
+        return self._chain('select', *args, **kwargs)
+
+    def start_at(self, cursor):
+        return self._chain('start_at', _unwrap(cursor))
+
+    def start_after(self, cursor):
+        return self._chain('start_after', _unwrap(cursor))
+
+    def end_before(self, cursor):
+        return self._chain('end_before', _unwrap(cursor))
+
+    def end_at(self, cursor):
+        return self._chain('end_at', _unwrap(cursor))
+
+    def stream(self, *args, **kwargs):
+        if 'transaction' in kwargs:
+            kwargs['transaction'] = _unwrap(kwargs['transaction'])
+        # The clock starts when the first document is requested
+        return _counted_stream(self._wrapped.stream(*args, **kwargs), _Timer(OP_QUERY))
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class InstrumentedCollection(InstrumentedQuery):
+    __slots__ = ()
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._wrapped.document(*args, **kwargs))
+
+    def add(self, *args, **kwargs):
+        with _Timer(OP_WRITE, writes=1):
+            update_time, ref = self._wrapped.add(*args, **kwargs)
+        return update_time, InstrumentedDocument(ref)
+
+
+class InstrumentedBatch(_Proxy):
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self._wrapped)
+
+    def set(self, reference, *args, **kwargs):
+        return self._wrapped.set(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._wrapped.update(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._wrapped.delete(_unwrap(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        return self._wrapped.create(_unwrap(reference), *args, **kwargs)
+
+    def commit(self):
+        with _Timer(OP_BATCH, writes=len(self._wrapped)):
+            return self._wrapped.commit()
+
+
+class InstrumentedTransaction(InstrumentedBatch):
+    """Transaction proxy; firestore.transactional() drives it through the private hooks."""
+
+    __slots__ = ()
+
+    def get(self, ref_or_query):
+        ref_or_query = _unwrap(ref_or_query)
+        with _Timer(OP_GET) as timer:
+            snapshots = list(self._wrapped.get(ref_or_query))
+            timer.reads = max(len(snapshots), 1)
+        return iter(snapshots)
+
+    def _commit(self):
+        with _Timer(OP_TRANSACTION, writes=len(self._wrapped)):
+            return self._wrapped._commit()
+
+
+class InstrumentedClient(_Proxy):
+    """Firestore client wrapper that counts and times every RPC made through it.
+
+    Counts go to the current request's FirestoreStats (see current_stats)
+    and to recorder.listeners, which request_metrics uses for /metrics.
+    Snapshot listeners are passed through uncounted.
+    """
+
+    __slots__ = ()
+
+    def collection(self, *args, **kwargs):
+        return InstrumentedCollection(self._wrapped.collection(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._wrapped.document(*args, **kwargs))
+
+    def batch(self):
+        return InstrumentedBatch(self._wrapped.batch())
+
+    def transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(self._wrapped.transaction(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        references = [_unwrap(ref) for ref in references]
+        if 'transaction' in kwargs:
+            kwargs['transaction'] = _unwrap(kwargs['transaction'])
+        with _Timer(OP_GET_ALL) as timer:
+            timer.reads = len(references)
+            snapshots = list(self._wrapped.get_all(references, *args, **kwargs))
+        return iter(snapshots)
@@ -0,0 +1,105 @@
+"""Gunicorn settings for QuickBite.
+
+Almost all request time is spent waiting on Firestore and ImgBB, so workers
+need concurrency inside the process rather than one request per process:
+
+    GUNICORN_WORKER_CLASS=gthread  (default) threads per worker, no extra deps
+    GUNICORN_WORKER_CLASS=gevent   cooperative greenlets; gevent is an optional
+                                   dependency (not in requirements.txt), install
+                                   it with `pip install gevent`. gRPC is switched
+                                   to gevent mode per worker, and app.py is
+                                   imported in each worker rather than preloaded
+    GUNICORN_WORKER_CLASS=eventlet supported by gunicorn, but the Firestore gRPC
+                                   client blocks the eventlet hub - prefer gevent
+
+Every open event stream (GET /events, GET /orders/canteen/stream) holds a
+thread under gthread, so a worker accepts at most threads / 2 of them and
+keeps the other half for normal requests; browsers beyond that fall back to
+polling. With many connected browsers use gevent, where a stream costs a
+greenlet and the cap is 3/4 of worker_connections (app.limit_event_streams).
+
+EventSource can't send an Authorization header, so the stream endpoints take
+the token as ?token=...; the access log redacts it (RedactingLogger).
+
+Everything can be overridden through the environment (see below) or on the
+gunicorn command line.
+"""
+import multiprocessing
+import os
+import re
+
+from gunicorn.glogging import Logger
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:" + os.getenv("PORT", "5000"))
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+# gthread: threads per worker. gevent/eventlet: concurrent greenlets per worker
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 500))
+
+# gevent/eventlet monkey-patch each worker as it starts, and gRPC needs
+# init_gevent() before any of its objects exist: anything built in the master
+# (app.py's locks and threads, the Firestore client) would stay unpatched
+ASYNC_WORKER_CLASSES = ("gevent", "eventlet")
+
+# Import app.py (credentials, Firestore client object, numpy...) once in the
+# master and fork it. The client opens its gRPC channel lazily, so nothing
+# network-bound is shared across the fork. Never with an async worker class
+# (see above): each worker then imports the app after it has been patched.
+preload_app = worker_class not in ASYNC_WORKER_CLASSES and os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# Open the Firestore channel and load the product catalog in each worker
+# before it takes traffic
+warm_up = os.getenv("GUNICORN_WARM_UP", "1") == "1"
+
+# Requests in flight get graceful_timeout seconds to finish on SIGTERM/HUP
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers now and then to cap slow leaks; jitter avoids all restarting at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+_TOKEN_PARAM = re.compile(r'((?:^|[?&])token=)[^&\s]*')
+
+
+class RedactingLogger(Logger):
+    """Access log without the ?token= the event stream endpoints are opened with."""
+
+    def atoms(self, resp, req, environ, request_time):
+        atoms = super().atoms(resp, req, environ, request_time)
+        for key in ('r', 'q'):
+            if atoms.get(key):
+                atoms[key] = _TOKEN_PARAM.sub(r'\1REDACTED', atoms[key])
+        return atoms
+
+
+logger_class = RedactingLogger
+
+
+def post_worker_init(worker):
+    # Runs after the gevent worker has monkey-patched the process
+    if worker_class == "gevent":
+        # Let gRPC cooperate with the gevent hub instead of blocking it
+        import grpc.experimental.gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+    import app as quickbite
+    # Leave threads (or greenlets) for normal requests however many browsers connect
+    quickbite.limit_event_streams(worker.cfg.worker_class_str, worker.cfg.threads, worker.cfg.worker_connections)
+    try:
+        quickbite.start_background_services(warm_up=warm_up)
+    except Exception as e:
+        # A failed warm-up shouldn't stop the worker; the catalog loads on first use
+        worker.log.warning(f"Background services failed to start: {str(e)}")
+
+
+def worker_exit(server, worker):
+    import app as quickbite
+    quickbite.stop_background_services()
@@ -0,0 +1,77 @@
+import { useEffect, useRef } from 'react';
+
+const EVENTS_URL = 'https://localhost969.pythonanywhere.com/events';
+// Used only when the event stream can't be opened (e.g. the server is at its stream limit)
+const FALLBACK_POLL_MS = 60000;
+
+interface ServerEventHandlers {
+  // Called on every (re)connect and on resync; reload whatever the events keep current
+  onSync: () => void;
+  onNotification?: (notification: any) => void;
+  onOrderStatus?: (update: { order_id: string; status: string; reason?: string }) => void;
+}
+
+/**
+ * Subscribes to GET /events (Server-Sent Events) for the logged-in user.
+ * Falls back to calling onSync every minute if the stream is refused.
+ */
+export function useServerEvents(handlers: ServerEventHandlers) {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token) return;
+
+    let source: EventSource | null = null;
+    let pollTimer: ReturnType<typeof setInterval> | null = null;
+
+    const startPolling = () => {
+      if (pollTimer) return;
+      handlersRef.current.onSync();
+      pollTimer = setInterval(() => handlersRef.current.onSync(), FALLBACK_POLL_MS);
+    };
+
+    if (typeof window === 'undefined' || !('EventSource' in window)) {
+      startPolling();
+      return () => {
+        if (pollTimer) clearInterval(pollTimer);
+      };
+    }
+
+    const connect = () => {
+      source = new EventSource(`${EVENTS_URL}?token=${encodeURIComponent(token)}`);
+
+      // Sent first on every connection; anything missed while disconnected is reloaded
+      source.addEventListener('ready', () => handlersRef.current.onSync());
+
+      source.addEventListener('notification', (e) => {
+        handlersRef.current.onNotification?.(JSON.parse((e as MessageEvent).data));
+      });
+
+      source.addEventListener('order_status', (e) => {
+        handlersRef.current.onOrderStatus?.(JSON.parse((e as MessageEvent).data));
+      });
+
+      // The server dropped events for us: reload and reconnect
+      source.addEventListener('resync', () => {
+        source?.close();
+        connect();
+      });
+
+      source.onerror = () => {
+        // EventSource retries network errors itself; a refused stream (401/503) stays closed
+        if (source?.readyState === EventSource.CLOSED) {
+          startPolling();
+        }
+      };
+    };
+
+    connect();
+
+    return () => {
+      source?.close();
+      if (pollTimer) clearInterval(pollTimer);
+    };
+  }, []);
+}
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_digest(fileobj):
+    """SHA-256 hex digest of a file, read in chunks from its current position (which is restored)."""
+    position = fileobj.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    fileobj.seek(position)
+    return digest.hexdigest()
+
+
+class ImageIndex:
+    """Persistent map from image content digests to the fields of their upload.
+
+    Lives in a SQLite database in WAL mode, so every worker process on the
+    host shares it and it survives restarts. Keys combine the SHA-256 of the
+    source bytes with the processing profile (renditions or the original),
+    so changing the rendition settings doesn't hand out old variant sets.
+    Holds at most max_entries; the least recently used entries are evicted
+    beyond that, and discard() drops an entry whose URLs have gone bad.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _conn(self):
+        # Opened on first use, so importing the app (or a preloading gunicorn
+        # master) doesn't touch the database
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS image_index (
+                    digest TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (digest, profile)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS image_index_last_used ON image_index (last_used)")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def get(self, digest, profile):
+        """Fields stored for this digest and profile, or None. Marks the entry as recently used."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT fields FROM image_index WHERE digest = ? AND profile = ?", (digest, profile)
+        ).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+        conn.execute(
+            "UPDATE image_index SET last_used = ?, hits = hits + 1 WHERE digest = ? AND profile = ?",
+            (time.time(), digest, profile)
+        )
+        self._count(hits=1)
+        return json.loads(row[0])
+
+    def put(self, digest, profile, fields, size):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO image_index (digest, profile, fields, size, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (digest, profile, json.dumps(fields), size, now, now))
+            excess = conn.execute("SELECT COUNT(*) FROM image_index").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("""
+                    DELETE FROM image_index WHERE rowid IN (
+                        SELECT rowid FROM image_index ORDER BY last_used LIMIT ?
+                    )
+                """, (excess,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if excess > 0:
+            self._count(evicted=excess)
+
+    def discard(self, digest):
+        """Forget every upload of this digest (all profiles). Returns the number of entries removed."""
+        return self._conn().execute("DELETE FROM image_index WHERE digest = ?", (digest,)).rowcount
+
+    def clear(self):
+        self._conn().execute("DELETE FROM image_index")
+
+    def stats(self):
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM image_index"
+        ).fetchone()
+        return {
+            'entries': entries,
+            'source_bytes': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted': self.evicted
+        }
@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Widths produced for every product image; the menu cards use 200/400,
+# product pages 800 and 1600 stands in for the original
+RENDITION_WIDTHS = (200, 400, 800, 1600)
+# image_url (for clients that don't know about image_variants) points at this width
+DEFAULT_WIDTH = 800
+# Byte budget per width; quality is stepped down until a rendition fits
+MAX_RENDITION_BYTES = {200: 25 * 1024, 400: 70 * 1024, 800: 180 * 1024, 1600: 450 * 1024}
+QUALITY_STEPS = (82, 72, 62, 52, 42)
+FORMATS = (('webp', 'WEBP', 'image/webp'), ('jpeg', 'JPEG', 'image/jpeg'))
+# Bump when render() output changes, so deduplicated uploads are redone (see image_dedup.py)
+RENDITIONS_VERSION = 1
+
+# Uploads larger than this are rejected before they are decoded
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+MAX_SOURCE_PIXELS = 40 * 1000 * 1000
+
+
+class ImageProcessingError(ValueError):
+    """The upload is not an image we can process (unreadable, too large, too many pixels)."""
+
+
+def probe(fileobj):
+    """Check an upload without decoding it; returns (format, width, height).
+
+    Only the header is parsed, so this is cheap enough for the request thread.
+    The file position is left where it was.
+    """
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell() - position
+    fileobj.seek(position)
+    if size > MAX_SOURCE_BYTES:
+        raise ImageProcessingError(f"Image is larger than {MAX_SOURCE_BYTES // (1024 * 1024)} MB")
+    try:
+        with Image.open(fileobj) as img:
+            image_format, (width, height) = img.format, img.size
+    except (UnidentifiedImageError, OSError):
+        raise ImageProcessingError("Not a supported image file")
+    finally:
+        fileobj.seek(position)
+    if width * height > MAX_SOURCE_PIXELS:
+        raise ImageProcessingError(f"Image is too large ({width}x{height})")
+    return image_format, width, height
+
+
+def _encode(img, pil_format, max_bytes):
+    """Encode at the highest quality step that fits max_bytes (or the lowest step)."""
+    for quality in QUALITY_STEPS:
+        out = BytesIO()
+        if pil_format == 'JPEG':
+            img.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            img.save(out, 'WEBP', quality=quality, method=4)
+        if out.tell() <= max_bytes:
+            break
+    return out.getvalue(), quality
+
+
+def _budget(width):
+    """Byte budget of the smallest configured width that is at least `width`."""
+    for bound in sorted(MAX_RENDITION_BYTES):
+        if width <= bound:
+            return MAX_RENDITION_BYTES[bound]
+    return max(MAX_RENDITION_BYTES.values())
+
+
+def render(data, widths=RENDITION_WIDTHS):
+    """Decode an image once and encode it as WebP and JPEG at each width.
+
+    Runs in the process pool. Widths above the source width are skipped
+    (there's always at least one rendition, at the source width). Returns a
+    list of dicts with width, height, format, content_type, quality and data.
+    """
+    try:
+        img = Image.open(BytesIO(data))
+        if img.width * img.height > MAX_SOURCE_PIXELS:
+            raise ImageProcessingError(f"Image is too large ({img.width}x{img.height})")
+        # JPEGs can be decoded straight at a reduced scale
+        img.draft('RGB', (max(widths), max(widths)))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageProcessingError(f"Could not decode image: {str(e)}")
+
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    targets = sorted({min(width, img.width) for width in widths}, reverse=True)
+    renditions = []
+    current = img
+    for width in targets:
+        height = max(1, round(img.height * width / img.width))
+        if (width, height) != current.size:
+            # Each size is scaled from the previous (larger) one
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        budget = _budget(width)
+        for name, pil_format, content_type in FORMATS:
+            frame = current
+            if pil_format == 'JPEG' and has_alpha:
+                frame = Image.new('RGB', current.size, (255, 255, 255))
+                frame.paste(current, mask=current.getchannel('A'))
+            encoded, quality = _encode(frame, pil_format, budget)
+            renditions.append({
+                'width': width,
+                'height': height,
+                'format': name,
+                'content_type': content_type,
+                'quality': quality,
+                'data': encoded
+            })
+    return sorted(renditions, key=lambda r: (r['width'], r['format']))
+
+
+class ImageProcessor:
+    """Runs render() in a pool of worker processes.
+
+    Decoding and encoding are CPU-bound, so they'd hold the GIL against the
+    request threads. The pool is created on first use (in the gunicorn
+    worker, not the preloading master) and uses the spawn start method, as
+    forking a process full of threads can deadlock the child.
+    """
+
+    def __init__(self, workers=2, widths=RENDITION_WIDTHS, default_width=DEFAULT_WIDTH):
+        self.workers = workers
+        self.widths = widths
+        self.default_width = default_width
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self.processed = 0
+        self.failed = 0
+        self.renditions = 0
+        self.source_bytes = 0
+        self.output_bytes = 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    @property
+    def profile(self):
+        widths = ','.join(str(width) for width in self.widths)
+        return f'renditions-v{RENDITIONS_VERSION}:{widths}:{self.default_width}'
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def render(self, fileobj):
+        """Render fileobj (read from the start) and wait for the result."""
+        fileobj.seek(0)
+        data = fileobj.read()
+        try:
+            renditions = self._executor().submit(render, data, self.widths).result()
+        except Exception:
+            self._count(failed=1)
+            raise
+        self._count(processed=1, renditions=len(renditions), source_bytes=len(data),
+                    output_bytes=sum(len(r['data']) for r in renditions))
+        return renditions
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            'processed': self.processed,
+            'failed': self.failed,
+            'renditions': self.renditions,
+            'source_bytes': self.source_bytes,
+            'output_bytes': self.output_bytes,
+            'workers': self.workers,
+            'widths': list(self.widths)
+        }
@@ -0,0 +1,335 @@
+import os
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from image_dedup import file_digest
+
+IMGBB_UPLOAD_URL = 'https://api.imgbb.com/1/upload'
+
+CHUNK_SIZE = 64 * 1024
+# Images up to this size are spooled in memory for background uploads; larger ones go to a temp file
+SPOOL_MAX_BYTES = 1024 * 1024
+# Worth another attempt: rate limited or the host had a bad moment
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ImageUploadError(Exception):
+    """Raised when an image could not be uploaded (after retries, if it was worth retrying)."""
+
+
+def spool(fileobj):
+    """Copy an uploaded file into a spooled temp file that outlives the request."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    shutil.copyfileobj(fileobj, spooled, CHUNK_SIZE)
+    spooled.seek(0)
+    return spooled
+
+
+class MultipartStream:
+    """multipart/form-data body that reads the image from its file as it is sent.
+
+    requests streams any body with read() and a known length, so the image
+    never has to be held in memory as one bytes object.
+    """
+
+    def __init__(self, fields, file_field, filename, fileobj, content_type):
+        self.boundary = uuid.uuid4().hex
+        head = b''
+        for name, value in fields.items():
+            head += (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n'
+            ).encode()
+        head += (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type or "application/octet-stream"}\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{self.boundary}--\r\n'.encode()
+
+        start = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - start
+        fileobj.seek(start)
+
+        self._parts = [BytesIO(head), fileobj, BytesIO(tail)]
+        self._length = len(head) + size + len(tail)
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and (size < 0 or size > 0):
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ImageUploader:
+    """Uploads images to ImgBB over a pooled keep-alive session.
+
+    upload() streams the file and retries connection errors, timeouts and
+    429/5xx answers with jittered exponential backoff (base_delay * 2^n,
+    capped at max_delay); other errors fail straight away. submit() queues
+    the upload for a background worker and calls
+    on_done(fields, error) when it has finished. The queue is bounded by
+    max_pending; when it is full, submit() uploads inline instead, so a
+    stalled image host slows down the admin screens rather than growing
+    memory.
+
+    With a processor (image_renditions.ImageProcessor), upload_image()
+    uploads every rendition instead of the original file. With an index
+    (image_dedup.ImageIndex), bytes that were uploaded before are not
+    uploaded again; the earlier result is reused.
+    """
+
+    def __init__(self, api_key, upload_url=IMGBB_UPLOAD_URL, timeout=(3.05, 30), max_attempts=3,
+                 base_delay=0.5, max_delay=5.0, pool_size=10, workers=2, max_pending=100,
+                 processor=None, index=None):
+        self.api_key = api_key
+        self.processor = processor
+        self.index = index
+        self.upload_url = upload_url
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.workers = workers
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.uploaded = 0
+        self.failed = 0
+        self.attempts = 0
+        self.retries = 0
+        self.inline = 0
+        self.deduplicated = 0
+        self.bytes_sent = 0
+        self.last_upload_ms = 0.0
+        self.last_error = None
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _post(self, fileobj, filename, content_type):
+        body = MultipartStream({'key': self.api_key}, 'image', filename, fileobj, content_type)
+        response = self.session.post(
+            self.upload_url,
+            data=body,
+            headers={'Content-Type': body.content_type},
+            timeout=self.timeout
+        )
+        self._count(bytes_sent=len(body))
+        return response
+
+    def upload(self, fileobj, filename, content_type=None):
+        """Upload fileobj (from its current position) and return the image URL."""
+        start_position = fileobj.tell()
+        start = time.perf_counter()
+        for attempt in range(self.max_attempts):
+            self._count(attempts=1)
+            fileobj.seek(start_position)
+            try:
+                response = self._post(fileobj, filename, content_type)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            else:
+                if response.status_code == 200:
+                    try:
+                        image_url = response.json()['data']['url']
+                    except (ValueError, KeyError, TypeError):
+                        self._fail(f"Unexpected response from image host: {response.text[:200]}")
+                    self._count(uploaded=1)
+                    self.last_upload_ms = (time.perf_counter() - start) * 1000
+                    return image_url
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRY_STATUSES:
+                    self._fail(error)
+
+            if attempt + 1 >= self.max_attempts:
+                self._fail(f"{error} (after {self.max_attempts} attempts)")
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+            self._count(retries=1)
+            time.sleep(delay)
+
+    @property
+    def profile(self):
+        """What upload_image() produces for a file; part of the dedup key."""
+        return self.processor.profile if self.processor is not None else 'original'
+
+    def find_uploaded(self, fileobj):
+        """Return (digest, fields): fields of an earlier upload of the same bytes, or None.
+
+        The digest is streamed over the file (position restored); both are
+        None without an index.
+        """
+        if self.index is None:
+            return None, None
+        digest = file_digest(fileobj)
+        fields = self.index.get(digest, self.profile)
+        if fields is not None:
+            self._count(deduplicated=1)
+        return digest, fields
+
+    def upload_image(self, fileobj, filename, content_type=None, digest=None):
+        """Upload a product image and return the product fields that describe it.
+
+        Without a processor that is just image_url. With one it is
+        image_variants (url, width, height, format and size of each
+        rendition, smallest first) and image_url pointing at the JPEG
+        rendition closest to processor.default_width.
+
+        Pass the digest from find_uploaded() if the index was already
+        checked for this file.
+        """
+        if self.index is None:
+            return self._upload_image(fileobj, filename, content_type)
+        if digest is None:
+            digest, fields = self.find_uploaded(fileobj)
+            if fields is not None:
+                return fields
+
+        position = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - position
+        fileobj.seek(position)
+        fields = self._upload_image(fileobj, filename, content_type)
+        try:
+            self.index.put(digest, self.profile, fields, size)
+        except Exception as e:
+            print(f"Error updating image index: {str(e)}")
+        return fields
+
+    def _upload_image(self, fileobj, filename, content_type):
+        if self.processor is None:
+            # Clears the variants of a previous image on update
+            return {'image_url': self.upload(fileobj, filename, content_type), 'image_variants': []}
+
+        stem = os.path.splitext(os.path.basename(filename or 'image'))[0] or 'image'
+        variants = []
+        for rendition in self.processor.render(fileobj):
+            extension = 'jpg' if rendition['format'] == 'jpeg' else rendition['format']
+            url = self.upload(
+                BytesIO(rendition['data']),
+                f"{stem}-{rendition['width']}w.{extension}",
+                rendition['content_type']
+            )
+            variants.append({
+                'url': url,
+                'width': rendition['width'],
+                'height': rendition['height'],
+                'format': rendition['format'],
+                'bytes': len(rendition['data'])
+            })
+
+        jpegs = [v for v in variants if v['format'] == 'jpeg']
+        default = min(jpegs, key=lambda v: abs(v['width'] - self.processor.default_width))
+        return {'image_url': default['url'], 'image_variants': variants}
+
+    def _fail(self, error):
+        self._count(failed=1)
+        self.last_error = error
+        raise ImageUploadError(error)
+
+    def submit(self, fileobj, filename, content_type, on_done, digest=None):
+        """Upload in the background; fileobj must outlive the request (see spool) and is closed afterwards."""
+        self.start()
+        try:
+            self._jobs.put_nowait((fileobj, filename, content_type, on_done, digest))
+        except queue.Full:
+            self._count(inline=1)
+            self._run_job(fileobj, filename, content_type, on_done, digest)
+
+    def _run_job(self, fileobj, filename, content_type, on_done, digest=None):
+        fields, error = None, None
+        try:
+            fields = self.upload_image(fileobj, filename, content_type, digest=digest)
+        except Exception as e:
+            error = str(e)
+            print(f"Error uploading image {filename}: {error}")
+        finally:
+            fileobj.close()
+        try:
+            on_done(fields, error)
+        except Exception as e:
+            print(f"Error in image upload callback: {str(e)}")
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                self._run_job(*job)
+            finally:
+                self._jobs.task_done()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'image-upload-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=30):
+        """Finish the uploads already queued, then stop the workers."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        return {
+            'uploaded': self.uploaded,
+            'failed': self.failed,
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'pending': self._jobs.qsize(),
+            'inline': self.inline,
+            'deduplicated': self.deduplicated,
+            'bytes_sent': self.bytes_sent,
+            'last_upload_ms': round(self.last_upload_ms, 2),
+            'last_error': self.last_error,
+            'workers': len(self._threads)
+        }
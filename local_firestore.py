@@ -0,0 +1,763 @@
+import itertools
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud.firestore_v1 import ReadAfterWriteError
+from firebase_admin import firestore
+
+# Same cap Firestore enforces on a commit (WriteBatch or transaction)
+MAX_WRITES_PER_COMMIT = 500
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: _sort_key(a) < _sort_key(b),
+    '<=': lambda a, b: _sort_key(a) <= _sort_key(b),
+    '>': lambda a, b: _sort_key(a) > _sort_key(b),
+    '>=': lambda a, b: _sort_key(a) >= _sort_key(b),
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    'array_contains_any': lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+_MISSING = object()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _copy(value):
+    """Deep copy of a document value (cheaper than copy.deepcopy for plain data)."""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _normalize(value):
+    """Store values the way Firestore returns them: datetimes as aware UTC."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, DocumentReference):
+        return value
+    return value
+
+
+def _sort_key(value):
+    """Firestore's cross-type ordering: null < bool < number < timestamp < string < ..."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, _normalize(value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, DocumentReference):
+        return (6, value.path)
+    if isinstance(value, list):
+        return (8, [_sort_key(v) for v in value])
+    return (9, repr(value))
+
+
+def _get_path(data, field_path):
+    for part in field_path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _apply_transform(current, value):
+    """Resolve a write value against the field's current value."""
+    if value is firestore.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, firestore.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, firestore.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        result.extend(v for v in value.values if v not in result)
+        return result
+    if isinstance(value, firestore.ArrayRemove):
+        return [v for v in current if v not in value.values] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        return {k: _apply_transform(_MISSING, v) for k, v in value.items()
+                if v is not firestore.DELETE_FIELD}
+    return _normalize(value)
+
+
+def _set_path(data, parts, value):
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    if value is firestore.DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = _apply_transform(data.get(parts[-1], _MISSING), value)
+
+
+def _merge(data, updates):
+    """set(merge=True): nested maps are merged field by field."""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            _merge(data[key], value)
+        else:
+            _set_path(data, [key], value)
+
+
+class _Doc:
+    __slots__ = ('data', 'version', 'create_time', 'update_time')
+
+    def __init__(self, data, version, create_time, update_time):
+        self.data = data
+        self.version = version
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_path(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self):
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self.path.rsplit('/', 1)[0])
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f'<DocumentReference {self.path}>'
+
+    def collection(self, collection_id):
+        return CollectionReference(self._client, f'{self.path}/{collection_id}')
+
+    def get(self, field_paths=None, transaction=None):
+        return self._client._get_documents([self], transaction)[0]
+
+    def create(self, document_data):
+        return self._client._commit([('create', self, document_data)])
+
+    def set(self, document_data, merge=False):
+        return self._client._commit([('set', self, document_data, bool(merge))])
+
+    def update(self, field_updates):
+        return self._client._commit([('update', self, field_updates)])
+
+    def delete(self):
+        return self._client._commit([('delete', self)])
+
+
+class Query:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, client, collection_path, filters=(), orders=(), limit=None,
+                 offset=0, start=None, end=None):
+        self._client = client
+        self._path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._start = start  # (values, inclusive)
+        self._end = end
+
+    def _copy_with(self, **changes):
+        params = {
+            'filters': self._filters, 'orders': self._orders, 'limit': self._limit,
+            'offset': self._offset, 'start': self._start, 'end': self._end
+        }
+        params.update(changes)
+        return Query(self._client, self._path, **params)
+
+    def where(self, field_path, op_string, value):
+        if op_string not in _OPERATORS:
+            raise ValueError(f'Operator {op_string} is not supported')
+        return self._copy_with(filters=self._filters + ((field_path, op_string, _normalize(value)),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy_with(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy_with(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy_with(offset=num_to_skip)
+
+    def _cursor(self, document_fields_or_snapshot):
+        fields = document_fields_or_snapshot
+        if isinstance(fields, DocumentSnapshot):
+            data = fields._data or {}
+            return [fields.reference if field == '__name__' else _get_path(data, field)
+                    for field, _ in self._orders]
+        if isinstance(fields, dict):
+            return [fields.get(field) for field, _ in self._orders]
+        return list(fields)
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy_with(start=(self._cursor(document_fields_or_snapshot), True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy_with(start=(self._cursor(document_fields_or_snapshot), False))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy_with(end=(self._cursor(document_fields_or_snapshot), False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy_with(end=(self._cursor(document_fields_or_snapshot), True))
+
+    # Evaluation
+
+    def _matches(self, doc_id, data):
+        for field_path, op, value in self._filters:
+            current = doc_id if field_path == '__name__' else _get_path(data, field_path)
+            if current is _MISSING or not _OPERATORS[op](current, value):
+                return False
+        return True
+
+    def _order_values(self, ref, data):
+        values = []
+        for field_path, _ in self._orders:
+            if field_path == '__name__':
+                values.append(ref.path)
+                continue
+            value = _get_path(data, field_path)
+            if value is _MISSING:
+                return None
+            values.append(value)
+        return values
+
+    def _compare(self, values, cursor):
+        """-1/0/1 comparing a document's order values with a cursor, in query order."""
+        for (field_path, direction), value, bound in zip(self._orders, values, cursor):
+            if field_path == '__name__' and isinstance(bound, str):
+                bound = bound if '/' in bound else f'{self._path}/{bound}'
+            elif isinstance(bound, DocumentReference):
+                bound = bound.path
+            a, b = _sort_key(value), _sort_key(bound)
+            if a != b:
+                result = -1 if a < b else 1
+                return -result if direction == self.DESCENDING else result
+        return 0
+
+    def _run(self, docs):
+        """Apply filters, ordering, cursors, offset and limit to [(ref, data)]."""
+        rows = []
+        for ref, data in docs:
+            if not self._matches(ref.id, data):
+                continue
+            values = self._order_values(ref, data)
+            if values is None:
+                continue  # Firestore drops documents missing an order_by field
+            rows.append((values, ref, data))
+
+        # Firestore breaks ties by document name, in the direction of the last order
+        last_direction = self._orders[-1][1] if self._orders else self.ASCENDING
+        rows.sort(key=lambda row: row[1].path, reverse=last_direction == self.DESCENDING)
+        for index in range(len(self._orders) - 1, -1, -1):
+            direction = self._orders[index][1]
+            rows.sort(key=lambda row: _sort_key(row[0][index]), reverse=direction == self.DESCENDING)
+
+        if self._start:
+            cursor, inclusive = self._start
+            rows = [row for row in rows
+                    if self._compare(row[0], cursor) > 0 or (inclusive and self._compare(row[0], cursor) == 0)]
+        if self._end:
+            cursor, inclusive = self._end
+            rows = [row for row in rows
+                    if self._compare(row[0], cursor) < 0 or (inclusive and self._compare(row[0], cursor) == 0)]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [(ref, data) for _, ref, data in rows]
+
+    def stream(self, transaction=None):
+        return iter(self._client._run_query(self, transaction))
+
+    def get(self, transaction=None):
+        return self._client._run_query(self, transaction)
+
+    def on_snapshot(self, callback):
+        return self._client._listen(self, callback)
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, f'{self._path}/{document_id or uuid.uuid4().hex[:20]}')
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return _now(), ref
+
+    def list_documents(self):
+        with self._client._lock:
+            ids = list(self._client._collections.get(self._path, {}))
+        return [self.document(doc_id) for doc_id in ids]
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data))
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference, document_data, bool(merge)))
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference, field_updates))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class Transaction(WriteBatch):
+    """Optimistic transaction: commit aborts if a document it read has changed since.
+
+    Implements the private hooks firestore.transactional() drives, so the
+    app's @firestore.transactional functions run unchanged.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        if self._id is not None:
+            raise ValueError('Transaction already in progress')
+        self._id = str(next(self._ids)).encode()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        if self._id is None:
+            raise ValueError('Transaction not in progress')
+        try:
+            return self._client._commit(self._writes, reads=self._reads)
+        finally:
+            self._clean_up()
+
+    def _check_read(self):
+        # Like the real client: every read of a transaction has to come before its writes
+        if self._writes:
+            raise ReadAfterWriteError('Attempted read after write in a transaction.')
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return iter(self._client._get_documents([ref_or_query], self))
+        return ref_or_query.stream(transaction=self)
+
+
+class _Watch:
+    def __init__(self, client, query, callback):
+        self._client = client
+        self.query = query
+        self.callback = callback
+        self.matching = set()
+
+    def unsubscribe(self):
+        self._client._unlisten(self)
+
+
+class LocalFirestore:
+    """In-memory stand-in for a google.cloud.firestore Client.
+
+    Supports the subset of the API QuickBite uses: documents and
+    subcollections, set/merge/update with field paths, SERVER_TIMESTAMP,
+    Increment, ArrayUnion/ArrayRemove and DELETE_FIELD, queries with
+    where/order_by/limit/offset/cursors, get_all, WriteBatch (capped at 500
+    writes like Firestore), transactions that abort on conflicting writes
+    and, like the real client, reject reads after a write, and query
+    on_snapshot listeners (called synchronously after each commit).
+
+    Equality filters use per-field hash indexes that are built on first use,
+    so large seeded collections stay fast. Call counters (stats()) mirror
+    what Firestore would bill: RPCs, documents read and documents written.
+
+    latency (seconds) is slept before every RPC, outside the store lock, to
+    approximate network round trips in benchmarks.
+
+    Install it with firebase_client.configure(client=LocalFirestore()) or by
+    setting FIRESTORE_BACKEND=memory.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._lock = threading.RLock()
+        self._collections = {}  # collection path -> {doc_id: _Doc}
+        self._indexes = {}      # (collection path, field) -> {value: set(doc_ids)}
+        self._watches = []
+        self._versions = itertools.count(1)
+
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.aborted = 0
+        self._thread_counts = threading.local()
+
+    # Public client API
+
+    def collection(self, *path):
+        return CollectionReference(self, '/'.join(path))
+
+    def document(self, *path):
+        return DocumentReference(self, '/'.join(path))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        return iter(self._get_documents(list(references), transaction))
+
+    def collections(self):
+        with self._lock:
+            paths = [path for path, docs in self._collections.items() if '/' not in path and docs]
+        return [CollectionReference(self, path) for path in paths]
+
+    def stats(self):
+        return {'calls': self.calls, 'reads': self.reads, 'writes': self.writes, 'aborted': self.aborted}
+
+    def reset_stats(self):
+        self.calls = self.reads = self.writes = self.aborted = 0
+
+    def thread_stats(self):
+        """Counters for the calling thread only; lets a harness attribute calls to one request."""
+        counts = self._thread_counts.__dict__
+        return {name: counts.get(name, 0) for name in ('calls', 'reads', 'writes', 'aborted')}
+
+    def _count(self, **deltas):
+        # Called with self._lock held
+        counts = self._thread_counts.__dict__
+        for name, delta in deltas.items():
+            setattr(self, name, getattr(self, name) + delta)
+            counts[name] = counts.get(name, 0) + delta
+
+    def close(self):
+        pass
+
+    # Reads
+
+    def _snapshot(self, ref, doc, read_time):
+        if doc is None:
+            return DocumentSnapshot(ref, None, read_time=read_time)
+        return DocumentSnapshot(ref, doc.data, doc.create_time, doc.update_time, read_time)
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _get_documents(self, refs, transaction=None):
+        if transaction is not None:
+            transaction._check_read()
+        self._round_trip()
+        read_time = _now()
+        with self._lock:
+            self._count(calls=1, reads=len(refs))
+            snapshots = []
+            for ref in refs:
+                collection_path, doc_id = ref.path.rsplit('/', 1)
+                doc = self._collections.get(collection_path, {}).get(doc_id)
+                if transaction is not None:
+                    transaction._reads[ref.path] = doc.version if doc else None
+                snapshots.append(self._snapshot(ref, doc, read_time))
+        return snapshots
+
+    def _candidates(self, query):
+        """Documents worth evaluating, narrowed by an equality index when possible."""
+        docs = self._collections.get(query._path, {})
+        for field_path, op, value in query._filters:
+            if op != '==' or field_path == '__name__':
+                continue
+            try:
+                hash(value)
+            except TypeError:
+                continue
+            ids = self._index(query._path, field_path).get(value, ())
+            return [(doc_id, docs[doc_id]) for doc_id in ids]
+        return list(docs.items())
+
+    def _index(self, collection_path, field_path):
+        key = (collection_path, field_path)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = {}
+            for doc_id, doc in self._collections.get(collection_path, {}).items():
+                self._index_add(index, doc_id, _get_path(doc.data, field_path))
+        return index
+
+    @staticmethod
+    def _index_add(index, doc_id, value):
+        if value is _MISSING:
+            return
+        try:
+            index.setdefault(value, set()).add(doc_id)
+        except TypeError:
+            pass  # unhashable values (maps, arrays) can't equal a hashable filter value
+
+    @staticmethod
+    def _index_remove(index, doc_id, value):
+        if value is _MISSING:
+            return
+        try:
+            ids = index.get(value)
+        except TypeError:
+            return
+        if ids is not None:
+            ids.discard(doc_id)
+            if not ids:
+                del index[value]
+
+    def _run_query(self, query, transaction=None):
+        if transaction is not None:
+            transaction._check_read()
+        self._round_trip()
+        read_time = _now()
+        with self._lock:
+            self._count(calls=1)
+            candidates = self._candidates(query)
+            rows = query._run(
+                (DocumentReference(self, f'{query._path}/{doc_id}'), doc.data)
+                for doc_id, doc in candidates
+            )
+            collection = self._collections.get(query._path, {})
+            snapshots = []
+            for ref, _ in rows:
+                doc = collection[ref.id]
+                if transaction is not None:
+                    transaction._reads[ref.path] = doc.version
+                snapshots.append(self._snapshot(ref, doc, read_time))
+            self._count(reads=max(len(snapshots), 1))  # an empty query still bills one read
+        return snapshots
+
+    # Writes
+
+    def _commit(self, writes, reads=None):
+        if len(writes) > MAX_WRITES_PER_COMMIT:
+            raise gcp_exceptions.InvalidArgument(
+                f'maximum {MAX_WRITES_PER_COMMIT} writes allowed per request'
+            )
+
+        self._round_trip()
+        commit_time = _now()
+        changed = []
+        with self._lock:
+            self._count(calls=1)
+            for path, version in (reads or {}).items():
+                collection_path, doc_id = path.rsplit('/', 1)
+                doc = self._collections.get(collection_path, {}).get(doc_id)
+                if (doc.version if doc else None) != version:
+                    self._count(aborted=1)
+                    raise gcp_exceptions.Aborted(f'Transaction lock timeout or conflict on {path}')
+
+            # Validate everything first so a failing write leaves nothing applied
+            staged = {}
+            for write in writes:
+                kind, ref = write[0], write[1]
+                collection_path, doc_id = ref.path.rsplit('/', 1)
+                if ref.path in staged:
+                    current = staged[ref.path]
+                else:
+                    doc = self._collections.get(collection_path, {}).get(doc_id)
+                    current = _copy(doc.data) if doc else None
+
+                if kind == 'create':
+                    if current is not None:
+                        raise gcp_exceptions.AlreadyExists(f'Document already exists: {ref.path}')
+                    new = {}
+                    _merge(new, write[2])
+                elif kind == 'set':
+                    new = current if write[3] and current is not None else {}
+                    _merge(new, write[2])
+                elif kind == 'update':
+                    if current is None:
+                        raise gcp_exceptions.NotFound(f'No document to update: {ref.path}')
+                    new = current
+                    for field_path, value in write[2].items():
+                        _set_path(new, field_path.split('.'), value)
+                else:
+                    new = None
+                staged[ref.path] = new
+
+            for path, new in staged.items():
+                changed.append(self._store(path, new, commit_time))
+            self._count(writes=len(writes))
+
+        self._notify([change for change in changed if change])
+        return [SimpleNamespace(update_time=commit_time) for _ in writes]
+
+    def _store(self, path, new, commit_time):
+        collection_path, doc_id = path.rsplit('/', 1)
+        collection = self._collections.setdefault(collection_path, {})
+        old = collection.get(doc_id)
+        if old is None and new is None:
+            return None
+
+        for (indexed_path, field_path), index in self._indexes.items():
+            if indexed_path != collection_path:
+                continue
+            if old is not None:
+                self._index_remove(index, doc_id, _get_path(old.data, field_path))
+            if new is not None:
+                self._index_add(index, doc_id, _get_path(new, field_path))
+
+        if new is None:
+            del collection[doc_id]
+        else:
+            collection[doc_id] = _Doc(
+                new, next(self._versions),
+                old.create_time if old else commit_time, commit_time
+            )
+        return path, old.data if old else None, new
+
+    # Listeners
+
+    def _listen(self, query, callback):
+        watch = _Watch(self, query, callback)
+        with self._lock:
+            snapshots = self._run_query(query)
+            watch.matching = {snapshot.id for snapshot in snapshots}
+            self._watches.append(watch)
+        changes = [_Change('ADDED', snapshot, -1, i) for i, snapshot in enumerate(snapshots)]
+        self._deliver(watch, snapshots, changes)
+        return watch
+
+    def _unlisten(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, changed):
+        if not changed or not self._watches:
+            return
+        read_time = _now()
+        with self._lock:
+            watches = list(self._watches)
+        for watch in watches:
+            query = watch.query
+            changes = []
+            for path, old, new in changed:
+                collection_path, doc_id = path.rsplit('/', 1)
+                if collection_path != query._path:
+                    continue
+                ref = DocumentReference(self, path)
+                was = doc_id in watch.matching
+                now = new is not None and bool(query._copy_with(limit=None, offset=0)._run([(ref, new)]))
+                if now:
+                    watch.matching.add(doc_id)
+                    snapshot = DocumentSnapshot(ref, new, update_time=read_time, read_time=read_time)
+                    changes.append(_Change('MODIFIED' if was else 'ADDED', snapshot, -1, -1))
+                elif was:
+                    watch.matching.discard(doc_id)
+                    snapshot = DocumentSnapshot(ref, old, read_time=read_time)
+                    changes.append(_Change('REMOVED', snapshot, -1, -1))
+            if changes:
+                self._deliver(watch, None, changes)
+
+    def _deliver(self, watch, snapshots, changes):
+        try:
+            watch.callback(snapshots, changes, _now())
+        except Exception as e:
+            print(f"Error in local snapshot listener: {str(e)}")
+
+
+class _Change:
+    def __init__(self, type_name, document, old_index, new_index):
+        self.type = SimpleNamespace(name=type_name)
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
@@ -0,0 +1,115 @@
+import bisect
+
+from firebase_admin import firestore
+
+# Add these constants for loyalty tiers
+LOYALTY_TIERS = {
+    'BRONZE': {'min_spent': 0, 'points_multiplier': 1},
+    'SILVER': {'min_spent': 1000, 'points_multiplier': 1.2},
+    'GOLD': {'min_spent': 5000, 'points_multiplier': 1.5},
+    'PLATINUM': {'min_spent': 10000, 'points_multiplier': 2}
+}
+
+LOYALTY_REWARDS = {
+    'REWARD100': {'points': 100, 'value': 100, 'description': '₹100 Cashback'},
+    'REWARD500': {'points': 500, 'value': 500, 'description': '₹500 Cashback'}
+}
+
+# 1 point per 10 rupees spent on completed orders
+POINTS_PER_RUPEE = 0.1
+
+# Tier thresholds sorted once so lookups are a bisect instead of a scan
+_TIER_NAMES = sorted(LOYALTY_TIERS, key=lambda t: LOYALTY_TIERS[t]['min_spent'])
+_TIER_THRESHOLDS = [LOYALTY_TIERS[t]['min_spent'] for t in _TIER_NAMES]
+
+
+def tier_for(total_spent):
+    index = bisect.bisect_right(_TIER_THRESHOLDS, total_spent) - 1
+    return _TIER_NAMES[max(index, 0)]
+
+
+def next_tier_for(total_spent):
+    index = bisect.bisect_right(_TIER_THRESHOLDS, total_spent)
+    return _TIER_NAMES[index] if index < len(_TIER_NAMES) else None
+
+
+def available_rewards(points):
+    return [
+        {
+            'id': reward_id,
+            'description': reward['description'],
+            'points_required': reward['points'],
+            'type': 'cashback',
+            'value': reward['value']
+        }
+        for reward_id, reward in LOYALTY_REWARDS.items()
+        if points >= reward['points']
+    ]
+
+
+def has_loyalty_counters(user_data):
+    return 'lifetime_spent' in user_data
+
+
+def order_points(total):
+    """Whole points earned by one completed order.
+
+    Points are counted per order, so the counter only ever holds integers and
+    the backfill (which sums the same values) agrees with the live increments.
+    """
+    return int(round(total * POINTS_PER_RUPEE, 6))
+
+
+def completion_increments(total, points=None, sign=1):
+    """User-document updates for orders entering (sign=1) or leaving (sign=-1) 'completed'.
+
+    points defaults to order_points(total); pass the per-order sum when
+    total covers several orders.
+    """
+    if points is None:
+        points = order_points(total)
+    return {
+        'lifetime_spent': firestore.Increment(sign * total),
+        'points_balance': firestore.Increment(sign * points)
+    }
+
+
+def ensure_loyalty_counters(db, user_email, user_data):
+    """Backfill lifetime_spent/points_balance for users created before the counters existed.
+
+    This scans the user's completed orders once; afterwards update_order_status
+    keeps the counters current. Returns (lifetime_spent, points_balance).
+
+    The orders are summed inside the transaction, and all of the user's orders
+    are read (not just completed ones) so an order completing meanwhile is in
+    the read set: the backfill retries and counts it once.
+    """
+    if has_loyalty_counters(user_data):
+        return user_data.get('lifetime_spent', 0), user_data.get('points_balance', 0)
+
+    user_ref = db.collection('users').document(user_email)
+    user_orders = db.collection('orders').where('user_email', '==', user_email)
+    transaction = db.transaction()
+
+    @firestore.transactional
+    def backfill_in_transaction(transaction, user_ref):
+        current = user_ref.get(transaction=transaction).to_dict() or {}
+        if has_loyalty_counters(current):
+            # Someone else initialised the counters first
+            return current.get('lifetime_spent', 0), current.get('points_balance', 0)
+
+        totals = [
+            order_data.get('total', 0)
+            for order_data in (order.to_dict() for order in transaction.get(user_orders))
+            if order_data.get('status') == 'completed'
+        ]
+        lifetime_spent = sum(totals)
+        points_earned = sum(order_points(total) for total in totals)
+        points_balance = max(0, points_earned - current.get('points_redeemed', 0))
+        transaction.update(user_ref, {
+            'lifetime_spent': lifetime_spent,
+            'points_balance': points_balance
+        })
+        return lifetime_spent, points_balance
+
+    return backfill_in_transaction(transaction, user_ref)
@@ -0,0 +1,189 @@
+import atexit
+import random
+import threading
+import time
+from collections import deque
+
+# Largest write batch Firestore accepts
+MAX_BATCH_SIZE = 500
+
+
+class NotificationWriter:
+    """Writes notification documents from a background thread in batches.
+
+    enqueue() picks the document id on the spot (ids are generated client
+    side, no round trip) and returns straight away; a writer thread commits
+    everything queued as one WriteBatch once batch_size notifications are
+    waiting or the oldest has waited flush_interval seconds, so a burst of
+    status changes costs one commit instead of one write each.
+
+    Backpressure: once max_pending notifications are queued, enqueue()
+    waits up to block_timeout for room and then writes the notification
+    itself, so a Firestore outage slows requests down instead of growing
+    memory without bound. A failed commit is retried with backoff
+    (max_attempts in total) before its notifications are dropped and
+    counted. stop() - also run at interpreter exit - writes whatever is
+    still queued.
+    """
+
+    def __init__(self, db, collection='notifications', batch_size=MAX_BATCH_SIZE, flush_interval=0.2,
+                 max_pending=10000, block_timeout=1.0, max_attempts=3, base_delay=0.2):
+        self._db = db
+        self.collection = collection
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.block_timeout = block_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+
+        self._pending = deque()  # (enqueued_at, document ref, data)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._in_flight = 0
+        self._atexit_registered = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.dropped = 0
+        self.inline = 0
+        self.blocked_seconds = 0.0
+        self.last_batch_size = 0
+        self.last_commit_ms = 0.0
+        self.max_delay_ms = 0.0  # longest enqueue -> commit wait
+        self.last_error = None
+
+    def enqueue(self, data):
+        """Queue a notification document; returns its id."""
+        ref = self._db.collection(self.collection).document()
+        self.start()
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                start = time.monotonic()
+                self._cond.wait_for(lambda: len(self._pending) < self.max_pending, self.block_timeout)
+                self.blocked_seconds += time.monotonic() - start
+            if len(self._pending) < self.max_pending and not self._stopping:
+                self._pending.append((time.monotonic(), ref, data))
+                self.enqueued += 1
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+                return ref.id
+            self.inline += 1
+
+        # Still full (or shutting down): write it on the caller's thread
+        ref.set(data)
+        with self._cond:
+            self.written += 1
+        return ref.id
+
+    def _take_batch(self):
+        """Wait for a full batch or the flush interval; called with the lock held."""
+        while not self._pending and not self._stopping:
+            self._cond.wait()
+        if self._pending and not self._stopping:
+            deadline = self._pending[0][0] + self.flush_interval
+            self._cond.wait_for(
+                lambda: len(self._pending) >= self.batch_size or self._stopping,
+                max(0.0, deadline - time.monotonic())
+            )
+        entries = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        self._in_flight = len(entries)
+        self._cond.notify_all()  # room for blocked producers
+        return entries
+
+    def _commit(self, entries):
+        for attempt in range(self.max_attempts):
+            batch = self._db.batch()
+            for _, ref, data in entries:
+                batch.set(ref, data)
+            start = time.perf_counter()
+            try:
+                batch.commit()
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt + 1 >= self.max_attempts:
+                    print(f"Error writing {len(entries)} notifications, dropping them: {str(e)}")
+                    with self._cond:
+                        self.failed_batches += 1
+                        self.dropped += len(entries)
+                    return
+                with self._cond:
+                    self.retries += 1
+                time.sleep(self.base_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+
+            now = time.monotonic()
+            with self._cond:
+                self.batches += 1
+                self.written += len(entries)
+                self.last_batch_size = len(entries)
+                self.last_commit_ms = (time.perf_counter() - start) * 1000
+                self.max_delay_ms = max(self.max_delay_ms, (now - entries[0][0]) * 1000)
+            return
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping and not self._pending:
+                    return
+                entries = self._take_batch()
+            if entries:
+                self._commit(entries)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def flush(self, timeout=10):
+        """Wait until everything queued so far is committed (or dropped). Returns False on timeout."""
+        with self._cond:
+            if self._thread is None:
+                return not self._pending
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='notification-writer', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self, timeout=10):
+        """Write everything still queued, then stop the writer thread."""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'avg_batch_size': round(self.written / self.batches, 1) if self.batches else 0.0,
+                'last_batch_size': self.last_batch_size,
+                'last_commit_ms': round(self.last_commit_ms, 2),
+                'max_delay_ms': round(self.max_delay_ms, 2),
+                'retries': self.retries,
+                'failed_batches': self.failed_batches,
+                'dropped': self.dropped,
+                'inline': self.inline,
+                'blocked_seconds': round(self.blocked_seconds, 3),
+                'last_error': self.last_error,
+                'running': self._thread is not None
+            }
@@ -0,0 +1,330 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+# Queue states:
+#   reserving  - written before the wallet reservation; resolved on recovery
+#   queued     - funds reserved, waiting to be written to Firestore
+#   processing - claimed by a drain worker (lease expires after LEASE_SECONDS)
+#   failed     - still failing after max_attempts drains; kept for inspection
+# Entries are deleted once their Firestore batch has committed.
+LEASE_SECONDS = 60
+# A failed entry waits RETRY_BASE_SECONDS * 2^(attempts - 1) (capped, +/-50%
+# jitter) before it can be claimed again, so an outage doesn't burn through
+# its attempts and a bad entry doesn't hold up the ones behind it
+RETRY_BASE_SECONDS = 1
+RETRY_MAX_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 8
+
+
+class OrderQueue:
+    """Durable local order queue in a SQLite database running in WAL mode.
+
+    Safe to share between threads and between worker processes pointing at
+    the same file: claims are made with a single UPDATE and carry a lease,
+    so entries held by a crashed worker are handed out again after
+    LEASE_SECONDS.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS order_queue (
+                order_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                claimed_at REAL,
+                enqueued_at REAL NOT NULL,
+                last_error TEXT,
+                available_at REAL NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(order_queue)")}
+        if 'available_at' not in columns:
+            # Queue files created before retries were delayed
+            conn.execute("ALTER TABLE order_queue ADD COLUMN available_at REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS order_queue_state ON order_queue (state, enqueued_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, order_id, payload, state='queued'):
+        self._conn().execute(
+            "INSERT INTO order_queue (order_id, payload, state, enqueued_at) VALUES (?, ?, ?, ?)",
+            (order_id, json.dumps(payload), state, time.time())
+        )
+
+    def set_state(self, order_id, state):
+        self._conn().execute(
+            "UPDATE order_queue SET state = ? WHERE order_id = ?", (state, order_id)
+        )
+
+    def remove(self, order_ids):
+        if not order_ids:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("DELETE FROM order_queue WHERE order_id = ?", [(i,) for i in order_ids])
+        conn.execute("COMMIT")
+
+    def claim(self, limit):
+        """Claim up to `limit` queued (or lease-expired) entries, oldest first.
+
+        Queued entries waiting out a retry delay are skipped.
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                UPDATE order_queue
+                SET state = 'processing', claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+                WHERE order_id IN (
+                    SELECT order_id FROM order_queue
+                    WHERE (state = 'queued' AND available_at <= ?)
+                       OR (state = 'processing' AND claimed_at < ?)
+                    ORDER BY enqueued_at
+                    LIMIT ?
+                )
+            """, (token, now, now, now - LEASE_SECONDS, limit))
+            rows = conn.execute(
+                "SELECT order_id, payload FROM order_queue WHERE claimed_by = ? ORDER BY enqueued_at",
+                (token,)
+            ).fetchall()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(order_id, json.loads(payload)) for order_id, payload in rows]
+
+    def release(self, failures, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Put claimed entries back after a failed drain; failures is a list of (order_id, error).
+
+        Each entry is retried after its backoff delay, unless it has already
+        been attempted max_attempts times: then it moves to 'failed'. Returns
+        the entries that failed for good, as (order_id, payload).
+        """
+        now = time.time()
+        errors = dict(failures)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT order_id, payload, attempts FROM order_queue "
+                f"WHERE order_id IN ({', '.join('?' * len(errors))})",
+                list(errors)
+            ).fetchall()
+            failed = []
+            for order_id, payload, attempts in rows:
+                if attempts >= max_attempts:
+                    conn.execute(
+                        "UPDATE order_queue SET state = 'failed', claimed_by = NULL, last_error = ? "
+                        "WHERE order_id = ?",
+                        (errors[order_id], order_id)
+                    )
+                    failed.append((order_id, json.loads(payload)))
+                    continue
+                delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+                conn.execute(
+                    "UPDATE order_queue SET state = 'queued', claimed_by = NULL, last_error = ?, "
+                    "available_at = ? WHERE order_id = ?",
+                    (errors[order_id], now + delay * random.uniform(0.5, 1.5), order_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return failed
+
+    def entries(self, state, older_than=0):
+        """Entries in `state` enqueued more than `older_than` seconds ago."""
+        rows = self._conn().execute(
+            "SELECT order_id, payload FROM order_queue WHERE state = ? AND enqueued_at <= ?",
+            (state, time.time() - older_than)
+        ).fetchall()
+        return [(order_id, json.loads(payload)) for order_id, payload in rows]
+
+    def depth(self):
+        rows = self._conn().execute(
+            "SELECT state, COUNT(*) FROM order_queue GROUP BY state"
+        ).fetchall()
+        return dict(rows)
+
+
+class OrderQueueWorker:
+    """Background threads that drain an OrderQueue into Firestore in batches.
+
+    `write_batch(entries)` receives a list of (order_id, payload) and must
+    commit them idempotently; entries are removed from the queue only after
+    it returns, so a crash mid-drain replays the batch. It returns the entries
+    it wrote, leaving out any a replay found already committed (None means
+    all of them). `after_commit(entries)` runs for the written entries once
+    they are gone from the queue (non-idempotent side effects belong there).
+
+    When a batch fails its entries are written one at a time, so a single bad
+    entry doesn't stop the others. Entries that still fail are retried with
+    backoff; after max_attempts they are marked failed and handed to
+    `on_failed(entries)`.
+    """
+
+    def __init__(self, queue, write_batch, after_commit=None, workers=2,
+                 batch_size=100, idle_interval=0.2, max_attempts=DEFAULT_MAX_ATTEMPTS, on_failed=None):
+        self.queue = queue
+        self.write_batch = write_batch
+        self.after_commit = after_commit
+        self.max_attempts = max_attempts
+        self.on_failed = on_failed
+        self.workers = workers
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._recent = deque()  # (timestamp, orders drained) for the drain rate
+
+        self.drained = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_batch_ms = 0.0
+        self.last_error = None
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'order-drain-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake a drain worker now instead of waiting for the idle interval."""
+        self._wakeup.set()
+
+    def drain_once(self):
+        entries = self.queue.claim(self.batch_size)
+        if not entries:
+            return 0
+
+        start = time.perf_counter()
+        failures = []
+        written = None
+        try:
+            written = self.write_batch(entries)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"Error draining order queue: {str(e)}")
+            if len(entries) == 1:
+                failures = [(entries[0][0], str(e))]
+            else:
+                # Find the entries at fault; the rest still commit
+                failures, written = self._write_one_by_one(entries)
+            failed_ids = {order_id for order_id, _ in failures}
+            entries = [entry for entry in entries if entry[0] not in failed_ids]
+        if written is None:
+            written = entries
+
+        if entries:
+            self.queue.remove([order_id for order_id, _ in entries])
+            with self._lock:
+                self.drained += len(entries)
+                self.batches += 1
+                self.last_batch_ms = (time.perf_counter() - start) * 1000
+                self._recent.append((time.time(), len(entries)))
+
+            if self.after_commit and written:
+                try:
+                    self.after_commit(written)
+                except Exception as e:
+                    print(f"Error in order queue post-commit hook: {str(e)}")
+
+        if failures:
+            self._release(failures)
+        return len(entries)
+
+    def _write_one_by_one(self, entries):
+        failures, written = [], []
+        for entry in entries:
+            try:
+                result = self.write_batch([entry])
+            except Exception as e:
+                failures.append((entry[0], str(e)))
+                continue
+            written.extend([entry] if result is None else result)
+        return failures, written
+
+    def _release(self, failures):
+        dead = self.queue.release(failures, self.max_attempts)
+        if not dead:
+            return
+        with self._lock:
+            self.dead_lettered += len(dead)
+        print(f"Order queue gave up on {len(dead)} orders: {', '.join(order_id for order_id, _ in dead)}")
+        if self.on_failed:
+            try:
+                self.on_failed(dead)
+            except Exception as e:
+                print(f"Error in order queue failure hook: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                drained = self.drain_once()
+            except Exception as e:
+                print(f"Order queue worker error: {str(e)}")
+                drained = 0
+            if not drained:
+                self._wakeup.wait(self.idle_interval)
+                self._wakeup.clear()
+
+    def drain_rate(self, window=60):
+        """Orders per second drained over the last `window` seconds."""
+        cutoff = time.time() - window
+        with self._lock:
+            while self._recent and self._recent[0][0] < cutoff:
+                self._recent.popleft()
+            return sum(count for _, count in self._recent) / window
+
+    def stats(self):
+        return {
+            'depth': self.queue.depth(),
+            'drained': self.drained,
+            'batches': self.batches,
+            'failures': self.failures,
+            'dead_lettered': self.dead_lettered,
+            'max_attempts': self.max_attempts,
+            'drain_rate_per_sec': round(self.drain_rate(), 3),
+            'last_batch_ms': round(self.last_batch_ms, 2),
+            'last_error': self.last_error,
+            'workers': len(self._threads)
+        }
@@ -9,14 +9,58 @@ import {
   FaBell, FaMotorcycle, FaFilter 
 } from 'react-icons/fa';
 
+// Filters the server can stream live (GET /orders/canteen/stream)
+const LIVE_STATUSES = ['pending', 'accepted', 'ready'];
+
+const newestFirst = (a: any, b: any) => String(b.created_at || '').localeCompare(String(a.created_at || ''));
+
+// Apply a board_delta event to the current list
+const applyBoardDelta = (orders: any[], delta: any) => {
+  const changed = [...delta.added, ...delta.modified];
+  const dropped = new Set([...delta.removed, ...changed.map((order: any) => order.id)]);
+  return [...orders.filter((order) => !dropped.has(order.id)), ...changed].sort(newestFirst);
+};
+
 export default function CanteenOrders() {
   const [orders, setOrders] = useState([]);
   const [filterStatus, setFilterStatus] = useState('pending');
   const [isLoading, setIsLoading] = useState(true);
+  const [isLive, setIsLive] = useState(false);
+  const [streamGeneration, setStreamGeneration] = useState(0);
 
   useEffect(() => {
-    fetchOrders();
-  }, [filterStatus]);
+    setIsLive(false);
+    if (!LIVE_STATUSES.includes(filterStatus) || typeof EventSource === 'undefined') {
+      fetchOrders();
+      return;
+    }
+
+    // Snapshot first, then only the orders that changed
+    const token = (localStorage.getItem('token') || '').replace(/^Bearer /, '');
+    const source = new EventSource(
+      `https://localhost969.pythonanywhere.com/orders/canteen/stream?status=${filterStatus}&token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('board_snapshot', (e) => {
+      setOrders(JSON.parse((e as MessageEvent).data).orders);
+      setIsLive(true);
+      setIsLoading(false);
+    });
+    source.addEventListener('board_delta', (e) => {
+      const delta = JSON.parse((e as MessageEvent).data);
+      setOrders((prev) => applyBoardDelta(prev, delta));
+    });
+    // The server dropped events for this screen: reconnect for a fresh snapshot
+    source.addEventListener('resync', () => setStreamGeneration((n) => n + 1));
+    source.onerror = () => {
+      // A refused stream stays closed; fall back to a one-off fetch
+      if (source.readyState === EventSource.CLOSED) {
+        setIsLive(false);
+        fetchOrders();
+      }
+    };
+
+    return () => source.close();
+  }, [filterStatus, streamGeneration]);
 
   const fetchOrders = async () => {
     try {
@@ -55,7 +99,9 @@ export default function CanteenOrders() {
       
       if (response.ok && data.ok) {
         toast.success(`Order ${newStatus} successfully`);
-        fetchOrders(); // Refresh orders list
+        if (!isLive) {
+          fetchOrders(); // Refresh orders list; a live board gets the change pushed
+        }
       } else {
         throw new Error(data.message || 'Failed to update order status');
       }
@@ -65,6 +111,38 @@ export default function CanteenOrders() {
     }
   };
 
+  // Moves every order on the current board in one request (PUT /orders/status)
+  const bulkUpdateStatus = async (newStatus: string) => {
+    const orderIds = orders.map((order: any) => order.id);
+    if (orderIds.length === 0) return;
+    try {
+      const response = await fetch('https://localhost969.pythonanywhere.com/orders/status', {
+        method: 'PUT',
+        headers: {
+          'Content-Type': 'application/json',
+          Authorization: localStorage.getItem('token') || ''
+        },
+        body: JSON.stringify({ order_ids: orderIds, status: newStatus })
+      });
+
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.message || 'Failed to update orders');
+      }
+      if (data.failed > 0) {
+        toast.warning(`${data.updated} orders ${newStatus}, ${data.failed} could not be updated`);
+      } else {
+        toast.success(`${data.updated} orders ${newStatus}`);
+      }
+      if (!isLive) {
+        fetchOrders();
+      }
+    } catch (error) {
+      console.error('Error updating orders:', error);
+      toast.error(error.message || 'Failed to update orders');
+    }
+  };
+
   const OrderCard = ({ order }: any) => (
     <motion.div
       initial={{ opacity: 0, y: 20 }}
@@ -174,6 +252,14 @@ export default function CanteenOrders() {
           <h1 className="text-2xl font-bold text-gray-900">Order Management</h1>
           
           <div className="flex flex-wrap gap-2">
+            {filterStatus === 'ready' && orders.length > 0 && (
+              <button
+                onClick={() => bulkUpdateStatus('completed')}
+                className="px-4 py-2 rounded-lg text-sm font-medium bg-blue-600 text-white hover:bg-blue-700 transition-colors flex items-center gap-2"
+              >
+                <FaCheckCircle /> Complete all ({orders.length})
+              </button>
+            )}
             {['pending', 'ready', 'completed', 'cancelled'].map((status) => (
               <button
                 key={status}
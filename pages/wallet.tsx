@@ -5,9 +5,13 @@ import AuthGuard from '../components/auth/AuthGuard';
 import { motion } from 'framer-motion';
 import { toast } from 'react-toastify';
 
+// Wallet history is read from the ledger a page at a time
+const TRANSACTIONS_PAGE_SIZE = 20;
+
 export default function WalletPage() {
   const [balance, setBalance] = useState(0);
   const [transactions, setTransactions] = useState([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [voucherCode, setVoucherCode] = useState('');
   const [isLoading, setIsLoading] = useState(false);
 
@@ -33,17 +37,21 @@ export default function WalletPage() {
     }
   };
 
-  const fetchTransactions = async () => {
+  // Without a cursor this reloads the first page; with one it appends the next
+  const fetchTransactions = async (cursor: string | null = null) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('https://localhost969.pythonanywhere.com/wallet/transactions', {
+      const params = new URLSearchParams({ limit: String(TRANSACTIONS_PAGE_SIZE) });
+      if (cursor) params.set('start_after', cursor);
+      const response = await fetch(`https://localhost969.pythonanywhere.com/wallet/transactions?${params}`, {
         headers: {
           Authorization: token || '',
         },
       });
       const data = await response.json();
       if (response.ok) {
-        setTransactions(data.transactions);
+        setTransactions((prev) => (cursor ? [...prev, ...data.transactions] : data.transactions));
+        setNextCursor(data.next_cursor || null);
       }
     } catch (error) {
       console.error('Error fetching transactions:', error);
@@ -98,6 +106,8 @@ export default function WalletPage() {
     switch (type) {
       case 'WELCOME_BONUS':
       case 'COUPON':
+      case 'CASHBACK':
+      case 'LOYALTY_REWARD':
         return 'text-green-600';
       case 'REFUND':
         return 'text-blue-600';
@@ -113,7 +123,10 @@ export default function WalletPage() {
       case 'WELCOME_BONUS':
         return <FaWallet className="w-6 h-6 text-green-600" />;
       case 'COUPON':
+      case 'CASHBACK':
         return <FaTicketAlt className="w-6 h-6 text-green-600" />;
+      case 'LOYALTY_REWARD':
+        return <FaMoneyBillWave className="w-6 h-6 text-green-600" />;
       case 'REFUND':
         return <FaMoneyBillWave className="w-6 h-6 text-blue-600" />;
       case 'ORDER':
@@ -128,6 +141,8 @@ export default function WalletPage() {
       case 'WELCOME_BONUS':
         return 'bg-green-50';
       case 'COUPON':
+      case 'CASHBACK':
+      case 'LOYALTY_REWARD':
         return 'bg-green-50';
       case 'REFUND':
         return 'bg-blue-50';
@@ -201,7 +216,7 @@ export default function WalletPage() {
                     className={`flex items-center justify-between p-4 rounded-lg ${getTransactionBackground(transaction.type)}`}
                     initial={{ opacity: 0, x: -20 }}
                     animate={{ opacity: 1, x: 0 }}
-                    transition={{ delay: index * 0.1 }}
+                    transition={{ delay: (index % TRANSACTIONS_PAGE_SIZE) * 0.1 }}
                   >
                     <div className="flex items-center gap-4">
                       <div className={`p-2 rounded-full bg-white`}>
@@ -231,6 +246,14 @@ export default function WalletPage() {
                   No transactions found
                 </div>
               )}
+              {nextCursor && (
+                <button
+                  onClick={() => fetchTransactions(nextCursor)}
+                  className="w-full py-3 text-primary-600 font-medium rounded-lg hover:bg-gray-50 transition-colors"
+                >
+                  Load more
+                </button>
+              )}
             </div>
           </motion.div>
         </div>
@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import Response, stream_with_context
+from flask import json as flask_json
+from firebase_admin import firestore
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 500
+
+# Page size for endpoints that page even when the client sends no limit
+DEFAULT_PAGE_SIZE = 50
+
+
+def get_page_args(args, default_limit=None):
+    """Read limit/start_after/format from the query string.
+
+    Returns (limit, cursor, ndjson). limit is default_limit when the client
+    didn't ask for paging; None keeps the old "return everything" behaviour.
+    """
+    limit = args.get('limit', default_limit, type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return limit, args.get('start_after') or None, args.get('format') == 'ndjson'
+
+
+def encode_cursor(doc, order_field):
+    """Opaque cursor built from the ordering field value and the document id."""
+    value = doc.to_dict().get(order_field)
+    if isinstance(value, datetime):
+        payload = {'t': 'ts', 'v': value.isoformat(), 'id': doc.id}
+    else:
+        payload = {'t': 'raw', 'v': value, 'id': doc.id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (order_field_value, doc_id); raises ValueError on a malformed cursor."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = payload['v']
+        if payload['t'] == 'ts':
+            value = datetime.fromisoformat(value)
+        return value, payload['id']
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def paginate_query(query, collection_ref, order_field, limit=None, cursor=None,
+                   direction=firestore.Query.DESCENDING):
+    """Order the query and, when paging, add a document-id tiebreak and the cursor."""
+    query = query.order_by(order_field, direction=direction)
+    if limit is None and cursor is None:
+        return query
+
+    # Ties on order_field (e.g. identical created_at) are broken by document id
+    query = query.order_by('__name__', direction=direction)
+    if cursor:
+        value, doc_id = decode_cursor(cursor)
+        query = query.start_after({
+            order_field: value,
+            '__name__': collection_ref.document(doc_id)
+        })
+    return query
+
+
+def fetch_page(query, order_field, limit, serialize):
+    """Read one page (limit + 1 docs to detect more) and return (items, next_cursor).
+
+    With limit=None every matching document is returned and next_cursor is None.
+    """
+    if limit is None:
+        return [serialize(doc) for doc in query.stream()], None
+
+    docs = list(query.limit(limit + 1).stream())
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    items = [serialize(doc) for doc in docs]
+    next_cursor = encode_cursor(docs[-1], order_field) if has_more and docs else None
+    return items, next_cursor
+
+
+def ndjson_response(query, serialize, order_field, limit=None):
+    """Stream one JSON document per line as Firestore yields them.
+
+    Documents are never collected into a list, so memory stays flat however
+    large the result set is. With a limit the stream ends with a
+    {"next_cursor": ...} line (null on the last page), like fetch_page.
+    """
+    if limit is None:
+        def generate():
+            for doc in query.stream():
+                yield flask_json.dumps(serialize(doc)) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    def generate():
+        # One extra document tells whether another page follows
+        last, sent = None, 0
+        for doc in query.limit(limit + 1).stream():
+            if sent == limit:
+                yield flask_json.dumps({'next_cursor': encode_cursor(last, order_field)}) + '\n'
+                return
+            yield flask_json.dumps(serialize(doc)) + '\n'
+            last, sent = doc, sent + 1
+        yield flask_json.dumps({'next_cursor': None}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
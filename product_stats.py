@@ -0,0 +1,189 @@
+import sys
+from datetime import datetime, timedelta
+
+import pytz
+from firebase_admin import firestore
+
+# Aggregates live in one small document per product:
+#   product_stats/<product_id> = {
+#       'total_orders': <order lines containing the product>,
+#       'total_quantity': <units sold>,
+#       'daily': {'YYYY-MM-DD': <units sold that day>, ...}
+#   }
+# Cancelled orders are never counted, matching the old full scan.
+STATS_COLLECTION = 'product_stats'
+ROLLING_WINDOW_DAYS = 30
+
+
+def to_utc_datetime(value):
+    """Normalise a Firestore timestamp or ISO string to an aware UTC datetime."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        return pytz.UTC.localize(value)
+    return value.astimezone(pytz.UTC)
+
+
+def day_key(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def _window_start(now=None):
+    now = now or datetime.now(pytz.UTC)
+    return day_key(now - timedelta(days=ROLLING_WINDOW_DAYS))
+
+
+def record_order_sales(db, items, created_at, sign=1):
+    """Add (sign=1) or remove (sign=-1) an order's items from the aggregates.
+
+    All product documents touched by the order are written in one batch.
+    """
+    created_at = to_utc_datetime(created_at) or datetime.now(pytz.UTC)
+    bucket = day_key(created_at)
+    in_window = bucket >= _window_start()
+
+    batch = db.batch()
+    writes = 0
+    for item in items:
+        product_id = item.get('id')
+        if not product_id:
+            continue
+
+        quantity = item.get('quantity', 0)
+        update = {
+            'total_orders': firestore.Increment(sign),
+            'total_quantity': firestore.Increment(sign * quantity)
+        }
+        if in_window:
+            update['daily'] = {bucket: firestore.Increment(sign * quantity)}
+
+        batch.set(db.collection(STATS_COLLECTION).document(str(product_id)), update, merge=True)
+        writes += 1
+
+    if writes:
+        batch.commit()
+    return writes
+
+
+def load_product_metrics(db):
+    """Read every product's aggregate (O(products)) in calculate_product_metrics' shape."""
+    window_start = _window_start()
+    metrics = {}
+    expired = []
+
+    for doc in db.collection(STATS_COLLECTION).stream():
+        data = doc.to_dict()
+        daily = data.get('daily') or {}
+        stale = [key for key in daily if key < window_start]
+        if stale:
+            expired.append((doc.reference, stale))
+
+        metrics[doc.id] = {
+            'total_orders': data.get('total_orders', 0),
+            'total_quantity': data.get('total_quantity', 0),
+            'ratings': [],
+            'last_month_orders': sum(
+                qty for key, qty in daily.items() if key >= window_start
+            )
+        }
+
+    if expired:
+        prune_expired_buckets(db, expired)
+
+    return metrics
+
+
+def load_daily_sales(db, product_id):
+    """Return one product's per-day quantity index ({'YYYY-MM-DD': qty}) with a single read."""
+    doc = db.collection(STATS_COLLECTION).document(str(product_id)).get()
+    if not doc.exists:
+        return {}
+    return doc.to_dict().get('daily') or {}
+
+
+def prune_expired_buckets(db, expired):
+    """Drop daily buckets that fell out of the rolling window."""
+    try:
+        batch = db.batch()
+        for ref, keys in expired:
+            batch.set(ref, {'daily': {key: firestore.DELETE_FIELD for key in keys}}, merge=True)
+        batch.commit()
+    except Exception as e:
+        print(f"Error pruning product stats buckets: {str(e)}")
+
+
+def rebuild_product_stats(db):
+    """Recompute every aggregate from the full order history (backfill)."""
+    window_start = _window_start()
+    stats = {}
+
+    for order in db.collection('orders').stream():
+        order_data = order.to_dict()
+        if order_data.get('status') == 'cancelled':
+            continue
+
+        created_at = to_utc_datetime(order_data.get('created_at'))
+        bucket = day_key(created_at) if created_at else None
+
+        for item in order_data.get('items', []):
+            product_id = item.get('id')
+            if not product_id:
+                continue
+
+            product_stats = stats.setdefault(str(product_id), {
+                'total_orders': 0,
+                'total_quantity': 0,
+                'daily': {}
+            })
+            quantity = item.get('quantity', 0)
+            product_stats['total_orders'] += 1
+            product_stats['total_quantity'] += quantity
+            if bucket and bucket >= window_start:
+                product_stats['daily'][bucket] = product_stats['daily'].get(bucket, 0) + quantity
+
+    # Replace existing documents, removing products with no remaining sales
+    writes = [
+        (doc.reference, None)
+        for doc in db.collection(STATS_COLLECTION).stream()
+        if doc.id not in stats
+    ]
+    writes += [
+        (db.collection(STATS_COLLECTION).document(product_id), data)
+        for product_id, data in stats.items()
+    ]
+
+    for start in range(0, len(writes), 400):
+        batch = db.batch()
+        for ref, data in writes[start:start + 400]:
+            if data is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, data)
+        batch.commit()
+
+    return len(stats)
+
+
+if __name__ == '__main__':
+    import os
+    import firebase_admin
+    from firebase_admin import credentials
+    from dotenv import load_dotenv
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python product_stats.py rebuild")
+        sys.exit(1)
+
+    load_dotenv()
+    firebase_cred_path = os.getenv("FIREBASE_CREDENTIALS")
+    if not firebase_cred_path:
+        raise ValueError("FIREBASE_CREDENTIALS environment variable is not set")
+
+    firebase_admin.initialize_app(credentials.Certificate(firebase_cred_path))
+    count = rebuild_product_stats(firestore.client())
+    print(f"Rebuilt sales aggregates for {count} products")
@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+
+from flask import Response, g, request
+
+from firestore_metrics import current_stats, recorder
+
+# Seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Documents read per request
+READ_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    bucket_labels = _labels(self.label_names, labels, 'le="%s"' % bound)
+                    lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+                bucket_labels = _labels(self.label_names, labels, 'le="+Inf"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {series[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+
+class RequestMetrics:
+    """Per-route request and Firestore metrics for a Flask app.
+
+    Every response gets a Server-Timing header with the request's Firestore
+    time and document counts, and (with log_requests) one JSON log line.
+    Streamed responses are recorded once the body has been sent and get no
+    Server-Timing header (it would have to go out before the work it times).
+    GET /metrics serves everything in the Prometheus text format. Metrics are
+    per process; with several gunicorn workers each scrape hits one worker.
+    """
+
+    def __init__(self, log_requests=True):
+        self.log_requests = log_requests
+        self._authorize = None
+        route = ('route', 'method')
+        self.requests = Counter('quickbite_http_requests_total', 'Requests handled', ('route', 'method', 'status'))
+        self.duration = Histogram('quickbite_http_request_duration_seconds', 'Request latency', route, DURATION_BUCKETS)
+        self.firestore_duration = Histogram(
+            'quickbite_request_firestore_seconds', 'Time spent in Firestore calls per request', route, DURATION_BUCKETS
+        )
+        self.firestore_reads = Histogram(
+            'quickbite_request_firestore_reads', 'Firestore documents read per request', route, READ_BUCKETS
+        )
+        self.firestore_ops = Counter(
+            'quickbite_firestore_ops_total', 'Firestore operations per route', ('route', 'op')
+        )
+        self.op_duration = Histogram(
+            'quickbite_firestore_op_duration_seconds', 'Latency of individual Firestore calls', ('op',), DURATION_BUCKETS
+        )
+        recorder.listeners.append(self._on_firestore_op)
+
+    def init_app(self, app, authorize=None):
+        """authorize() returns an error response to refuse a /metrics request, or None to serve it."""
+        self._authorize = authorize
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+
+    def _on_firestore_op(self, op, duration, reads, writes, aborted):
+        self.op_duration.observe((op,), duration)
+
+    def _before_request(self):
+        g._request_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.get('_request_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route == '/metrics':
+            return response
+
+        stats = current_stats()
+        method, path, status = request.method, request.path, response.status_code
+        if response.is_streamed:
+            # The body (and its Firestore calls) runs after this hook, and the
+            # headers are gone by the time it ends: record once it's closed
+            def record_streamed():
+                self._record(route, method, path, status, time.perf_counter() - started, stats)
+            response.call_on_close(record_streamed)
+            return response
+
+        duration = time.perf_counter() - started
+        self._record(route, method, path, status, duration, stats)
+        response.headers.add('Server-Timing', ', '.join([
+            f'firestore;dur={stats.duration * 1000:.1f};desc="{stats.calls} calls"',
+            f'fs-reads;desc="{stats.reads}"',
+            f'fs-writes;desc="{stats.writes}"',
+            f'total;dur={duration * 1000:.1f}'
+        ]))
+        return response
+
+    def _record(self, route, method, path, status, duration, stats):
+        labels = (route, method)
+        self.requests.inc((route, method, str(status)))
+        self.duration.observe(labels, duration)
+        self.firestore_duration.observe(labels, stats.duration)
+        self.firestore_reads.observe(labels, stats.reads)
+        for op, count in (('reads', stats.reads), ('writes', stats.writes), ('queries', stats.queries),
+                          ('commits', stats.commits), ('transaction_retries', stats.aborted)):
+            if count:
+                self.firestore_ops.inc((route, op), count)
+
+        if self.log_requests:
+            print(json.dumps({
+                'event': 'request',
+                'method': method,
+                'route': route,
+                'path': path,
+                'status': status,
+                'duration_ms': round(duration * 1000, 2),
+                'firestore': stats.as_dict()
+            }))
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.duration, self.firestore_duration, self.firestore_reads,
+                       self.firestore_ops, self.op_duration):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _metrics_view(self):
+        if self._authorize is not None:
+            denied = self._authorize()
+            if denied:
+                return denied
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
@@ -1,8 +1,8 @@
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from firebase_client import get_db
 import getpass
 from passlib.hash import pbkdf2_sha256
-import os
 from dotenv import load_dotenv
 
 def reset_admin_password():
@@ -11,13 +11,7 @@ def reset_admin_password():
         load_dotenv()
         
         # Initialize Firebase
-        firebase_cred_path = os.getenv("FIREBASE_CREDENTIALS")
-        if not firebase_cred_path:
-            raise ValueError("FIREBASE_CREDENTIALS environment variable is not set")
-            
-        cred = credentials.Certificate(firebase_cred_path)
-        firebase_admin.initialize_app(cred)
-        db = firestore.client()
+        db = get_db()
 
         # Find admin user
         users_ref = db.collection("users")
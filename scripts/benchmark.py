@@ -0,0 +1,245 @@
+"""Benchmark the hot endpoints against a seeded in-memory backend.
+
+    python scripts/benchmark.py --orders 100000 --output bench.json
+    python scripts/benchmark.py --orders 100000 --compare bench.json
+
+Seeds a LocalFirestore (see seed_data.py), then sends --requests requests to
+each endpoint from --clients concurrent threads through the Flask test
+client. No network is involved, so latency is the app's own CPU time plus
+--rpc-latency-ms per Firestore call; the per-request Firestore call/read/
+write counts show what the same request would cost against the real
+project. Results go to --output as JSON; --compare prints the change
+against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import pytz
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+import firebase_client
+from local_firestore import LocalFirestore
+from seed_data import seed, user_email
+
+SECRET_KEY = 'benchmark-secret'
+
+
+def make_token(email, role):
+    return jwt.encode({
+        'email': email,
+        'role': role,
+        'name': email,
+        'exp': (datetime.now(pytz.UTC) + timedelta(hours=1)).timestamp()
+    }, SECRET_KEY, algorithm='HS256')
+
+
+def endpoints(users, products):
+    """name -> function(rng) returning (method, url, kwargs)."""
+    admin = {'Authorization': f"Bearer {make_token('admin@bench.quickbite', 'admin')}"}
+    canteen = {'Authorization': f"Bearer {make_token('canteen@bench.quickbite', 'canteen')}"}
+    user_tokens = {}
+
+    def user_headers(index):
+        if index not in user_tokens:
+            user_tokens[index] = {'Authorization': f"Bearer {make_token(user_email(index), 'user')}"}
+        return user_tokens[index]
+
+    def place_order(rng):
+        items = [{
+            'id': f'product-{rng.randrange(products)}',
+            'name': 'Benchmark item',
+            'price': 10,
+            'quantity': rng.randint(1, 3)
+        } for _ in range(rng.randint(1, 3))]
+        return 'POST', '/orders', {'json': {
+            'user_email': user_email(rng.randrange(users)),
+            'items': items,
+            'delivery_option': 'PICKUP'
+        }}
+
+    return {
+        'GET /get-products': lambda rng: ('GET', '/get-products', {}),
+        'GET /products/popular': lambda rng: ('GET', '/products/popular', {}),
+        'POST /orders': place_order,
+        'GET /orders/canteen': lambda rng: (
+            'GET', '/orders/canteen', {'query_string': {'status': 'pending', 'limit': 50}, 'headers': canteen}
+        ),
+        'GET /admin/dashboard': lambda rng: ('GET', '/admin/dashboard', {'headers': admin}),
+        'GET /user/loyalty': lambda rng: (
+            'GET', '/user/loyalty', {'headers': user_headers(rng.randrange(users))}
+        ),
+        'GET /wallet/transactions': lambda rng: (
+            'GET', '/wallet/transactions', {'headers': user_headers(rng.randrange(users))}
+        ),
+    }
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def run_endpoint(app, db, build_request, requests, clients, seed_value):
+    samples = []
+    lock = threading.Lock()
+    per_client = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+
+    def client(index, count):
+        rng = random.Random(seed_value * 1000 + index)
+        test_client = app.test_client()
+        local = []
+        for _ in range(count):
+            method, url, kwargs = build_request(rng)
+            before = db.thread_stats()
+            start = time.perf_counter()
+            response = test_client.open(url, method=method, **kwargs)
+            elapsed = time.perf_counter() - start
+            after = db.thread_stats()
+            local.append((
+                elapsed, response.status_code,
+                after['calls'] - before['calls'],
+                after['reads'] - before['reads'],
+                after['writes'] - before['writes']
+            ))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i, count)) for i, count in enumerate(per_client) if count]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    count = len(samples) or 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[1] >= 400),
+        'throughput_rps': round(len(samples) / wall, 1) if wall else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'mean': round(sum(latencies) / count, 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0
+        },
+        'firestore_per_request': {
+            'calls': round(sum(sample[2] for sample in samples) / count, 2),
+            'reads': round(sum(sample[3] for sample in samples) / count, 2),
+            'writes': round(sum(sample[4] for sample in samples) / count, 2)
+        }
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'endpoint':<26}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'calls':>7}{'reads':>9}{'writes':>7}{'errors':>7}")
+    for name, result in results['endpoints'].items():
+        latency, firestore_ops = result['latency_ms'], result['firestore_per_request']
+        print(f"{name:<26}{result['throughput_rps']:>9}{latency['p50']:>9}{latency['p95']:>9}"
+              f"{latency['p99']:>9}{firestore_ops['calls']:>7}{firestore_ops['reads']:>9}"
+              f"{firestore_ops['writes']:>7}{result['errors']:>7}")
+
+        old = (baseline or {}).get('endpoints', {}).get(name)
+        if old:
+            def change(new_value, old_value):
+                return f"{(new_value - old_value) / old_value * 100:+.0f}%" if old_value else 'n/a'
+            print(f"{'  vs baseline':<26}{change(result['throughput_rps'], old['throughput_rps']):>9}"
+                  f"{change(latency['p50'], old['latency_ms']['p50']):>9}"
+                  f"{change(latency['p95'], old['latency_ms']['p95']):>9}"
+                  f"{change(latency['p99'], old['latency_ms']['p99']):>9}"
+                  f"{change(firestore_ops['calls'], old['firestore_per_request']['calls']):>7}"
+                  f"{change(firestore_ops['reads'], old['firestore_per_request']['reads']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=10000, help='seeded order history (10^3 - 10^6)')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per endpoint')
+    parser.add_argument('--rpc-latency-ms', type=float, default=0.0, help='simulated latency per Firestore call')
+    parser.add_argument('--only', action='append', help='run only endpoints containing this text')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    db = LocalFirestore()
+    firebase_client.configure(client=db)
+    os.environ.setdefault('REQUEST_LOG', '0')  # one JSON line per request would drown the report
+
+    # Imported after the backend is configured
+    from app import create_app
+    app = create_app({'SECRET_KEY': SECRET_KEY})
+
+    print(f"Seeding {args.orders} orders, {args.users} users, {args.products} products...")
+    start = time.perf_counter()
+    counts = seed(db, args.users, args.products, args.orders, args.seed)
+    seed_seconds = time.perf_counter() - start
+    db.latency = args.rpc_latency_ms / 1000
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(pytz.UTC).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'clients': args.clients,
+            'requests_per_endpoint': args.requests,
+            'rpc_latency_ms': args.rpc_latency_ms,
+            'seed': args.seed
+        },
+        'dataset': dict(counts, seed_seconds=round(seed_seconds, 1)),
+        'endpoints': {}
+    }
+
+    for name, build_request in endpoints(args.users, args.products).items():
+        if args.only and not any(text in name for text in args.only):
+            continue
+        if args.warmup:
+            run_endpoint(app, db, build_request, args.warmup, 1, args.seed + 1)
+        results['endpoints'][name] = run_endpoint(app, db, build_request, args.requests, args.clients, args.seed)
+        print(f"  {name}: done")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
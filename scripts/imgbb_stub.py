@@ -0,0 +1,156 @@
+"""Local stand-in for the ImgBB upload API.
+
+    python scripts/imgbb_stub.py --port 8765 --delay-ms 200 --fail-rate 0.2
+    IMGBB_UPLOAD_URL=http://127.0.0.1:8765/1/upload python app.py
+
+POST /1/upload takes the same multipart form as ImgBB (key + image) and
+answers with an ImgBB-shaped JSON body; GET /i/<id>/<filename> serves the
+stored image back. --delay-ms slows every upload down and --fail-rate
+answers that share of uploads with a 503, to exercise the uploader's
+timeouts and retries. start_stub() runs it in a background thread for
+scripts that need one.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _parse_multipart(body, content_type):
+    """name -> (filename, content_type, bytes) for each part of a multipart body."""
+    match = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    if not match:
+        return {}
+    fields = {}
+    for part in body.split(b'--' + match.group(1).encode())[1:-1]:
+        headers, _, value = part.strip(b'\r\n').partition(b'\r\n\r\n')
+        headers = headers.decode(errors='replace')
+        name = re.search(r'name="([^"]*)"', headers)
+        if not name:
+            continue
+        filename = re.search(r'filename="([^"]*)"', headers)
+        part_type = re.search(r'Content-Type:\s*(\S+)', headers, re.IGNORECASE)
+        fields[name.group(1)] = (
+            filename.group(1) if filename else None,
+            part_type.group(1) if part_type else None,
+            value
+        )
+    return fields
+
+
+class ImgBBStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay=0.0, fail_rate=0.0, api_key=None):
+        super().__init__(address, _Handler)
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.api_key = api_key
+        self.images = {}  # id -> (content_type, bytes)
+        self.uploads = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def upload_url(self):
+        return f'{self.url}/1/upload'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if stub.delay:
+            time.sleep(stub.delay)
+        if random.random() < stub.fail_rate:
+            with stub.lock:
+                stub.failures += 1
+            return self._send_json(503, {'status_code': 503, 'error': {'message': 'Stub failure'}})
+
+        fields = _parse_multipart(body, self.headers.get('Content-Type'))
+        key = fields.get('key', (None, None, b''))[2].decode(errors='replace')
+        if stub.api_key and key != stub.api_key:
+            return self._send_json(400, {'status_code': 400, 'error': {'message': 'Invalid API v1 key.'}})
+        if 'image' not in fields:
+            return self._send_json(400, {'status_code': 400, 'error': {'message': 'Empty upload source.'}})
+
+        filename, content_type, data = fields['image']
+        filename = filename or 'image'
+        image_id = hashlib.sha1(data).hexdigest()[:12]
+        with stub.lock:
+            stub.images[image_id] = (content_type or 'application/octet-stream', data)
+            stub.uploads += 1
+        image_url = f'{stub.url}/i/{image_id}/{filename}'
+        self._send_json(200, {
+            'data': {
+                'id': image_id,
+                'url': image_url,
+                'display_url': image_url,
+                'size': len(data),
+                'time': int(time.time())
+            },
+            'success': True,
+            'status': 200
+        })
+
+    def do_GET(self):
+        match = re.match(r'^/i/([0-9a-f]+)/', self.path)
+        image = self.server.images.get(match.group(1)) if match else None
+        if image is None:
+            return self._send_json(404, {'status_code': 404, 'error': {'message': 'Not found'}})
+        content_type, data = image
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port=0, delay=0.0, fail_rate=0.0, api_key=None):
+    """Start a stub on a background thread; stop it with server.shutdown()."""
+    server = ImgBBStub(('127.0.0.1', port), delay=delay, fail_rate=fail_rate, api_key=api_key)
+    threading.Thread(target=server.serve_forever, name='imgbb-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay-ms', type=float, default=0.0, help='added to every upload')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of uploads answered with a 503')
+    parser.add_argument('--api-key', help='reject uploads with any other key')
+    args = parser.parse_args()
+
+    server = ImgBBStub(('127.0.0.1', args.port), delay=args.delay_ms / 1000,
+                       fail_rate=args.fail_rate, api_key=args.api_key)
+    print(f"ImgBB stub listening on {server.upload_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Concurrent load test for the QuickBite API.
+
+Run it against the Firestore emulator so no real data is touched:
+
+    firebase emulators:start --only firestore          # listens on localhost:8080
+    export FIRESTORE_EMULATOR_HOST=localhost:8080
+
+    # dev server
+    python app.py
+    python scripts/load_test.py --base-url http://localhost:5000
+
+    # production server
+    gunicorn -c gunicorn.conf.py wsgi:application
+    python scripts/load_test.py --base-url http://localhost:5000
+
+Each simulated client signs up its own user, then loops over a mix of
+catalog reads, order history reads and small orders until --duration runs
+out. Prints throughput and latency percentiles per endpoint.
+"""
+import argparse
+import threading
+import time
+import uuid
+
+import requests
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def timed(results, name, call):
+    start = time.perf_counter()
+    try:
+        response = call()
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    results.record(name, time.perf_counter() - start, ok)
+    return response
+
+
+def run_client(base_url, deadline, results, run_id, index):
+    session = requests.Session()
+    email = f"load-{run_id}-{index}@example.com"
+    password = "loadtest123"
+
+    timed(results, 'POST /signup', lambda: session.post(f"{base_url}/signup", json={
+        'email': email, 'password': password, 'name': f'Load {index}'
+    }))
+    login = timed(results, 'POST /login', lambda: session.post(f"{base_url}/login", json={
+        'email': email, 'password': password
+    }))
+    if login is not None and login.ok:
+        session.headers['Authorization'] = f"Bearer {login.json().get('token')}"
+
+    order = {
+        'user_email': email,
+        'items': [{'id': 'loadtest', 'name': 'Load test item', 'price': 1, 'quantity': 1}],
+        'delivery_option': 'PICKUP'
+    }
+
+    step = 0
+    while time.time() < deadline:
+        step += 1
+        timed(results, 'GET /products/available',
+              lambda: session.get(f"{base_url}/products/available"))
+        if step % 2 == 0:
+            timed(results, 'GET /orders/user/<email>',
+                  lambda: session.get(f"{base_url}/orders/user/{email}", params={'limit': 20}))
+        if step % 4 == 0:
+            timed(results, 'POST /orders', lambda: session.post(f"{base_url}/orders", json=order))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=50, help='concurrent simulated clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    args = parser.parse_args()
+
+    results = Results()
+    run_id = uuid.uuid4().hex[:8]
+    start = time.time()
+    deadline = start + args.duration
+
+    threads = [
+        threading.Thread(target=run_client, args=(args.base_url.rstrip('/'), deadline, results, run_id, i))
+        for i in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    total = sum(len(samples) for samples in results.latencies.values())
+    print(f"\n{args.clients} clients, {elapsed:.1f}s, {total} requests, {total / elapsed:.1f} req/s\n")
+    print(f"{'endpoint':<28}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, samples in sorted(results.latencies.items()):
+        print(f"{name:<28}{len(samples):>8}{results.errors.get(name, 0):>8}"
+              f"{len(samples) / elapsed:>9.1f}"
+              f"{percentile(samples, 50) * 1000:>9.1f}"
+              f"{percentile(samples, 95) * 1000:>9.1f}"
+              f"{percentile(samples, 99) * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Seed a Firestore client (normally a LocalFirestore) with synthetic data.
+
+    python scripts/seed_data.py --orders 100000       # seeds an in-memory store and prints counts
+
+Data is deterministic for a given --seed, so benchmark runs are comparable.
+Aggregates the app keeps incrementally (product_stats, analytics rollups,
+loyalty counters) are rebuilt after seeding, as they would be by the
+backfill CLIs on a real project.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.hash import pbkdf2_sha256
+
+from loyalty import order_points
+
+# Largest write batch Firestore accepts
+BATCH_SIZE = 500
+
+SEED_PASSWORD = 'benchmark123'
+CATEGORIES = ['breakfast', 'lunch', 'snacks', 'beverages', 'desserts']
+# Status mix of historical orders (the rest are pending)
+STATUS_WEIGHTS = {'completed': 0.75, 'cancelled': 0.08, 'ready': 0.04, 'accepted': 0.05, 'pending': 0.08}
+HISTORY_DAYS = 120
+
+
+def user_email(index):
+    return f'user{index}@bench.quickbite'
+
+
+def _write_all(db, collection, docs):
+    """Write (doc_id, data) pairs in full batches."""
+    batch, pending = db.batch(), 0
+    for doc_id, data in docs:
+        batch.set(db.collection(collection).document(doc_id), data)
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+
+
+def seed(db, users=1000, products=100, orders=10000, seed=42):
+    """Populate users, products, orders, coupons and transactions. Returns the counts written."""
+    from product_stats import rebuild_product_stats
+    from analytics_rollups import rebuild_rollups
+
+    rng = random.Random(seed)
+    now = datetime.now(pytz.UTC)
+    password = pbkdf2_sha256.hash(SEED_PASSWORD)  # hashing is slow; share one hash
+
+    catalog = []
+    for i in range(products):
+        catalog.append({
+            'id': f'product-{i}',
+            'name': f'Product {i}',
+            'price': float(rng.choice([10, 20, 30, 40, 50, 60, 80, 100, 120])),
+            'category': rng.choice(CATEGORIES),
+            'availability': 'available' if rng.random() < 0.9 else 'unavailable',
+            'image_url': None
+        })
+    _write_all(db, 'products', ((p['id'], p) for p in catalog))
+
+    spent = [0.0] * users
+    points = [0] * users
+    statuses, weights = zip(*STATUS_WEIGHTS.items())
+
+    def generate_orders():
+        for i in range(orders):
+            owner = rng.randrange(users)
+            items = []
+            for product in rng.sample(catalog, rng.randint(1, 3)):
+                quantity = rng.randint(1, 3)
+                items.append({
+                    'id': product['id'],
+                    'name': product['name'],
+                    'price': product['price'],
+                    'quantity': quantity,
+                    'original_price': product['price'],
+                    'discounted_price': product['price'],
+                    'discount_percentage': 0
+                })
+            delivery_option = 'CLASS' if rng.random() < 0.2 else 'PICKUP'
+            subtotal = sum(item['price'] * item['quantity'] for item in items)
+            total = subtotal + (20 if delivery_option == 'CLASS' else 0)
+            created_at = now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+            status = rng.choices(statuses, weights)[0]
+
+            order = {
+                'user_email': user_email(owner),
+                'items': items,
+                'subtotal': subtotal,
+                'delivery_charge': total - subtotal,
+                'total': total,
+                'status': status,
+                'delivery_option': delivery_option,
+                'classroom': 'A-101' if delivery_option == 'CLASS' else '',
+                'scheduled_time': '',
+                'created_at': created_at,
+                'order_id': f'order-{i}',
+                'meal_timing': '',
+                'timing_slot': {}
+            }
+            if status == 'completed':
+                spent[owner] += total
+                points[owner] += order_points(total)
+            elif status == 'cancelled':
+                order['refund_amount'] = total
+                order['cancelled_at'] = created_at + timedelta(minutes=5)
+            yield order['order_id'], order
+
+    _write_all(db, 'orders', generate_orders())
+
+    def generate_users():
+        for i in range(users):
+            yield user_email(i), {
+                'email': user_email(i),
+                'password': password,
+                'name': f'User {i}',
+                'role': 'user',
+                'wallet_balance': 1000000.0,  # benchmarks must never run out of funds
+                'created_at': now - timedelta(days=HISTORY_DAYS + rng.randrange(365)),
+                'lifetime_spent': spent[i],
+                'points_balance': points[i],
+                'favorites': [p['id'] for p in rng.sample(catalog, min(3, len(catalog)))]
+            }
+        for role in ('admin', 'canteen'):
+            yield f'{role}@bench.quickbite', {
+                'email': f'{role}@bench.quickbite',
+                'password': password,
+                'name': role.title(),
+                'role': role,
+                'wallet_balance': 0,
+                'created_at': now - timedelta(days=HISTORY_DAYS)
+            }
+
+    _write_all(db, 'users', generate_users())
+
+    coupons = max(users // 10, 1)
+    _write_all(db, 'coupons', (
+        (f'BENCH{i:06d}', {
+            'code': f'BENCH{i:06d}',
+            'amount': 50,
+            'used': True,
+            'used_by': user_email(rng.randrange(users)),
+            'used_at': now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400)),
+            'created_at': now - timedelta(days=HISTORY_DAYS)
+        })
+        for i in range(coupons)
+    ))
+
+    rebuild_product_stats(db)
+    rebuild_rollups(db)
+
+    return {'users': users + 2, 'products': products, 'orders': orders, 'coupons': coupons}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from local_firestore import LocalFirestore
+    db = LocalFirestore()
+    start = time.perf_counter()
+    counts = seed(db, args.users, args.products, args.orders, args.seed)
+    print(f"Seeded {counts} in {time.perf_counter() - start:.1f}s; {db.stats()}")
+
+
+if __name__ == '__main__':
+    main()
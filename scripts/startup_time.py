@@ -0,0 +1,44 @@
+"""Import-to-first-request latency of the API.
+
+    python scripts/startup_time.py [runs]
+
+Each run is a fresh interpreter that imports app.py, calls create_app() and
+serves one request that doesn't touch Firestore. Prints the median of each
+phase in milliseconds.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app({'SECRET_KEY': 'startup-time'})
+t2 = time.perf_counter()
+flask_app.test_client().get('/products/cache/stats')
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2, 'total': t3 - t0}))
+"""
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 9
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        print(f"{phase:<14}{statistics.median(s[phase] for s in samples) * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+
+from google.api_core import exceptions as gcp_exceptions
+from firebase_admin import firestore
+
+
+# Start of the client's "Failed to commit transaction in N attempts." message
+_EXCEEDED_ATTEMPTS_PREFIX = 'Failed to commit transaction in'
+
+
+class TransactionContention(Exception):
+    """Raised when a transaction is still aborting after max_attempts."""
+
+
+def _is_contention(error):
+    """True for a transaction that lost a race (Aborted), however the client wrapped it."""
+    if isinstance(error, gcp_exceptions.Aborted):
+        return True
+    # transactional() reports the final Aborted commit as a ValueError; newer
+    # clients chain the Aborted, older ones (2.3.x) only set the message
+    if not isinstance(error, ValueError):
+        return False
+    return isinstance(error.__cause__, gcp_exceptions.Aborted) or \
+        str(error).startswith(_EXCEEDED_ATTEMPTS_PREFIX)
+
+
+class TransactionRunner:
+    """Runs Firestore transactions with jittered exponential backoff on contention.
+
+    The client's own retry loop re-runs an aborted transaction immediately,
+    which under a burst of orders for the same wallet just collides again.
+    Here every attempt is a single-shot transaction and aborted attempts are
+    retried after base_delay * 2^n (capped at max_delay, +/-50% jitter).
+    Errors raised by the transaction function itself (e.g. ValueError for an
+    insufficient balance) are not retried.
+    """
+
+    def __init__(self, db, max_attempts=5, base_delay=0.02, max_delay=0.5):
+        self._db = db
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+
+        self.committed = 0
+        self.attempts = 0
+        self.contention = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.backoff_seconds = 0.0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(transaction, *args, **kwargs) in a transaction and return its result."""
+        transactional_fn = firestore.transactional(fn)
+        for attempt in range(self.max_attempts):
+            self._count(attempts=1)
+            try:
+                result = transactional_fn(self._db.transaction(max_attempts=1), *args, **kwargs)
+            except Exception as e:
+                if not _is_contention(e):
+                    raise
+                self._count(contention=1)
+                if attempt + 1 >= self.max_attempts:
+                    self._count(exhausted=1)
+                    raise TransactionContention(
+                        f'Transaction aborted by contention {self.max_attempts} times'
+                    ) from e
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+                self._count(retries=1, backoff_seconds=delay)
+                time.sleep(delay)
+                continue
+            self._count(committed=1)
+            return result
+
+    def stats(self):
+        return {
+            'committed': self.committed,
+            'attempts': self.attempts,
+            'contention': self.contention,
+            'retries': self.retries,
+            'exhausted': self.exhausted,
+            'backoff_seconds': round(self.backoff_seconds, 3),
+            'max_attempts': self.max_attempts
+        }
@@ -13,6 +13,35 @@ export const getImageUrl = (url: string | undefined | null): string => {
   return url;
 };
 
+interface ImageVariant {
+  url: string;
+  width: number;
+  height: number;
+  format: 'webp' | 'jpeg';
+  bytes: number;
+}
+
+/**
+ * Picks the smallest rendition of a product image that is at least `width`
+ * pixels wide (the largest one if none is), preferring WebP.
+ * Falls back to image_url for products uploaded before renditions existed.
+ */
+export const getProductImageUrl = (
+  product: { image_url?: string | null; image_variants?: ImageVariant[] },
+  width: number
+): string => {
+  const variants = product.image_variants || [];
+  if (variants.length) {
+    const preferred = variants.filter(v => v.format === 'webp');
+    const candidates = (preferred.length ? preferred : variants)
+      .slice()
+      .sort((a, b) => a.width - b.width);
+    const match = candidates.find(v => v.width >= width) || candidates[candidates.length - 1];
+    return match.url;
+  }
+  return getImageUrl(product.image_url);
+};
+
 /**
  * Component to handle common image error fallbacks
  */
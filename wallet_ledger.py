@@ -0,0 +1,139 @@
+from firebase_admin import firestore
+
+# Append-only wallet ledger: one document per balance change, written in the
+# same transaction or batch as the change itself. It lives in the collection
+# the CASHBACK and ADMIN_CREDIT records already went to, in the same shape.
+LEDGER_COLLECTION = 'transactions'
+
+# Entry types (pages/wallet.tsx picks icons and colours by these)
+WELCOME_BONUS = 'WELCOME_BONUS'
+ORDER = 'ORDER'
+REFUND = 'REFUND'
+COUPON = 'COUPON'
+CASHBACK = 'CASHBACK'
+ADMIN_CREDIT = 'ADMIN_CREDIT'
+LOYALTY_REWARD = 'LOYALTY_REWARD'
+
+# Credited to every new account by /signup
+WELCOME_BONUS_AMOUNT = 50.00
+
+# Set on a user document once their pre-ledger history has been written
+BACKFILL_FIELD = 'wallet_ledger_backfilled'
+
+# Writes per backfill batch (Firestore's limit)
+BATCH_SIZE = 500
+
+
+# Entries that can only happen once get deterministic ids, so writing one
+# twice (a replayed queue batch, the backfill) leaves a single entry
+
+def welcome_entry_id(user_email):
+    return f'welcome_{user_email}'
+
+
+def payment_entry_id(order_id):
+    return f'{order_id}_payment'
+
+
+def cashback_entry_id(order_id):
+    return f'{order_id}_cashback'
+
+
+def coupon_entry_id(code):
+    return f'coupon_{code}'
+
+
+def refund_entry_id(order_id, order_data):
+    """The first refund of an order has a fixed id; one after an un-cancel gets a new one."""
+    return None if order_data.get('refund_amount') else f'{order_id}_refund'
+
+
+def payment_description(order_id, order_data):
+    return f"Payment for Order #{order_id[:8]} - {len(order_data.get('items', []))} items"
+
+
+def refund_description(order_id):
+    return f"Refund for Order #{order_id[:8]}"
+
+
+def ledger_entry(user_email, entry_type, amount, description, order_id=None, timestamp=None):
+    entry = {
+        'user_email': user_email,
+        'type': entry_type,
+        'amount': amount,
+        'description': description,
+        'timestamp': timestamp or firestore.SERVER_TIMESTAMP
+    }
+    if order_id:
+        entry['order_id'] = order_id
+    return entry
+
+
+def record(writer, db, user_email, entry_type, amount, description, entry_id=None, order_id=None, timestamp=None):
+    """Add a ledger entry to writer (a transaction or WriteBatch) so it commits with the balance change.
+
+    Returns the entry id; one is generated when entry_id is None.
+    """
+    collection = db.collection(LEDGER_COLLECTION)
+    ref = collection.document(entry_id) if entry_id else collection.document()
+    writer.set(ref, ledger_entry(user_email, entry_type, amount, description, order_id, timestamp))
+    return ref.id
+
+
+def _history_entries(db, user_email, user_data):
+    """(entry_id, entry) pairs for wallet activity from before the ledger.
+
+    Derived the way GET /wallet/transactions used to build the history on
+    every call: welcome bonus, order payments, refunds and redeemed coupons.
+    """
+    if user_data.get('created_at'):
+        yield welcome_entry_id(user_email), ledger_entry(
+            user_email, WELCOME_BONUS, WELCOME_BONUS_AMOUNT, 'Welcome bonus credit',
+            timestamp=user_data.get('created_at')
+        )
+
+    orders = db.collection('orders').where('user_email', '==', user_email).stream()
+    for order in orders:
+        order_data = order.to_dict()
+        yield payment_entry_id(order.id), ledger_entry(
+            user_email, ORDER, -order_data.get('total', 0), payment_description(order.id, order_data),
+            order_id=order.id, timestamp=order_data.get('created_at')
+        )
+        if order_data.get('status') == 'cancelled' and order_data.get('refund_amount'):
+            yield f'{order.id}_refund', ledger_entry(
+                user_email, REFUND, order_data.get('refund_amount', 0), refund_description(order.id),
+                order_id=order.id,
+                timestamp=order_data.get('cancelled_at') or order_data.get('refund_processed_at')
+            )
+
+    coupons = db.collection('coupons').where('used_by', '==', user_email).stream()
+    for coupon in coupons:
+        coupon_data = coupon.to_dict()
+        yield coupon_entry_id(coupon.id), ledger_entry(
+            user_email, COUPON, coupon_data.get('amount', 0), f"Coupon redeemed: {coupon.id}",
+            timestamp=coupon_data.get('used_at')
+        )
+
+
+def ensure_wallet_ledger(db, user_email, user_data):
+    """Write ledger entries for a user's wallet activity from before the ledger existed.
+
+    Runs once per user (on their first history read); the entries use the
+    same ids as the live writes, so anything recorded since isn't doubled.
+    Returns the number of entries written.
+    """
+    if user_data.get(BACKFILL_FIELD):
+        return 0
+
+    written = 0
+    batch, pending = db.batch(), 0
+    for entry_id, entry in _history_entries(db, user_email, user_data):
+        batch.set(db.collection(LEDGER_COLLECTION).document(entry_id), entry)
+        written += 1
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    batch.set(db.collection('users').document(user_email), {BACKFILL_FIELD: True}, merge=True)
+    batch.commit()
+    return written
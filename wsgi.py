@@ -0,0 +1,30 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+The dev server (`python app.py`) is single threaded with the debugger on;
+use this behind gunicorn instead. Worker model and counts are configured in
+gunicorn.conf.py.
+"""
+import os
+
+# Worker classes that monkey-patch the process (see gunicorn.conf.py)
+ASYNC_WORKER_CLASSES = ('gevent', 'eventlet')
+
+
+def create_wsgi_app():
+    """Build the Flask app with the Firebase client created up front.
+
+    Background threads are NOT started here: when gunicorn preloads the app
+    this runs in the master process, and threads don't survive the fork.
+    Each worker starts its own in the post_worker_init hook.
+
+    With gevent/eventlet the client is left to the post_worker_init warm-up,
+    which runs after gRPC has been switched to gevent mode.
+    """
+    from app import create_app
+    async_worker = os.getenv("GUNICORN_WORKER_CLASS", "gthread") in ASYNC_WORKER_CLASSES
+    return create_app({'WARM_UP_FIRESTORE': not async_worker})
+
+
+application = create_wsgi_app()